@@ -0,0 +1,166 @@
+"""Append-only CSV writer with batched fsync.
+
+Inserts only write the new rows to the end of the file instead of rewriting
+the whole table, so their cost does not grow with the file. Rows are laid out
+in the order of the header already on disk, which keeps the files readable by
+the ``pd.read_csv`` based loaders.
+
+Durability is batched: the file is fsync'ed once ``fsync_every`` appends have
+accumulated or ``fsync_interval`` seconds after the first unsynced append,
+whichever comes first. ``flush()`` forces everything pending to disk.
+"""
+
+import atexit
+import csv
+import errno
+import io
+import os
+import shutil
+import threading
+import time
+
+
+def _format_value(value):
+    # Match what DataFrame.to_csv writes for missing values
+    if value is None:
+        return ""
+    if isinstance(value, float) and value != value:
+        return ""
+    return value
+
+
+def rewrite_file(path, write):
+    """Replace the contents of ``path`` with what ``write(f)`` writes to ``f``.
+
+    The new contents go to a temporary file next to ``path`` that is then
+    renamed over it, so readers see either the old file or the new one. A file
+    bind-mounted on its own (as with ``docker run -v ./users.csv:...``) cannot
+    be renamed over (EBUSY/EXDEV); it is then overwritten in place, which is
+    safe from other writers because callers hold the table's file lock.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.replace(tmp_path, path)
+            return
+        except OSError as exc:
+            if exc.errno not in (errno.EBUSY, errno.EXDEV):
+                raise
+        with open(tmp_path, "rb") as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def _encode_rows(columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for row in rows:
+        writer.writerow([_format_value(row.get(col)) for col in columns])
+    return buf.getvalue()
+
+
+def _read_header(path):
+    """Return (header, ends_with_newline) for ``path``; header is None if empty."""
+    try:
+        with open(path, "rb") as f:
+            first_line = f.readline()
+            if not first_line.strip():
+                return None, True
+            f.seek(-1, os.SEEK_END)
+            ends_with_newline = f.read(1) == b"\n"
+    except FileNotFoundError:
+        return None, True
+
+    header = next(csv.reader([first_line.decode("utf-8")]))
+    return header, ends_with_newline
+
+
+class AppendWriter:
+    def __init__(self, fsync_every=32, fsync_interval=1.0):
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+        atexit.register(self.flush)
+
+    def append(self, path, rows, columns):
+        """Append ``rows`` (list of dicts) to the CSV at ``path``.
+
+        ``columns`` is the schema used when the file does not exist yet. Returns
+        ``(header, chunk, rewritten)`` where ``chunk`` is the CSV text appended
+        (without header) and ``rewritten`` is True when the header had to be
+        widened, which requires a one-off full rewrite of the file.
+        """
+        header, ends_with_newline = _read_header(path)
+        rewritten = False
+
+        if header is None:
+            header = list(columns)
+            prefix = _encode_rows(header, [dict(zip(header, header))])
+        else:
+            extra = [col for row in rows for col in row if col not in header]
+            if extra:
+                header = header + list(dict.fromkeys(extra))
+                self._widen(path, header)
+                rewritten = True
+            prefix = "" if ends_with_newline else "\n"
+
+        chunk = _encode_rows(header, rows)
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            f.write(prefix + chunk)
+
+        self._mark_dirty(path, len(rows))
+        return header, chunk, rewritten
+
+    def _widen(self, path, header):
+        # Older files may lack newer columns (e.g. hours/created_at): rewrite
+        # once with the wider header so later appends stay aligned.
+        with open(path, newline="", encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        data = _encode_rows(header, [dict(zip(header, header))] + records)
+        rewrite_file(path, lambda f: f.write(data))
+
+    def _mark_dirty(self, path, count):
+        with self._lock:
+            entry = self._pending.setdefault(path, [0, time.monotonic()])
+            entry[0] += count
+            due = entry[0] >= self.fsync_every or (
+                time.monotonic() - entry[1] >= self.fsync_interval
+            )
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush(path)
+
+    def flush(self, path=None):
+        """fsync pending appends for ``path`` (or for every file)."""
+        with self._lock:
+            paths = [path] if path else list(self._pending)
+            for p in paths:
+                self._pending.pop(p, None)
+            if not self._pending and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        for p in paths:
+            try:
+                fd = os.open(p, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
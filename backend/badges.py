@@ -0,0 +1,273 @@
+"""Badge rules and batch evaluation.
+
+Every rule is a predicate over a user's aggregate stats (donation counts per
+path, point and hour totals, team membership). Predicates only use comparisons
+and ``&``, so the same rule evaluates a single user's stats dict or a whole
+DataFrame of stats (one row per user) at once.
+
+``compute_stats`` feeds the batch CLI (``check_badges.py``); ``BadgeAwarder``
+keeps running counters so the API can award badges as soon as a write earns
+them, re-evaluating only the rules that depend on the stats that changed.
+"""
+
+import threading
+
+import pandas as pd
+
+BADGE_IDS = {
+    "FIRST_DONATION": "first_donation",
+    "WISDOM_SUPPORTER": "wisdom_supporter",
+    "COURAGE_SUPPORTER": "courage_supporter",
+    "PROTECTION_SUPPORTER": "protection_supporter",
+    "SERVICE_SUPPORTER": "service_supporter",
+    "ALL_PATHS": "all_paths",
+    "HUNDRED_CLUB": "hundred_club",
+    "FIVE_HUNDRED_CLUB": "five_hundred_club",
+    "SERVICE_VOLUNTEER": "service_volunteer",
+    "TEAM_PLAYER": "team_player",
+    "TEAM_LEADER": "team_leader",
+}
+
+SUPPORTER_PATHS = ["WISDOM", "COURAGE", "PROTECTION", "SERVICE"]
+
+# Stats every rule may read, with their value for a user with no activity
+STAT_DEFAULTS = {
+    "donation_count": 0,
+    "wisdom_count": 0,
+    "courage_count": 0,
+    "protection_count": 0,
+    "service_count": 0,
+    "total_points": 0.0,
+    "volunteer_hours": 0.0,
+    "has_team": False,
+    "team_member_count": 0,
+}
+
+# Stats derived from the donations table vs. from users/teams
+DONATION_STATS = {
+    "donation_count",
+    "wisdom_count",
+    "courage_count",
+    "protection_count",
+    "service_count",
+    "total_points",
+    "volunteer_hours",
+}
+TEAM_STATS = {"has_team", "team_member_count"}
+
+# badge_id -> (predicate, stats it depends on)
+RULES = {
+    # Made at least one donation
+    BADGE_IDS["FIRST_DONATION"]: (
+        lambda s: s["donation_count"] >= 1,
+        {"donation_count"},
+    ),
+    # Path-specific supporters (5 donations to each path)
+    BADGE_IDS["WISDOM_SUPPORTER"]: (lambda s: s["wisdom_count"] >= 5, {"wisdom_count"}),
+    BADGE_IDS["COURAGE_SUPPORTER"]: (
+        lambda s: s["courage_count"] >= 5,
+        {"courage_count"},
+    ),
+    BADGE_IDS["PROTECTION_SUPPORTER"]: (
+        lambda s: s["protection_count"] >= 5,
+        {"protection_count"},
+    ),
+    BADGE_IDS["SERVICE_SUPPORTER"]: (
+        lambda s: s["service_count"] >= 5,
+        {"service_count"},
+    ),
+    # Donated to all paths (WISDOM, COURAGE, PROTECTION)
+    BADGE_IDS["ALL_PATHS"]: (
+        lambda s: (s["wisdom_count"] > 0)
+        & (s["courage_count"] > 0)
+        & (s["protection_count"] > 0),
+        {"wisdom_count", "courage_count", "protection_count"},
+    ),
+    BADGE_IDS["HUNDRED_CLUB"]: (lambda s: s["total_points"] >= 100, {"total_points"}),
+    BADGE_IDS["FIVE_HUNDRED_CLUB"]: (
+        lambda s: s["total_points"] >= 500,
+        {"total_points"},
+    ),
+    # 10+ volunteer hours
+    BADGE_IDS["SERVICE_VOLUNTEER"]: (
+        lambda s: s["volunteer_hours"] >= 10,
+        {"volunteer_hours"},
+    ),
+    # Has a team_id
+    BADGE_IDS["TEAM_PLAYER"]: (lambda s: s["has_team"], {"has_team"}),
+    # Is a team leader with 5+ members
+    BADGE_IDS["TEAM_LEADER"]: (
+        lambda s: s["team_member_count"] >= 5,
+        {"team_member_count"},
+    ),
+}
+
+
+def donation_stats(donations_df):
+    """Return the donation-derived stats of every user who donated, by uuid."""
+    grouped = donations_df.groupby("uuid", sort=False)
+    per_user = pd.DataFrame(
+        {
+            "donation_count": grouped.size(),
+            "total_points": grouped["impact_points"].sum(),
+            "volunteer_hours": grouped["hours"].sum(),
+        }
+    )
+    path_counts = (
+        donations_df[donations_df["path"].isin(SUPPORTER_PATHS)]
+        .groupby(["uuid", "path"], sort=False)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=SUPPORTER_PATHS, fill_value=0)
+    )
+    path_counts.columns = [f"{path.lower()}_count" for path in SUPPORTER_PATHS]
+    return per_user.join(path_counts).fillna(0)
+
+
+def compute_stats(users_df, donations_df, teams_df):
+    """Return rule stats for every user, indexed by uuid.
+
+    A handful of grouped aggregations over the full tables replace the old
+    per-user filtering of donations and users.
+    """
+    users = users_df.drop_duplicates("uuid").set_index("uuid")
+    stats = pd.DataFrame(index=users.index)
+    stats = stats.join(donation_stats(donations_df))
+
+    team_id = users["team_id"].fillna("").astype(str)
+    stats["has_team"] = team_id != ""
+
+    # Leaders of any team get the size of the team they are a member of
+    team_sizes = users_df["team_id"].value_counts()
+    is_leader = stats.index.isin(teams_df["leader_uuid"])
+    member_counts = team_id.map(team_sizes).fillna(0)
+    stats["team_member_count"] = member_counts.where(stats["has_team"] & is_leader, 0)
+
+    return stats.fillna(STAT_DEFAULTS).astype(
+        {name: type(default) for name, default in STAT_DEFAULTS.items()}
+    )
+
+
+def evaluate(stats, badge_ids=None):
+    """Return the badges earned by one user's stats dict."""
+    rules = RULES if badge_ids is None else {b: RULES[b] for b in badge_ids}
+    return [badge_id for badge_id, (predicate, _) in rules.items() if predicate(stats)]
+
+
+def earned_badges(stats):
+    """Return a (uuid, badge_id) frame of every badge earned in ``stats``."""
+    frames = []
+    for badge_id, (predicate, _) in RULES.items():
+        uuids = stats.index[predicate(stats).to_numpy()]
+        frames.append(pd.DataFrame({"uuid": uuids, "badge_id": badge_id}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def missing_badges(earned, has_badges_df):
+    """Return rows of ``earned`` that are not yet in ``has_badges_df``."""
+    existing = pd.MultiIndex.from_frame(has_badges_df[["uuid", "badge_id"]].astype(str))
+    keys = pd.MultiIndex.from_frame(earned[["uuid", "badge_id"]])
+    return earned[~keys.isin(existing)]
+
+
+class BadgeAwarder:
+    """Award badges incrementally as donations and team changes are written.
+
+    Donation-derived stats are kept per user by subscribing to the donations
+    table; team stats are looked up for the affected user only. Badges already
+    held are tracked through the has_badges table so nothing is awarded twice.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        # Serialises award() within the process; storage.claim() across workers
+        self._award_lock = threading.Lock()
+        self._stats = {}
+        self._held = set()
+        storage.subscribe("donations", self._on_donations)
+        storage.subscribe("has_badges", self._on_has_badges)
+
+    def _on_donations(self, event, frame):
+        if event == "reset":
+            stats = donation_stats(frame).to_dict(orient="index")
+            with self._lock:
+                self._stats = stats
+            return
+
+        with self._lock:
+            for uuid, path, points, hours in frame[
+                ["uuid", "path", "impact_points", "hours"]
+            ].itertuples(index=False):
+                if pd.isna(uuid):
+                    continue
+                stats = self._stats.setdefault(
+                    uuid, {name: STAT_DEFAULTS[name] for name in DONATION_STATS}
+                )
+                stats["donation_count"] += 1
+                stats["total_points"] += 0.0 if pd.isna(points) else float(points)
+                stats["volunteer_hours"] += 0.0 if pd.isna(hours) else float(hours)
+                if path in SUPPORTER_PATHS:
+                    stats[f"{path.lower()}_count"] += 1
+
+    def _on_has_badges(self, event, frame):
+        pairs = set(zip(frame["uuid"], frame["badge_id"]))
+        with self._lock:
+            if event == "reset":
+                self._held = pairs
+            else:
+                self._held |= pairs
+
+    def _team_stats(self, uuid):
+        users = self._storage.find("users", uuid=uuid)
+        team_id = users["team_id"].iloc[0] if not users.empty else ""
+        has_team = bool(team_id)
+        team_member_count = 0
+        if has_team and not self._storage.find("teams", leader_uuid=uuid).empty:
+            team_member_count = len(self._storage.find("users", team_id=team_id))
+        return {"has_team": has_team, "team_member_count": team_member_count}
+
+    def award(self, uuid, changed):
+        """Re-check the rules depending on ``changed`` stats for ``uuid``.
+
+        Newly earned badges are persisted right away; returns their ids.
+        """
+        return self.award_many([uuid], changed).get(uuid, [])
+
+    def award_many(self, uuids, changed):
+        """Like ``award`` for several users, persisting all new badges in one write.
+
+        Returns ``{uuid: [badge ids]}`` for the users who earned any.
+        """
+        badge_ids = [b for b, (_, deps) in RULES.items() if deps & set(changed)]
+        uuids = [uuid for uuid in dict.fromkeys(uuids) if uuid]
+        if not uuids or not badge_ids:
+            return {}
+
+        # Held from re-reading has_badges until the new badges are written, so
+        # two requests (in any worker) cannot grant the same badge twice
+        with self._award_lock, self._storage.claim("has_badges"):
+            # Make sure counters reflect the latest writes
+            self._storage.load("donations")
+            self._storage.load("has_badges")
+
+            awarded = {}
+            for uuid in uuids:
+                with self._lock:
+                    stats = dict(STAT_DEFAULTS, **self._stats.get(uuid, {}))
+                    candidates = [b for b in badge_ids if (uuid, b) not in self._held]
+                if not candidates:
+                    continue
+
+                if any(RULES[b][1] & TEAM_STATS for b in candidates):
+                    stats.update(self._team_stats(uuid))
+
+                earned = evaluate(stats, candidates)
+                if earned:
+                    awarded[uuid] = earned
+            if awarded:
+                self._storage.append(
+                    "has_badges",
+                    [{"uuid": u, "badge_id": b} for u, earned in awarded.items() for b in earned],
+                )
+            return awarded
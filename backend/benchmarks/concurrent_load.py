@@ -0,0 +1,248 @@
+"""Load test: /me and /users/{uuid}/donations throughput next to heavy requests.
+
+Run from the backend directory:
+
+    python benchmarks/concurrent_load.py [--baseline REF] [--clients 64] [--duration 20]
+
+Starts the API on synthetic tables in a scratch directory, logs some users in,
+then for ``--duration`` seconds keeps ``--clients`` concurrent clients calling
+``/me`` and ``/users/{uuid}/donations`` while ``--heavy`` clients request
+leaderboards over a time range (pandas aggregation over many rows). Reports
+throughput and p50/p99 latency of the cheap endpoints and of the heavy ones.
+
+``--baseline REF`` also runs the same load against the backend of git
+revision REF (e.g. the commit before the async endpoints) for comparison.
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import numpy as np
+import pandas as pd
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchmark-password"
+HEAVY_PATHS = [
+    "/leaderboard/supporters?since=2024-01-01&limit=20",
+    "/leaderboard/teams?since=2024-06-01",
+]
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_workdir(n_users, n_donations, n_teams, seed=0):
+    rng = np.random.default_rng(seed)
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    # Cheap hashes: logins only set up the sessions
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8")
+    uuids = np.array([f"U{i:07d}" for i in range(n_users)])
+    team_ids = np.array([f"T{i:05d}" for i in range(n_teams)])
+    pd.DataFrame(
+        {
+            "uuid": uuids,
+            "email": [f"user{i}@example.com" for i in range(n_users)],
+            "password": hashed,
+            "fname": "First",
+            "lname": [f"Last{i}" for i in range(n_users)],
+            "team_id": team_ids[rng.integers(0, n_teams, n_users)],
+        }
+    ).to_csv(os.path.join(workdir, "users.csv"), index=False)
+    pd.DataFrame(
+        {"team_id": team_ids, "name": [f"Team {i}" for i in range(n_teams)], "leader_uuid": uuids[:n_teams]}
+    ).to_csv(os.path.join(workdir, "teams.csv"), index=False)
+
+    start = pd.Timestamp("2023-01-01", tz="UTC").value
+    end = pd.Timestamp("2025-01-01", tz="UTC").value
+    created = pd.to_datetime(np.sort(rng.integers(start, end, n_donations)), utc=True)
+    pd.DataFrame(
+        {
+            "uuid": uuids[rng.integers(0, n_users, n_donations)],
+            "path": np.array(["WISDOM", "COURAGE", "PROTECTION", "SERVICE"])[
+                rng.integers(0, 4, n_donations)
+            ],
+            "amount": rng.integers(1, 200, n_donations),
+            "impact_points": rng.integers(1, 300, n_donations),
+            "hours": 0,
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+        }
+    ).to_csv(os.path.join(workdir, "donations.csv"), index=False)
+    return workdir
+
+
+def export_backend(ref):
+    """Extract the backend directory of git revision ``ref``; returns its path."""
+    target = tempfile.mkdtemp(prefix="load-bench-src-")
+    repo = os.path.dirname(BACKEND)
+    archive = subprocess.run(
+        ["git", "-C", repo, "archive", ref, "backend"], check=True, capture_output=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return target, os.path.join(target, "backend")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(backend, workdir, port):
+    env = dict(
+        os.environ,
+        PYTHONPATH=backend,
+        SHARED_STATE_PATH=".bench_state",
+        SESSION_STORE_PATH="",
+        PASSWORD_HASH_QUEUE="1000",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            # Also warms the caches before the measurement
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/leaderboard/teams", timeout=60)
+            return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def login(port, i):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/login",
+        data=f'{{"email": "user{i}@example.com", "password": "{PASSWORD}"}}'.encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        cookie = response.headers["set-cookie"]
+    return cookie.split(";")[0]
+
+
+def get(port, path, cookie=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}")
+    if cookie:
+        request.add_header("Cookie", cookie)
+    start = time.perf_counter()
+    try:
+        urllib.request.urlopen(request, timeout=120).read()
+        ok = True
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run(port, clients, heavy, duration, n_sessions):
+    with ThreadPoolExecutor(8) as pool:
+        cookies = list(pool.map(lambda i: login(port, i), range(n_sessions)))
+
+    light, slow, failures = [], [], []
+    stop = threading.Event()
+
+    def light_client(k):
+        i = k
+        while not stop.is_set():
+            i += 1
+            if i % 2:
+                ok, elapsed = get(port, "/me", cookies[i % len(cookies)])
+            else:
+                ok, elapsed = get(port, f"/users/U{i % n_sessions:07d}/donations")
+            (light if ok else failures).append(elapsed)
+
+    def heavy_client(k):
+        i = k
+        while not stop.is_set():
+            i += 1
+            ok, elapsed = get(port, HEAVY_PATHS[i % len(HEAVY_PATHS)])
+            (slow if ok else failures).append(elapsed)
+
+    threads = [threading.Thread(target=light_client, args=(k,)) for k in range(clients)]
+    threads += [threading.Thread(target=heavy_client, args=(k,)) for k in range(heavy)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "light_rps": len(light) / duration,
+        "light_p50": percentile(light, 0.50),
+        "light_p99": percentile(light, 0.99),
+        "heavy_rps": len(slow) / duration,
+        "heavy_p50": percentile(slow, 0.50),
+        "heavy_p99": percentile(slow, 0.99),
+        "failures": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", metavar="REF", help="also run the backend of this git revision")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--heavy", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--donations", type=int, default=1_000_000)
+    parser.add_argument("--teams", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} users / {args.donations} donations...")
+    workdir = make_workdir(args.users, args.donations, args.teams)
+    backends = []
+    cleanup = [workdir]
+    if args.baseline:
+        tmp, backend = export_backend(args.baseline)
+        cleanup.append(tmp)
+        backends.append((args.baseline, backend))
+    backends.append(("current", BACKEND))
+
+    try:
+        print(
+            f"{'backend':>12} {'light/s':>8} {'p50':>8} {'p99':>8} "
+            f"{'heavy/s':>8} {'p50':>8} {'p99':>8} {'failed':>6}"
+        )
+        for name, backend in backends:
+            # Each run starts from the same data
+            run_dir = tempfile.mkdtemp(prefix="load-bench-run-")
+            cleanup.append(run_dir)
+            shutil.copytree(workdir, run_dir, dirs_exist_ok=True)
+            port = free_port()
+            proc = start_server(backend, run_dir, port)
+            try:
+                r = run(port, args.clients, args.heavy, args.duration, args.sessions)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(
+                f"{name[:12]:>12} {r['light_rps']:>8.1f} {r['light_p50']:>7.3f}s "
+                f"{r['light_p99']:>7.3f}s {r['heavy_rps']:>8.1f} {r['heavy_p50']:>7.3f}s "
+                f"{r['heavy_p99']:>7.3f}s {r['failures']:>6}"
+            )
+    finally:
+        for path in cleanup:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
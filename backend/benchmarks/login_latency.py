@@ -0,0 +1,156 @@
+"""Benchmark /login latency under a concurrent burst.
+
+Run from the backend directory:
+
+    python benchmarks/login_latency.py [--concurrency 32] [--requests 200]
+
+Starts the API twice in a scratch directory, once hashing in server threads
+(``PASSWORD_HASH_WORKERS=0``, close to the old behaviour) and once with the
+process pool, fires concurrent logins, and meanwhile polls a cheap
+endpoint. Reports login and unrelated-endpoint p50/p99 plus fast rejections.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchmark-password"
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_workdir(n_users, rounds):
+    workdir = tempfile.mkdtemp(prefix="login-bench-")
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+    with open(os.path.join(workdir, "users.csv"), "w", encoding="utf-8") as f:
+        f.write("uuid,email,password,fname,lname,team_id\n")
+        for i in range(n_users):
+            f.write(f"U{i:07d},user{i}@example.com,{hashed},First,Last{i},\n")
+    return workdir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, env_overrides):
+    env = dict(os.environ, PYTHONPATH=BACKEND, SHARED_STATE_PATH=".bench_state", **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/leaderboard/teams", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def post_login(port, i):
+    body = json.dumps({"email": f"user{i}@example.com", "password": PASSWORD}).encode()
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/login",
+        data=body,
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    try:
+        urllib.request.urlopen(request, timeout=120).read()
+        status = 200
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    return status, time.perf_counter() - start
+
+
+def run(port, concurrency, n_requests, n_users):
+    other = []
+    stop = threading.Event()
+
+    def poll_other_endpoint():
+        while not stop.is_set():
+            start = time.perf_counter()
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/leaderboard/teams", timeout=120).read()
+            other.append(time.perf_counter() - start)
+
+    poller = threading.Thread(target=poll_other_endpoint)
+    poller.start()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda i: post_login(port, i % n_users), range(n_requests)))
+    stop.set()
+    poller.join()
+
+    ok = [elapsed for status, elapsed in results if status == 200]
+    rejected = [elapsed for status, elapsed in results if status == 503]
+    return {
+        "ok": len(ok),
+        "rejected": len(rejected),
+        "login_p50": percentile(ok, 0.50),
+        "login_p99": percentile(ok, 0.99),
+        "reject_p99": percentile(rejected, 0.99),
+        "other_p50": percentile(other, 0.50),
+        "other_p99": percentile(other, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    workdir = make_workdir(args.users, args.rounds)
+    modes = [
+        ("threads", {"PASSWORD_HASH_WORKERS": "0", "PASSWORD_HASH_QUEUE": "100000"}),
+        ("process pool", {}),
+    ]
+    try:
+        print(
+            f"{'mode':>12} {'ok':>5} {'503':>5} {'login p50':>10} {'login p99':>10} "
+            f"{'503 p99':>8} {'other p50':>10} {'other p99':>10}"
+        )
+        for name, env in modes:
+            port = free_port()
+            proc = start_server(workdir, port, env)
+            try:
+                r = run(port, args.concurrency, args.requests, args.users)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(
+                f"{name:>12} {r['ok']:>5} {r['rejected']:>5} {r['login_p50']:>9.3f}s "
+                f"{r['login_p99']:>9.3f}s {r['reject_p99']:>7.3f}s "
+                f"{r['other_p50']:>9.3f}s {r['other_p99']:>9.3f}s".replace("nans", "   -")
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark JSON serialisation of the DataFrame-backed responses.
+
+Run from the backend directory:
+
+    python benchmarks/serialization.py [--sizes 10000 100000 1000000]
+
+For the row shapes of /donations (and /users/{uuid}/donations),
+/users/{uuid}/badges, /users/{uuid}/referrals and /hope_wall/messages, times
+the old path (``to_dict(orient="records")`` then FastAPI's
+``jsonable_encoder`` and ``JSONResponse``) against ``framejson.json_response``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framejson import json_response  # noqa: E402
+
+
+def donations(n, rng):
+    hours = np.where(rng.random(n) < 0.2, rng.integers(1, 8, n).astype(float), np.nan)
+    return pd.DataFrame(
+        {
+            "uuid": [f"U{i:07d}" for i in rng.integers(0, n // 3 + 1, n)],
+            "path": rng.choice(["WISDOM", "COURAGE", "PROTECTION", "SERVICE"], n),
+            "amount": rng.integers(0, 500, n).astype(float),
+            "impact_points": rng.integers(0, 750, n).astype(float),
+            "hours": hours,
+            "created_at": "2025-11-01T12:00:00.000000+00:00",
+        }
+    )
+
+
+def badges(n, rng):
+    return pd.DataFrame(
+        {
+            "uuid": [f"U{i:07d}" for i in rng.integers(0, n, n)],
+            "badge_id": rng.choice(["first_donation", "hundred_club", "team_player"], n),
+        }
+    )
+
+
+def referrals(n, rng):
+    return pd.DataFrame(
+        {
+            "referrer_id": [f"U{i:07d}" for i in rng.integers(0, n, n)],
+            "referred_id": [f"U{i:07d}" for i in rng.integers(0, n, n)],
+            "code": [f"REF-U{i:07d}" for i in rng.integers(0, n, n)],
+            "hasDonated": rng.random(n) < 0.5,
+        }
+    )
+
+
+def hope_wall_messages(n, rng):
+    return pd.DataFrame(
+        {
+            "id": [f"msg{i:09d}" for i in range(n)],
+            "display_name": rng.choice(["Anonymous", "Hope Giver", "Zoë"], n),
+            "message": "You are stronger than you know. \"Keep going\" — we're with you.",
+            "language": rng.choice(["en", "fr", "ar"], n),
+            "created_date": "2025-11-01T12:00:00.000000+00:00",
+            "is_approved": True,
+        }
+    )
+
+
+# endpoint -> (response key, frame factory, NaN placeholder)
+ENDPOINTS = {
+    "/donations": ("donations", donations, " "),
+    "/users/{uuid}/badges": ("badges", badges, None),
+    "/users/{uuid}/referrals": ("referrals", referrals, None),
+    "/hope_wall/messages": ("messages", hope_wall_messages, None),
+}
+
+
+def old_path(key, df, placeholder):
+    if placeholder is not None:
+        df = df.where(pd.notnull(df), placeholder)
+    content = {key: df.to_dict(orient="records")}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def new_path(key, df, placeholder):
+    return json_response({key: df}, placeholder).body
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'endpoint':<26} {'rows':>9} {'old':>9} {'new':>9} {'speedup':>8}")
+    for endpoint, (key, make_frame, placeholder) in ENDPOINTS.items():
+        for n in args.sizes:
+            df = make_frame(n, rng)
+            old_time, old_body = timed(old_path, key, df, placeholder)
+            new_time, new_body = timed(new_path, key, df, placeholder)
+            assert json.loads(old_body) == json.loads(new_body)
+            print(
+                f"{endpoint:<26} {n:>9} {old_time:>8.3f}s {new_time:>8.3f}s "
+                f"{old_time / new_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark the team leaderboard aggregation on synthetic data.
+
+Run from the backend directory:
+
+    python benchmarks/team_leaderboard.py
+
+Times ``rank_teams`` up to 10k teams / 1M users / 3M donations, and the old
+per-team loop on the sizes where it still finishes in reasonable time.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import rank_teams  # noqa: E402
+
+SCALES = [
+    # (teams, users, donations per user)
+    (100, 10_000, 3),
+    (1_000, 100_000, 3),
+    (10_000, 1_000_000, 3),
+]
+LEGACY_MAX_USERS = 100_000
+
+
+def make_tables(n_teams, n_users, donations_per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    team_ids = np.array([f"T{i:07d}" for i in range(n_teams)])
+    uuids = np.array([f"U{i:08d}" for i in range(n_users)])
+
+    # Roughly 80% of users belong to a team
+    user_team = team_ids[rng.integers(0, n_teams, n_users)]
+    user_team[rng.random(n_users) > 0.8] = ""
+
+    users_df = pd.DataFrame(
+        {
+            "uuid": uuids,
+            "email": [f"{u}@example.com" for u in uuids],
+            "fname": "First",
+            "lname": uuids,
+            "team_id": user_team,
+        }
+    )
+    teams_df = pd.DataFrame(
+        {
+            "team_id": team_ids,
+            "name": [f"Team {i}" for i in range(n_teams)],
+            "leader_uuid": uuids[rng.integers(0, n_users, n_teams)],
+        }
+    )
+    n_donations = n_users * donations_per_user
+    donations_df = pd.DataFrame(
+        {
+            "uuid": uuids[rng.integers(0, n_users, n_donations)],
+            "impact_points": rng.integers(1, 200, n_donations).astype(float),
+        }
+    )
+    return teams_df, users_df, donations_df
+
+
+def legacy_rank_teams(teams_df, users_df, donations_df):
+    """The previous implementation: one users scan per team."""
+    user_points = donations_df.groupby("uuid")["impact_points"].sum().reset_index()
+    result = []
+    for _, team in teams_df.iterrows():
+        members = users_df[users_df["team_id"] == team["team_id"]]
+        points = user_points[user_points["uuid"].isin(members["uuid"].tolist())][
+            "impact_points"
+        ].sum()
+        leader_row = users_df[users_df["uuid"] == team["leader_uuid"]]
+        result.append((team["team_id"], len(members), int(points), len(leader_row)))
+    result.sort(key=lambda t: t[2], reverse=True)
+    return result
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - start, out
+
+
+if __name__ == "__main__":
+    print(f"{'teams':>8} {'users':>10} {'donations':>10} {'rank_teams':>12} {'legacy':>12}")
+    for n_teams, n_users, per_user in SCALES:
+        tables = make_tables(n_teams, n_users, per_user)
+        elapsed, ranked = timed(rank_teams, *tables)
+        assert len(ranked) == n_teams
+
+        legacy = "skipped"
+        if n_users <= LEGACY_MAX_USERS:
+            legacy_elapsed, _ = timed(legacy_rank_teams, *tables)
+            legacy = f"{legacy_elapsed:.3f}s"
+
+        print(
+            f"{n_teams:>8} {n_users:>10} {n_users * per_user:>10} "
+            f"{elapsed:>11.3f}s {legacy:>12}"
+        )
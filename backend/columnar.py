@@ -0,0 +1,181 @@
+"""Columnar snapshot of the donations table (Arrow IPC, memory-mapped).
+
+``donations.csv`` stays the table of record and every insert is still appended
+to it, but parsing it dominates a (re)load: text to floats, and ``created_at``
+in a mix of timezone-aware and naive ISO formats. With
+``DONATIONS_FORMAT=arrow`` the rows up to some byte offset of the CSV are also
+kept in ``donations.arrow``, an Arrow IPC file with explicit column types:
+
+- ``uuid``: string
+- ``path``: dictionary-encoded (a pandas categorical)
+- ``amount``, ``impact_points``, ``hours``: float64, as parsed from the CSV,
+  so API responses and totals are the same as with ``DONATIONS_FORMAT=csv``
+- ``created_at``: UTC timestamp (naive values are taken as UTC)
+
+A load memory-maps the snapshot and parses only the CSV bytes written after
+it. The snapshot records the CSV's inode, its offset and the bytes just before
+it, so a CSV that was rewritten (e.g. saved from an editor) is noticed and
+parsed in full instead. Once
+more than ``compact_bytes`` of CSV have piled up past the snapshot, the next
+full load writes a new one; ``convert_donations.py`` builds the first.
+
+Rows parsed from the CSV are given the snapshot's dtypes too, so every frame
+of the table (full loads, tails, appended rows) has the same column types.
+pyarrow is only needed when the format is enabled.
+"""
+
+import io
+import os
+
+import pandas as pd
+
+from datastore import CsvSource, concat_rows, stat_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+# CSV bytes before the snapshot offset recorded to validate it
+_MARKER_BYTES = 64
+
+
+def donation_schema():
+    return pa.schema(
+        [
+            ("uuid", pa.string()),
+            ("path", pa.dictionary(pa.int32(), pa.string())),
+            ("amount", pa.float64()),
+            ("impact_points", pa.float64()),
+            ("hours", pa.float64()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+
+def coerce_donations(df):
+    """Return ``df`` with the snapshot's column types."""
+    return df.assign(
+        uuid=df["uuid"].astype("str"),
+        path=df["path"].astype("str").astype("category"),
+        amount=pd.to_numeric(df["amount"], errors="coerce").astype("float64"),
+        impact_points=pd.to_numeric(df["impact_points"], errors="coerce").astype("float64"),
+        hours=pd.to_numeric(df["hours"], errors="coerce").astype("float64"),
+        created_at=pd.to_datetime(
+            df["created_at"], errors="coerce", utc=True, format="ISO8601"
+        ).astype("datetime64[us, UTC]"),
+    )
+
+
+def typed_parser(parser):
+    """Wrap a CSV parser so the frames it returns have the snapshot's dtypes."""
+
+    def parse(source):
+        return coerce_donations(parser(source))
+
+    return parse
+
+
+class ArrowSnapshotSource(CsvSource):
+    """CSV table source that reads most of the table from a columnar snapshot."""
+
+    def __init__(
+        self, name, path, parser, columns, writer, versions, snapshot_path, compact_bytes
+    ):
+        if pa is None:
+            raise RuntimeError("DONATIONS_FORMAT=arrow requires pyarrow")
+        super().__init__(name, path, typed_parser(parser), columns, writer, versions)
+        self.snapshot_path = snapshot_path
+        self.compact_bytes = compact_bytes
+
+    def _read_snapshot(self):
+        """Return ``(table, inode, offset, marker)``, or None without a usable snapshot."""
+        try:
+            with pa.memory_map(self.snapshot_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        try:
+            inode = int(metadata[b"csv_inode"])
+            offset = int(metadata[b"csv_offset"])
+            marker = bytes.fromhex(metadata[b"csv_marker"].decode("ascii"))
+        except (KeyError, ValueError):
+            return None
+        if not table.schema.equals(donation_schema()):
+            # Written with other column types (e.g. float32 points): parse the
+            # CSV instead until a new snapshot is written
+            return None
+        return table, inode, offset, marker
+
+    def write_snapshot(self, frame, inode, offset, marker):
+        """Save ``frame`` as the snapshot of the first ``offset`` bytes of the CSV."""
+        table = pa.Table.from_pandas(
+            coerce_donations(frame)[list(donation_schema().names)],
+            schema=donation_schema(),
+            preserve_index=False,
+        )
+        table = table.replace_schema_metadata(
+            {
+                "csv_inode": str(inode),
+                "csv_offset": str(offset),
+                "csv_marker": marker[-_MARKER_BYTES:].hex(),
+            }
+        )
+        # Written next to the snapshot and renamed, so concurrent loads in other
+        # workers see either the old snapshot or the new one
+        tmp_path = f"{self.snapshot_path}.tmp.{os.getpid()}"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load(self):
+        """Return ``(frame, fingerprint)``: the snapshot plus the CSV rows after it."""
+        version = self.versions.get(self.name)
+        snapshot = self._read_snapshot()
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return super().load()
+
+        with f:
+            st = os.fstat(f.fileno())
+            header = f.readline()
+            start, base, prefix = len(header), None, header
+            if snapshot is not None:
+                table, inode, offset, marker = snapshot
+                if inode == st.st_ino and len(header) <= offset <= st.st_size:
+                    f.seek(offset - len(marker))
+                    if f.read(len(marker)) == marker:
+                        start, base, prefix = offset, table, marker
+            f.seek(start)
+            rest = f.read(st.st_size - start)
+
+        # A line still being written is picked up by the next load_tail()
+        rest = rest[: rest.rfind(b"\n") + 1]
+        end = start + len(rest)
+        key = stat_key(st) if end == st.st_size else (st.st_mtime_ns, end, st.st_ino)
+
+        frame = self.parser(io.BytesIO(header + rest))
+        if base is not None:
+            frame = concat_rows(base.to_pandas(), frame)
+        self._remember_tail(key, header, prefix + rest)
+        if end - start > self.compact_bytes:
+            self.write_snapshot(frame, st.st_ino, end, prefix + rest)
+        return frame, (version, key)
+
+    def replace(self, df):
+        super().replace(df)
+        key, _, marker = self._tail
+        self.write_snapshot(df, key[2], key[1], marker)
+
+    def rebuild_snapshot(self):
+        """Snapshot every complete row of the CSV; returns the row count."""
+        frame, _ = self.load()
+        if self._tail is None:
+            return 0
+        key, _, marker = self._tail
+        self.write_snapshot(frame, key[2], key[1], marker)
+        return len(frame)
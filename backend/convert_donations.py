@@ -0,0 +1,34 @@
+"""Build the columnar snapshot of donations.csv used with DONATIONS_FORMAT=arrow.
+
+Run from the backend directory (requires pyarrow):
+
+    python convert_donations.py [path/to/donations.arrow]
+
+donations.csv is left as it is; the snapshot only speeds up loading it. Running
+the script again folds the rows appended since the last snapshot into a new
+one. Afterwards start the API with DONATIONS_FORMAT=arrow (and
+DONATIONS_SNAPSHOT_PATH if not using donations.arrow).
+"""
+
+import os
+import sys
+import time
+
+from storage import CsvStorage
+
+
+def convert(snapshot_path):
+    os.environ["DONATIONS_SNAPSHOT_PATH"] = snapshot_path
+    storage = CsvStorage(donations_format="arrow")
+    return storage.store.source("donations").rebuild_snapshot()
+
+
+if __name__ == "__main__":
+    snapshot_path = (
+        sys.argv[1] if len(sys.argv) > 1 else os.getenv("DONATIONS_SNAPSHOT_PATH", "donations.arrow")
+    )
+    print(f"Writing donations snapshot to {snapshot_path}")
+    start = time.perf_counter()
+    rows = convert(snapshot_path)
+    print(f"  donations: {rows} rows in {time.perf_counter() - start:.2f}s")
+    print("Done.")
@@ -0,0 +1,413 @@
+"""Process-wide in-memory cache for the storage tables.
+
+Each table is loaded once and kept in memory. Every access asks the table's
+source for a cheap fingerprint and reloads only when it has changed since the
+last load, so edits made by hand or by another process are still picked up.
+For CSV the fingerprint is the file's mtime/size/inode plus a counter in the
+shared version file (see ``shared_state``) that every worker bumps after a
+write; for SQLite it is a per-table version maintained by triggers.
+
+When another worker only appended to a CSV table, just the new tail of the
+file is parsed and applied as an append instead of reloading everything.
+
+Inserts go through ``append``: the source persists only the new rows and, when
+the cache was current, those rows are added to the cached frame without
+reloading the table.
+
+Derived in-memory views (leaderboards, counters) can ``subscribe`` to a table:
+they receive a ``"reset"`` event with the full frame whenever it is (re)loaded
+or rewritten, an ``"append"`` event with only the new rows on inserts, and an
+``"update"`` event with the changed rows (keeping their positional index) when
+a rewrite only changed values in place (for listeners that ask for it).
+Sources that update rows themselves (SQLite) report them through ``patch``,
+which raises the same ``"update"`` event.
+
+Writes are serialised per table: a thread lock inside the process plus the
+source's cross-process lock (``flock`` on a sidecar file for CSV). Concurrent
+appends to the same table are group-committed: whichever request holds the
+lock writes every row queued so far in a single append. Full rewrites go to a
+temp file that is fsync'ed and renamed over the table.
+
+Frames handed out by the store are shared between requests: callers must not
+mutate them in place (use ``df.copy()`` or ``pd.concat`` before modifying).
+"""
+
+import io
+import logging
+import os
+import threading
+from contextlib import nullcontext
+
+import pandas as pd
+
+from appendlog import rewrite_file
+from locks import FileLock
+from metrics import STORAGE_READ_SECONDS, VIEW_UPDATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Bytes before the old end of file compared to tell an append from a rewrite
+_TAIL_MARKER_BYTES = 64
+
+
+def stat_key(st):
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def file_fingerprint(path):
+    """Return a cheap change-detection key for ``path`` (None if missing)."""
+    try:
+        return stat_key(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+class CsvSource:
+    """Table source backed by a CSV file."""
+
+    def __init__(self, name, path, parser, columns, writer, versions):
+        self.name = name
+        self.path = path
+        self.parser = parser
+        self.columns = list(columns)
+        self.writer = writer
+        self.versions = versions
+        self.lock = FileLock(path)
+        # (stat key, header line, last bytes) of the file as last read/written
+        self._tail = None
+
+    def locked(self):
+        return self.lock.hold()
+
+    def fingerprint(self):
+        return (self.versions.get(self.name), file_fingerprint(self.path))
+
+    def _remember_tail(self, st_key, header, data):
+        self._tail = (st_key, header, data[-_TAIL_MARKER_BYTES:])
+
+    def load(self):
+        """Return ``(frame, fingerprint)`` for exactly the bytes that were read."""
+        version = self.versions.get(self.name)
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._tail = None
+            return self.parser(self.path), (version, None)
+
+        with f:
+            st = os.fstat(f.fileno())
+            data = f.read(st.st_size)
+
+        header = data[: data.find(b"\n") + 1]
+        self._remember_tail(stat_key(st), header, data)
+        return self.parser(io.BytesIO(data)), (version, stat_key(st))
+
+    def load_tail(self, fingerprint):
+        """Parse only rows appended since ``fingerprint``; None if not an append."""
+        version = self.versions.get(self.name)
+        old = fingerprint[1]
+        if old is None or self._tail is None or self._tail[0] != old:
+            return None
+
+        _, header, marker = self._tail
+        old_size, old_ino = old[1], old[2]
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != old_ino or st.st_size < old_size or not header:
+                return None
+            if st.st_size == old_size and stat_key(st) != old:
+                return None
+            f.seek(old_size - len(marker))
+            if f.read(len(marker)) != marker:
+                return None
+            chunk = f.read(st.st_size - old_size)
+
+        # Stop at the last complete line; a write still in progress in another
+        # process is picked up by the next call.
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        if len(complete) == len(chunk):
+            key = stat_key(st)
+        else:
+            key = (st.st_mtime_ns, old_size + len(complete), st.st_ino)
+        self._remember_tail(key, header, marker + complete)
+        return self.parser(io.BytesIO(header + complete)), (version, key)
+
+    def append(self, rows):
+        before = self.fingerprint()
+        header, chunk, rewritten = self.writer.append(self.path, rows, self.columns)
+        self.versions.bump(self.name)
+        after = self.fingerprint()
+        if rewritten:
+            self._tail = None
+            return before, after, None
+
+        if self._tail is not None and self._tail[0] == before[1]:
+            _, header_bytes, marker = self._tail
+            self._remember_tail(after[1], header_bytes, marker + chunk.encode("utf-8"))
+
+        header_line = ",".join(header) + "\n"
+        return before, after, self.parser(io.StringIO(header_line + chunk))
+
+    def replace(self, df):
+        rewrite_file(self.path, lambda f: df.to_csv(f, index=False))
+        self.versions.bump(self.name)
+
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            header = f.readline()
+            f.seek(max(0, st.st_size - _TAIL_MARKER_BYTES))
+            self._remember_tail(stat_key(st), header, f.read())
+
+
+def concat_rows(frame, new_rows):
+    """Append ``new_rows`` to ``frame``; categorical columns stay categorical."""
+    for column in frame.columns:
+        dtype = frame[column].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or column not in new_rows:
+            continue
+        # pd.concat falls back to object dtype unless the categories match
+        values = new_rows[column]
+        missing = [v for v in values.dropna().unique() if v not in dtype.categories]
+        if missing:
+            frame = frame.assign(**{column: frame[column].cat.add_categories(missing)})
+        categories = frame[column].cat.categories
+        new_rows = new_rows.assign(
+            **{column: pd.Categorical(values, categories=categories)}
+        )
+    return pd.concat([frame, new_rows], ignore_index=True)
+
+
+def _changed_rows(old, new):
+    """Boolean mask of rows whose values differ, or None if rows were added/removed."""
+    if not old.index.equals(new.index) or list(old.columns) != list(new.columns):
+        return None
+    both_missing = old.isna() & new.isna()
+    return ((old != new) & ~both_missing).any(axis=1)
+
+
+class _Table:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.frame = None
+        self.fingerprint = None
+        self.lock = threading.Lock()
+        self.queue = []
+        self.queue_lock = threading.Lock()
+        self.listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.tail_reloads = 0
+
+
+class DataStore:
+    """Registry of cached tables keyed by name.
+
+    A source provides ``fingerprint()``, ``load()`` returning ``(frame,
+    fingerprint)`` consistent with each other, and ``append(rows)`` returning
+    ``(before, after, new_rows)``: fingerprints around the write and the
+    appended rows as a frame (None if the table must be reloaded). Sources that support full rewrites also provide ``replace(df)``,
+    and sources shared between processes provide a ``locked()`` context.
+    ``load_tail(fingerprint)`` optionally returns ``(new_rows, fingerprint)``
+    when the table has only grown since ``fingerprint``.
+    """
+
+    def __init__(self):
+        self._tables = {}
+
+    def register(self, name, source):
+        self._tables[name] = _Table(name, source)
+
+    def subscribe(self, name, listener, updates=False):
+        """Call ``listener(event, frame)`` on every reload, append and rewrite.
+
+        Listeners that do not opt in to ``updates`` get a ``"reset"`` with the
+        full frame when rows are changed in place.
+        """
+        table = self._tables[name]
+        with table.lock:
+            table.listeners.append((listener, updates))
+            if table.frame is not None:
+                listener("reset", table.frame)
+
+    def _notify(self, table, event, frame):
+        for listener, updates in table.listeners:
+            view = getattr(listener, "__qualname__", type(listener).__name__)
+            try:
+                with VIEW_UPDATE_SECONDS.time(table.name, view):
+                    if event == "update" and not updates:
+                        listener("reset", table.frame)
+                    else:
+                        listener(event, frame)
+            except Exception:
+                # The change is already stored; the other views must still see it
+                logger.exception("%s failed to apply a %s of %s", view, event, table.name)
+
+    @staticmethod
+    def _load(table):
+        with STORAGE_READ_SECONDS.time(table.name, "full"):
+            return table.source.load()
+
+    def source(self, name):
+        return self._tables[name].source
+
+    def get(self, name):
+        """Return the cached frame for ``name``, reloading it if the source changed."""
+        table = self._tables[name]
+        fingerprint = table.source.fingerprint()
+
+        with table.lock:
+            if table.frame is None:
+                table.misses += 1
+            elif fingerprint == table.fingerprint:
+                table.hits += 1
+                return table.frame
+            return self._catch_up(table)
+
+    def _catch_up(self, table):
+        """Bring the cached frame (and its listeners) up to date with the source.
+
+        Reads only the new rows when the source can tell what they are, else
+        the whole table. The caller holds ``table.lock``.
+        """
+        if table.frame is not None:
+            tail = self._load_tail(table)
+            if tail is not None:
+                new_rows, table.fingerprint = tail
+                if len(new_rows):
+                    table.frame = concat_rows(table.frame, new_rows)
+                    self._notify(table, "append", new_rows)
+                return table.frame
+            table.reloads += 1
+
+        table.frame, table.fingerprint = self._load(table)
+        self._notify(table, "reset", table.frame)
+        return table.frame
+
+    @staticmethod
+    def _load_tail(table):
+        load_tail = getattr(table.source, "load_tail", None)
+        if load_tail is None:
+            return None
+        with STORAGE_READ_SECONDS.time(table.name, "tail"):
+            tail = load_tail(table.fingerprint)
+        if tail is not None:
+            table.tail_reloads += 1
+        return tail
+
+    def _locked(self, table):
+        locked = getattr(table.source, "locked", None)
+        return locked() if locked else nullcontext()
+
+    def append(self, name, rows):
+        """Persist ``rows`` (list of dicts) and add them to the cached frame."""
+        table = self._tables[name]
+        entry = {"rows": rows, "done": False, "error": None}
+        with table.queue_lock:
+            table.queue.append(entry)
+
+        with table.lock:
+            # An earlier lock holder may already have committed our rows
+            if not entry["done"]:
+                with table.queue_lock:
+                    batch, table.queue = table.queue, []
+                try:
+                    self._commit(table, [row for e in batch for row in e["rows"]])
+                except Exception as exc:
+                    for e in batch:
+                        e["error"] = exc
+                    raise
+                finally:
+                    for e in batch:
+                        e["done"] = True
+
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    def _commit(self, table, rows):
+        with self._locked(table):
+            before, after, new_rows = table.source.append(rows)
+
+            if table.frame is not None and new_rows is not None and before != table.fingerprint:
+                # Another process wrote first: pick up its rows and ours together
+                new_rows, after = self._load_tail(table) or (None, None)
+
+            if table.frame is None or new_rows is None:
+                # Cache was cold or the file was rewritten: let get() reload it
+                table.frame = None
+                table.fingerprint = None
+                return
+
+            table.frame = concat_rows(table.frame, new_rows)
+            table.fingerprint = after
+            self._notify(table, "append", new_rows)
+
+    def update(self, name, modify):
+        """Rewrite the table with ``modify(frame_copy)`` and cache the result."""
+        table = self._tables[name]
+        with table.lock, self._locked(table):
+            if table.frame is None or table.source.fingerprint() != table.fingerprint:
+                # Listeners must see rows written elsewhere before the diff below
+                self._catch_up(table)
+            old = table.frame
+            frame = modify(old.copy())
+            table.source.replace(frame)
+            table.frame = frame
+            table.fingerprint = table.source.fingerprint()
+
+            changed = _changed_rows(old, frame)
+            if changed is None:
+                self._notify(table, "reset", frame)
+            elif changed.any():
+                self._notify(table, "update", frame[changed])
+            return frame
+
+    def patch(self, name, rows, before, after):
+        """Apply rows the source already updated in place (e.g. a SQL UPDATE).
+
+        ``rows`` holds the new values, indexed by row position; ``before`` and
+        ``after`` are the source fingerprints around the change. A frame that
+        was current as of ``before`` is patched and listeners get an
+        ``update`` event, as with ``update``; otherwise the next ``get``
+        reloads it.
+        """
+        table = self._tables[name]
+        with table.lock:
+            if table.frame is None or table.fingerprint != before:
+                return
+            frame = table.frame.copy()
+            frame.loc[rows.index, rows.columns] = rows
+            table.frame = frame
+            table.fingerprint = after
+            if len(rows):
+                self._notify(table, "update", frame.loc[rows.index])
+
+    def invalidate(self, name=None):
+        """Drop the cached frame for ``name`` (or for every table)."""
+        tables = [self._tables[name]] if name else self._tables.values()
+        for table in tables:
+            with table.lock:
+                table.frame = None
+                table.fingerprint = None
+
+    def stats(self):
+        """Return hit/miss/reload counters per table and in total."""
+        per_table = {
+            t.name: {
+                "hits": t.hits,
+                "misses": t.misses,
+                "reloads": t.reloads,
+                "tail_reloads": t.tail_reloads,
+            }
+            for t in self._tables.values()
+        }
+        totals = {
+            key: sum(counters[key] for counters in per_table.values())
+            for key in ("hits", "misses", "reloads", "tail_reloads")
+        }
+        return {"tables": per_table, "totals": totals}
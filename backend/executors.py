@@ -0,0 +1,92 @@
+"""Thread pools for the blocking work behind the async endpoints.
+
+Endpoints are ``async def`` and hand anything that blocks to one of two
+explicitly sized pools instead of Starlette's shared default threadpool:
+
+- ``io``: storage reads and writes, session and cache lookups
+  (``STORAGE_IO_THREADS``, default 16)
+- ``cpu``: pandas aggregation and serialisation of large results, e.g.
+  leaderboards and donation dumps (``CPU_THREADS``, default: the number of
+  cores, at most 4)
+
+Keeping them apart means a burst of slow leaderboard requests queues up on
+the CPU pool while cheap lookups such as ``/me`` still find a free I/O
+thread. Much of the aggregation holds the GIL, so CPU threads beyond the
+cores only slow everything else down. Both pools count queued and running
+calls for ``/datastore/stats`` and time each call for ``/metrics``.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import profiled
+from metrics import EXECUTOR_TASK_SECONDS, EXECUTOR_WAIT_SECONDS
+
+
+class Executor:
+    def __init__(self, name, threads):
+        self.name = name
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def _call(self, task, fn, submitted):
+        start = time.perf_counter()
+        EXECUTOR_WAIT_SECONDS.observe(start - submitted, self.name)
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return profiled(fn)
+        finally:
+            EXECUTOR_TASK_SECONDS.observe(time.perf_counter() - start, self.name, task)
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on this pool and await its result."""
+        with self._lock:
+            self.queued += 1
+        task = getattr(fn, "__qualname__", type(fn).__name__)
+        call = functools.partial(
+            self._call, task, functools.partial(fn, *args, **kwargs), time.perf_counter()
+        )
+        # Carries the request's context (e.g. its profile) into the thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, context.run, call
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+            }
+
+
+io = Executor("io", int(os.getenv("STORAGE_IO_THREADS", "16")))
+cpu = Executor("cpu", int(os.getenv("CPU_THREADS", "0")) or min(4, os.cpu_count() or 1))
+
+
+async def run_io(fn, *args, **kwargs):
+    return await io.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    return await cpu.run(fn, *args, **kwargs)
+
+
+def stats():
+    return {"io": io.stats(), "cpu": cpu.stats()}
@@ -0,0 +1,188 @@
+"""Hope Wall feed and moderation queue, kept in memory.
+
+The feed is the built-in default messages plus every approved message from
+``hope_wall_messages.csv``, newest first. Each message's date is parsed once,
+when it is first seen; the feed is a list of sort keys maintained with
+``bisect``, so new approvals are inserted in order and a page of ``limit``
+messages is a slice plus a join of rows encoded when they entered the feed.
+
+Moderators approve or reject messages in bulk. Decisions are appended to the
+``hope_wall_moderation`` log rather than rewriting the messages file, and the
+latest decision for a message id overrides its ``is_approved`` column. Messages
+with neither are pending, kept in submission order for the moderation queue.
+
+Encoded feed pages are cached with an ETag (a digest of the body) until the
+feed itself changes, so polling clients that send ``If-None-Match`` get a 304
+without any work beyond a dict lookup. Rejecting a pending message leaves the
+cache alone.
+"""
+
+import bisect
+import datetime
+import hashlib
+import threading
+
+import pandas as pd
+
+from framejson import frame_rows
+
+APPROVE = "approve"
+REJECT = "reject"
+
+# Distinct page sizes cached at once
+_MAX_CACHED_PAGES = 32
+
+
+def _sort_keys(frame, first_seq):
+    """Newest-first keys ``(0, -timestamp, seq)``; undated rows sort last."""
+    created = pd.to_datetime(
+        frame["created_date"], errors="coerce", utc=True, format="ISO8601"
+    ).tolist()
+    return [
+        (1, 0, first_seq + i) if pd.isna(ts) else (0, -ts.value, first_seq + i)
+        for i, ts in enumerate(created)
+    ]
+
+
+class HopeWall:
+    def __init__(self, storage, defaults):
+        self._storage = storage
+        self._defaults = pd.DataFrame(defaults)
+        self._lock = threading.Lock()
+        self._decisions = {}
+        self._reset(pd.DataFrame(columns=self._defaults.columns))
+        storage.subscribe("hope_wall_messages", self._on_messages, updates=True)
+        storage.subscribe("hope_wall_moderation", self._on_moderation)
+
+    def _reset(self, frame):
+        self._keys = []
+        self._rows = {}
+        # id -> (record, sort key, encoded feed row) for every persisted message
+        self._messages = {}
+        # Sort keys (their seq part) of pending messages, in submission order
+        self._pending = []
+        self._pending_ids = {}
+        self._seq = 0
+        self._pages = {}
+
+        for key, row in zip(_sort_keys(self._defaults, 0), frame_rows(self._defaults)):
+            self._feed_add(key, row)
+        self._seq = len(self._defaults)
+        self._add_messages(frame)
+
+    def _feed_add(self, key, row):
+        bisect.insort(self._keys, key)
+        self._rows[key] = row
+        self._pages = {}
+
+    def _feed_remove(self, key):
+        if key in self._rows:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+            del self._rows[key]
+            self._pages = {}
+
+    def _add_messages(self, frame):
+        if frame.empty:
+            return
+        frame = frame.fillna("")
+        records = frame.to_dict(orient="records")
+        # Encoded up front so an approval never has to touch the table again
+        rows = frame_rows(frame.assign(is_approved=True))
+        keys = _sort_keys(frame, self._seq)
+        self._seq += len(records)
+        for key, record, row in zip(keys, records, rows):
+            message_id = record["id"]
+            previous = self._messages.get(message_id)
+            if previous is not None:
+                # Rewritten in place: keep its place in the moderation queue
+                self._unlist(message_id)
+                key = key[:2] + (previous[1][2],)
+            self._messages[message_id] = (record, key, row)
+            self._list(message_id)
+
+    def _list(self, message_id):
+        """Put a message in the feed or the pending queue, per its state."""
+        record, key, row = self._messages[message_id]
+        decision = self._decisions.get(message_id)
+        if decision == APPROVE or (decision is None and record["is_approved"]):
+            self._feed_add(key, row)
+        elif decision is None:
+            bisect.insort(self._pending, key[2])
+            self._pending_ids[key[2]] = message_id
+
+    def _unlist(self, message_id):
+        key = self._messages[message_id][1]
+        self._feed_remove(key)
+        if self._pending_ids.pop(key[2], None) is not None:
+            del self._pending[bisect.bisect_left(self._pending, key[2])]
+
+    def _on_messages(self, event, frame):
+        with self._lock:
+            if event == "reset":
+                self._reset(frame)
+            else:
+                self._add_messages(frame)
+
+    def _on_moderation(self, event, frame):
+        decisions = dict(zip(frame["id"], frame["decision"]))
+        with self._lock:
+            if event == "reset":
+                changed = set(self._decisions) | set(decisions)
+                self._decisions = decisions
+            else:
+                changed = set(decisions)
+                self._decisions.update(decisions)
+            for message_id in changed:
+                if message_id in self._messages:
+                    self._unlist(message_id)
+                    self._list(message_id)
+
+    def _sync(self):
+        # Picks up changes made outside this process
+        self._storage.load("hope_wall_messages")
+        self._storage.load("hope_wall_moderation")
+
+    def page(self, limit=None):
+        """Return ``(etag, body)`` for the newest ``limit`` messages (all if falsy)."""
+        self._sync()
+        with self._lock:
+            count = len(self._keys) if not limit else min(limit, len(self._keys))
+            cached = self._pages.get(count)
+            if cached is not None:
+                return cached
+
+            rows = ",".join(self._rows[key] for key in self._keys[:count])
+            body = ('{"messages":[' + rows + "]}").encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if len(self._pages) >= _MAX_CACHED_PAGES:
+                self._pages = {}
+            self._pages[count] = (etag, body)
+            return etag, body
+
+    def pending(self, limit, after=None):
+        """Return ``(total, messages, next_after)`` for a page of the queue."""
+        self._sync()
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._pending, after)
+            seqs = self._pending[start : start + limit]
+            messages = [self._messages[self._pending_ids[seq]][0] for seq in seqs]
+            more = start + limit < len(self._pending)
+            return len(self._pending), messages, seqs[-1] if more else None
+
+    def moderate(self, approve=(), reject=()):
+        """Record decisions for message ids; returns the ids that do not exist."""
+        self._sync()
+        with self._lock:
+            unknown = [i for i in [*approve, *reject] if i not in self._messages]
+
+        decided_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        rows = [
+            {"id": message_id, "decision": decision, "decided_at": decided_at}
+            for decision, ids in ((APPROVE, approve), (REJECT, reject))
+            for message_id in ids
+            if message_id not in unknown
+        ]
+        if rows:
+            # One append (and one write) for the whole batch
+            self._storage.append("hope_wall_moderation", rows)
+        return unknown
@@ -0,0 +1,205 @@
+"""In-memory hash indexes over cached tables.
+
+A ``HashIndex`` maps each value of some columns to the positions of the rows
+holding it, so ``find`` by email, uuid or team_id is a dict lookup instead of
+a scan of the whole table. It subscribes to the table like the other derived
+views: a reload rebuilds it, appended rows are added, and in-place updates
+(e.g. a user joining or leaving a team) move only the changed rows.
+
+In a column of unique values (every email and uuid) each value maps straight
+to its row's position. Otherwise the positions are laid out grouped by value
+in one array and each value maps to its slice of it; a set of positions is
+only allocated once a value's rows change (e.g. a user makes another
+donation).
+
+A ``TimeIndex`` keeps the row positions of a timestamp column sorted by time,
+with every timestamp parsed once into epoch nanoseconds (UTC; naive values
+are taken as UTC), so a ``since``/``until`` filter is two binary searches
+instead of parsing the column on every request.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def _keys(column):
+    # Missing values never match an equality filter
+    return column.astype(object).where(column.notna(), None)
+
+
+def _build(keys):
+    """Return ``(positions, order)`` for a column's keys."""
+    codes, uniques = pd.factorize(keys)
+    present = np.flatnonzero(codes >= 0)
+    if len(uniques) == len(present):
+        # Values are numbered in order of appearance
+        return dict(zip(uniques.tolist(), present.tolist())), None
+    # Row positions grouped by value, ascending within each value
+    order = np.argsort(codes, kind="stable")[np.count_nonzero(codes < 0) :]
+    ends = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+    starts = np.concatenate(([0], ends[:-1]))
+    return dict(zip(uniques.tolist(), map(slice, starts.tolist(), ends.tolist()))), order
+
+
+def _rows(current, order):
+    # The positions in ``current`` as a set
+    if isinstance(current, slice):
+        return set(order[current].tolist())
+    return current if isinstance(current, set) else {current}
+
+
+def _add(positions, order, key, position):
+    current = positions.get(key)
+    if current is None:
+        positions[key] = position
+    else:
+        rows = _rows(current, order)
+        rows.add(position)
+        positions[key] = rows
+
+
+def _remove(positions, order, key, position):
+    current = positions.get(key)
+    if current is None:
+        return
+    rows = _rows(current, order)
+    rows.discard(position)
+    if len(rows) > 1:
+        positions[key] = rows
+    elif rows:
+        positions[key] = rows.pop()
+    else:
+        del positions[key]
+
+
+class HashIndex:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        # column -> value of every row, by position
+        self._values = {column: [] for column in self.columns}
+        # column -> value -> row position, set of positions or slice of order
+        self._positions = {column: {} for column in self.columns}
+        # column -> row positions grouped by value (None if values are unique)
+        self._order = {column: None for column in self.columns}
+
+    def on_event(self, event, frame):
+        if event == "reset":
+            values = {}
+            positions = {}
+            order = {}
+            for column in self.columns:
+                keys = _keys(frame[column]).reset_index(drop=True)
+                values[column] = keys.tolist()
+                positions[column], order[column] = _build(keys)
+            with self._lock:
+                self._values, self._positions, self._order = values, positions, order
+            return
+
+        with self._lock:
+            for column in self.columns:
+                values = self._values[column]
+                positions = self._positions[column]
+                order = self._order[column]
+                keys = _keys(frame[column]).tolist()
+
+                if event == "update":
+                    # Changed rows keep their positional index
+                    for position, new in zip(frame.index, keys):
+                        old = values[position]
+                        if old == new:
+                            continue
+                        if old is not None:
+                            _remove(positions, order, old, position)
+                        if new is not None:
+                            _add(positions, order, new, position)
+                        values[position] = new
+                    continue
+
+                start = len(values)
+                values.extend(keys)
+                for offset, key in enumerate(keys):
+                    if key is not None:
+                        _add(positions, order, key, start + offset)
+
+    def lookup(self, column, value):
+        """Return the positions of rows where ``column == value``, in order."""
+        if pd.isna(value):
+            return []
+        with self._lock:
+            found = self._positions[column].get(value)
+            if found is None:
+                return []
+            if isinstance(found, slice):
+                return self._order[column][found].tolist()
+            return sorted(found) if isinstance(found, set) else [found]
+
+    def stats(self):
+        with self._lock:
+            return {column: len(self._positions[column]) for column in self.columns}
+
+
+def epoch_ns(column):
+    """Parse timestamps to UTC epoch nanoseconds; unparseable values become NaT."""
+    if not isinstance(column.dtype, pd.DatetimeTZDtype):
+        column = pd.to_datetime(column, errors="coerce", utc=True, format="ISO8601")
+    return pd.DatetimeIndex(column).as_unit("ns").asi8
+
+
+class TimeIndex:
+    def __init__(self, column):
+        self.column = column
+        self._lock = threading.Lock()
+        # Epoch nanoseconds of the dated rows, sorted, and their row positions
+        self._times = np.empty(0, dtype=np.int64)
+        self._positions = np.empty(0, dtype=np.int64)
+        self._rows = 0
+
+    def _sorted(self, frame, start):
+        times = epoch_ns(frame[self.column])
+        dated = times != pd.NaT.value
+        positions = np.arange(start, start + len(frame), dtype=np.int64)[dated]
+        times = times[dated]
+        order = np.argsort(times, kind="stable")
+        return times[order], positions[order]
+
+    def on_event(self, event, frame):
+        if event == "reset":
+            times, positions = self._sorted(frame, 0)
+            with self._lock:
+                self._times, self._positions, self._rows = times, positions, len(frame)
+            return
+
+        with self._lock:
+            times, positions = self._sorted(frame, self._rows)
+            self._rows += len(frame)
+            if not len(times):
+                return
+            if not len(self._times) or times[0] >= self._times[-1]:
+                # The usual case: new rows are the latest
+                self._times = np.concatenate([self._times, times])
+                self._positions = np.concatenate([self._positions, positions])
+            else:
+                at = np.searchsorted(self._times, times, side="right")
+                self._times = np.insert(self._times, at, times)
+                self._positions = np.insert(self._positions, at, positions)
+
+    def between(self, since=None, until=None):
+        """Return positions of rows with ``since <= time < until``, in table order.
+
+        Bounds are timezone-aware ``pd.Timestamp`` values or None (unbounded).
+        """
+        with self._lock:
+            lo = 0 if since is None else np.searchsorted(self._times, since.value, side="left")
+            hi = (
+                len(self._times)
+                if until is None
+                else np.searchsorted(self._times, until.value, side="left")
+            )
+            return np.sort(self._positions[lo:hi])
+
+    def stats(self):
+        with self._lock:
+            return {self.column: len(self._times)}
@@ -0,0 +1,131 @@
+"""Per-request timing middleware and sampled cProfile dumps of slow requests.
+
+``InstrumentationMiddleware`` records every HTTP request in
+``http_request_duration_seconds`` (see ``metrics``), labelled with the route
+template rather than the raw path so user ids do not become labels.
+
+Profiling is off unless ``PROFILE_SAMPLE_RATE`` is set (e.g. ``0.05`` to
+profile one request in twenty). A sampled request runs its executor work
+(storage reads, aggregation, serialisation; see ``executors``) under
+cProfile; if it then took at least ``PROFILE_SLOW_MS`` (default 500), the
+merged stats are written to ``PROFILE_DIR`` (default ``profiles``) for
+``python -m pstats`` or snakeviz, and a warning is logged. Code running on
+the event loop itself is not profiled, as other requests share that thread.
+"""
+
+import contextvars
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from metrics import REQUEST_SECONDS, Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILES_WRITTEN = Counter(
+    "slow_request_profiles_total", "Slow sampled requests whose cProfile stats were saved.",
+    ["route"],
+)
+
+# The profile collecting the current request's executor work, if sampled
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+class _RequestProfile:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profiles = []
+
+    def run(self, fn):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn)
+        finally:
+            with self._lock:
+                self.profiles.append(profile)
+
+
+def profiled(fn):
+    """Call ``fn()``, under cProfile if the calling request is being sampled."""
+    request_profile = _current.get()
+    if request_profile is None:
+        return fn()
+    return request_profile.run(fn)
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=0.0, slow_ms=500.0, directory="profiles"):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = directory
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            slow_ms=float(os.getenv("PROFILE_SLOW_MS", "500")),
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+        )
+
+    def start(self):
+        """Begin sampling the current request, maybe; returns a token for ``finish``."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        request_profile = _RequestProfile()
+        return request_profile, _current.set(request_profile)
+
+    def finish(self, token, method, route, elapsed):
+        if token is None:
+            return
+        request_profile, reset = token
+        _current.reset(reset)
+        if elapsed * 1000 < self.slow_ms or not request_profile.profiles:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}{route}").strip("_")
+        path = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{elapsed * 1000:.0f}ms.prof"
+        )
+        pstats.Stats(*request_profile.profiles).dump_stats(path)
+        PROFILES_WRITTEN.inc(route)
+        logger.warning(
+            "Slow request %s %s took %.0f ms; profile saved to %s", method, route, elapsed * 1000, path
+        )
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware timing each request, and profiling a sample of them."""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler or RequestProfiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = self.profiler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Set by the router once a route matched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route, str(status))
+            self.profiler.finish(token, scope["method"], route, elapsed)
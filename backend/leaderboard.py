@@ -0,0 +1,352 @@
+"""Supporter and team leaderboards.
+
+Supporters: an incrementally maintained leaderboard.
+
+Per-user totals (impact points and donation counts, overall and per path) are
+kept in memory and updated as donation rows are appended, instead of being
+rebuilt with several groupbys on every request. Each path, plus ``"ALL"``, has
+its own ranking kept sorted by ``(-points, uuid)``, so a page of the leaderboard
+is a slice and an update is a pair of binary searches.
+
+The engine subscribes to the ``donations`` and ``users`` tables: a full reload
+of either rebuilds its state in one vectorised pass, appends are applied row by
+row. Rankings limited to a time range (``since``/``until``) are computed from
+just the donations in that range, found through the storage's time index.
+
+Rolling windows (``WINDOWS``: the last 7 or 30 UTC days) are served from
+per-day buckets of points and counts per path and user, maintained alongside
+the totals. A windowed ranking sums at most 30 buckets instead of scanning the
+donations; buckets that fall out of the longest window are dropped, since
+their rows only count towards the all-time totals from then on.
+
+Teams: ``rank_teams`` computes every team's totals in one joined aggregation.
+Windowed team rankings feed it the windowed per-user points instead of the
+donations, so members are counted by their current team.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from indexes import epoch_ns
+
+ALL_PATHS = "ALL"
+# Rolling leaderboard windows, in days (including today)
+WINDOWS = {"week": 7, "month": 30}
+_DAY_NS = 86_400 * 10**9
+
+
+def _today():
+    return time.time_ns() // _DAY_NS
+
+
+def _display_name(fname, lname, email):
+    if pd.notna(fname) and pd.notna(lname):
+        return f"{fname} {lname}".strip()
+    return email if pd.notna(email) else None
+
+
+class _Ranking:
+    """Keys ``(-points, uuid)`` kept in sorted order."""
+
+    def __init__(self):
+        self.keys = []
+
+    def rebuild(self, points_by_uuid):
+        self.keys = sorted((-points, uuid) for uuid, points in points_by_uuid.items())
+
+    def move(self, uuid, old_points, new_points):
+        if old_points is not None:
+            i = bisect.bisect_left(self.keys, (-old_points, uuid))
+            del self.keys[i]
+        bisect.insort(self.keys, (-new_points, uuid))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class _DailyBuckets:
+    """Points and donation counts per UTC day, path and user, for recent days."""
+
+    def __init__(self, days):
+        self.days = days
+        # day -> path -> uuid -> [points, count], with ALL_PATHS for totals
+        self.buckets = {}
+
+    def rebuild(self, frame, today):
+        df = frame[["uuid", "path", "impact_points", "created_at"]].dropna(subset=["uuid"])
+        if not isinstance(df["created_at"].dtype, pd.DatetimeTZDtype):
+            # ISO 8601 strings sort by date, so only recent rows need parsing
+            # (from a day early, as offsets can move the UTC date)
+            cutoff = pd.Timestamp((today - self.days) * _DAY_NS, tz="UTC").date().isoformat()
+            df = df[df["created_at"].astype(str) >= cutoff]
+        days = epoch_ns(df["created_at"]) // _DAY_NS
+        recent = days > today - self.days
+        df = df[recent].assign(
+            day=days[recent], impact_points=df["impact_points"][recent].fillna(0).astype(float)
+        )
+
+        buckets = {}
+        per_user = df.groupby(["day", "uuid"])["impact_points"].agg(["sum", "size"])
+        per_path = df.groupby(["day", "path", "uuid"])["impact_points"].agg(["sum", "size"])
+        for (day, uuid), (total, size) in zip(
+            per_user.index, per_user[["sum", "size"]].itertuples(index=False)
+        ):
+            buckets.setdefault(day, defaultdict(dict))[ALL_PATHS][uuid] = [total, size]
+        for (day, path, uuid), (total, size) in zip(
+            per_path.index, per_path[["sum", "size"]].itertuples(index=False)
+        ):
+            buckets[day][path][uuid] = [total, size]
+        self.buckets = buckets
+
+    def add(self, day, path, uuid, points):
+        entry = self.buckets.setdefault(day, defaultdict(dict))[path].setdefault(uuid, [0.0, 0])
+        entry[0] += points
+        entry[1] += 1
+
+    def roll(self, today):
+        """Drop the buckets older than the longest window."""
+        for day in [d for d in self.buckets if d <= today - self.days]:
+            del self.buckets[day]
+
+    def totals(self, first_day, last_day):
+        """Return ``(points, counts)`` per path and user over the given days."""
+        points = defaultdict(lambda: defaultdict(float))
+        counts = defaultdict(lambda: defaultdict(int))
+        for day, paths in self.buckets.items():
+            if not first_day <= day <= last_day:
+                continue
+            for path, users in paths.items():
+                path_points, path_counts = points[path], counts[path]
+                for uuid, (total, size) in users.items():
+                    path_points[uuid] += total
+                    path_counts[uuid] += size
+        return points, counts
+
+
+class SupporterLeaderboard:
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._names = {}
+        self._buckets = _DailyBuckets(max(WINDOWS.values()))
+        # (window, today) -> (points, counts, rankings by path), until the next donation
+        self._window_totals = {}
+        self._reset_totals()
+        storage.subscribe("users", self._on_users, updates=True)
+        storage.subscribe("donations", self._on_donations)
+
+    def _reset_totals(self):
+        # points[path][uuid] / counts[path][uuid], with ALL_PATHS for totals
+        self._points = defaultdict(dict)
+        self._counts = defaultdict(dict)
+        self._rankings = defaultdict(_Ranking)
+
+    def _on_users(self, event, frame):
+        names = {
+            row.uuid: _display_name(row.fname, row.lname, row.email)
+            for row in frame[["uuid", "fname", "lname", "email"]].itertuples()
+        }
+        with self._lock:
+            if event == "reset":
+                self._names = names
+            else:
+                self._names.update(names)
+
+    def _on_donations(self, event, frame):
+        if event == "reset":
+            self._rebuild(frame)
+            return
+
+        days = (epoch_ns(frame["created_at"]) // _DAY_NS).tolist()
+        first_day = _today() - self._buckets.days + 1
+        with self._lock:
+            self._window_totals = {}
+            for (uuid, path, points), day in zip(
+                frame[["uuid", "path", "impact_points"]].itertuples(index=False), days
+            ):
+                if pd.isna(uuid):
+                    continue
+                points = 0.0 if pd.isna(points) else float(points)
+                self._add(ALL_PATHS, uuid, points)
+                if pd.notna(path):
+                    self._add(path, uuid, points)
+                if day >= first_day:
+                    self._buckets.add(day, ALL_PATHS, uuid, points)
+                    if pd.notna(path):
+                        self._buckets.add(day, path, uuid, points)
+
+    def _add(self, path, uuid, points):
+        path_points = self._points[path]
+        path_counts = self._counts[path]
+        old = path_points.get(uuid)
+        new = (old or 0.0) + points
+        path_points[uuid] = new
+        path_counts[uuid] = path_counts.get(uuid, 0) + 1
+        self._rankings[path].move(uuid, old, new)
+
+    def _rebuild(self, frame):
+        points, counts, rankings = _aggregate(frame)
+        buckets = _DailyBuckets(self._buckets.days)
+        buckets.rebuild(frame, _today())
+        with self._lock:
+            self._points, self._counts, self._rankings = points, counts, rankings
+            self._buckets = buckets
+            self._window_totals = {}
+
+    def _totals_for(self, window):
+        """Return ``(points, counts, rankings)`` over ``window`` (lock held)."""
+        today = _today()
+        cached = self._window_totals.get((window, today))
+        if cached is None:
+            self._buckets.roll(today)
+            points, counts = self._buckets.totals(today - WINDOWS[window] + 1, today)
+            # Rankings are sorted on first use, per path
+            cached = (points, counts, {})
+            self._window_totals[(window, today)] = cached
+        return cached
+
+    def window_points(self, window):
+        """Return a ``uuid``/``impact_points`` frame of per-user points over ``window``."""
+        self._storage.load("donations")
+        with self._lock:
+            points = self._totals_for(window)[0][ALL_PATHS]
+            return pd.DataFrame(
+                {"uuid": list(points), "impact_points": list(points.values())},
+                columns=["uuid", "impact_points"],
+            )
+
+    def top(self, path=None, limit=None, offset=0, since=None, until=None, window=None):
+        """Return ``(total, page)`` of supporters ranked by impact points.
+
+        ``since``/``until`` (timezone-aware timestamps) only count donations
+        made in ``[since, until)``; ``window`` (a key of ``WINDOWS``) only
+        those of the last days.
+        """
+        # Loading syncs the engine if the tables changed outside this process
+        self._storage.load("users")
+        self._storage.load("donations")
+
+        key = path if path and path != ALL_PATHS else ALL_PATHS
+        if window is not None:
+            with self._lock:
+                points, counts, rankings = self._totals_for(window)
+                if key not in rankings:
+                    rankings[key] = _Ranking()
+                    rankings[key].rebuild(points.get(key, {}))
+                return _page(rankings, counts, self._names, key, limit, offset)
+
+        if since is not None or until is not None:
+            donations = self._storage.find(
+                "donations", columns=["uuid", "path", "impact_points"], since=since, until=until
+            )
+            _, counts, rankings = _aggregate(donations)
+            with self._lock:
+                return _page(rankings, counts, self._names, key, limit, offset)
+
+        with self._lock:
+            return _page(self._rankings, self._counts, self._names, key, limit, offset)
+
+
+def _aggregate(frame):
+    """Return ``(points, counts, rankings)`` per path for the donations in ``frame``."""
+    df = frame[["uuid", "path", "impact_points"]].dropna(subset=["uuid"])
+    df = df.assign(impact_points=df["impact_points"].fillna(0).astype(float))
+    totals = df.groupby("uuid")["impact_points"].agg(["sum", "size"])
+    per_path = df.groupby(["path", "uuid"])["impact_points"].agg(["sum", "size"])
+
+    points = defaultdict(dict)
+    counts = defaultdict(dict)
+    points[ALL_PATHS] = totals["sum"].to_dict()
+    counts[ALL_PATHS] = totals["size"].to_dict()
+    for (path, uuid), (total, size) in zip(
+        per_path.index, per_path[["sum", "size"]].itertuples(index=False)
+    ):
+        points[path][uuid] = total
+        counts[path][uuid] = size
+
+    rankings = defaultdict(_Ranking)
+    for path, path_points in points.items():
+        rankings[path].rebuild(path_points)
+    return points, counts, rankings
+
+
+def _primary_path(counts, uuid):
+    # Most donations wins; ties go to the alphabetically first path, as
+    # groupby(...).idxmax() did.
+    best = None
+    for path, path_counts in counts.items():
+        count = path_counts.get(uuid)
+        if path == ALL_PATHS or not count:
+            continue
+        if best is None or (-count, path) < (-best[1], best[0]):
+            best = (path, count)
+    return best[0] if best else None
+
+
+def _page(rankings, counts, names, key, limit, offset):
+    ranking = rankings.get(key)
+    if ranking is None:
+        return 0, []
+    end = None if limit is None else offset + limit
+    page = ranking.keys[offset:end]
+    path_counts = counts[key]
+    result = [
+        {
+            "user_id": uuid,
+            "display_name": names.get(uuid),
+            "total_points": int(-neg_points),
+            "total_donations": int(path_counts[uuid]),
+            "primary_path": key if key != ALL_PATHS else _primary_path(counts, uuid),
+        }
+        for neg_points, uuid in page
+    ]
+    return len(ranking), result
+
+
+def rank_teams(teams_df, users_df, donations_df):
+    """Rank teams by the total impact points of their members.
+
+    One grouped pass over donations (points per user) and one over users
+    (members per team) replace the old per-team filtering, so the cost is
+    linear in the table sizes rather than teams x users.
+    """
+    # Summed in float64 even when the points column was parsed as integers
+    points = donations_df["impact_points"].astype("float64")
+    user_points = points.groupby(donations_df["uuid"], sort=False).sum()
+
+    members = users_df[["uuid", "team_id"]]
+    member_counts = members.groupby("team_id", sort=False).size()
+    if not members["uuid"].is_unique:
+        # A user listed twice still only contributes their points once
+        members = members.drop_duplicates()
+    team_points = (
+        members["uuid"]
+        .map(user_points)
+        .fillna(0)
+        .groupby(members["team_id"], sort=False)
+        .sum()
+    )
+
+    # Only the leaders' display names are needed
+    leaders = users_df[users_df["uuid"].isin(teams_df["leader_uuid"])]
+    leaders = leaders.drop_duplicates("uuid").set_index("uuid")
+    full_names = (
+        leaders["fname"].fillna("").astype(str)
+        + " "
+        + leaders["lname"].fillna("").astype(str)
+    ).str.strip()
+    leader_names = full_names.where(full_names != "", leaders["email"])
+
+    teams = teams_df[["team_id", "name", "leader_uuid"]]
+    ranked = teams.assign(
+        leader_name=teams["leader_uuid"].map(leader_names),
+        member_count=teams["team_id"].map(member_counts).fillna(0).astype(int),
+        total_points=teams["team_id"].map(team_points).fillna(0).astype(int),
+    ).sort_values("total_points", ascending=False, kind="stable")
+
+    ranked = ranked.astype(object).where(pd.notna(ranked), None)
+    return ranked.to_dict(orient="records")
@@ -0,0 +1,34 @@
+"""Cross-process file locks for the CSV tables.
+
+Each table gets a sidecar ``<file>.lock`` that writers hold with ``flock``
+while they read-modify-write or append to the table, so several uvicorn
+workers can share the same CSV files without losing rows. On platforms
+without ``fcntl`` the lock degrades to a no-op (single-process use only).
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+class FileLock:
+    def __init__(self, path):
+        self.path = f"{path}.lock"
+
+    @contextmanager
+    def hold(self):
+        if fcntl is None:
+            yield
+            return
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
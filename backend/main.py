@@ -1,13 +1,35 @@
-from fastapi import FastAPI, HTTPException, Response, Cookie
+from fastapi import FastAPI, HTTPException, Request, Response, Cookie, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
-import hashlib, base64, re, time, secrets, bcrypt
+import asyncio, hashlib, base64, math, re, time, secrets
 from typing import Optional
 import pandas as pd
 import datetime
+import logging
 import os
 
-salt = bcrypt.gensalt()
+import donation_batch
+import metrics
+from badges import DONATION_STATS, TEAM_STATS, BadgeAwarder
+from executors import run_cpu, run_io, stats as executor_stats
+from framejson import frame_rows, json_response
+from hopewall import HopeWall
+from instrumentation import InstrumentationMiddleware, RequestProfiler
+from leaderboard import WINDOWS, SupporterLeaderboard, rank_teams
+from metrics import SERIALIZATION_SECONDS
+from passwords import HasherBusy, PasswordHasher
+from referral_graph import RANKINGS, ReferralGraph
+from referrals import ReferralService
+from sessions import SessionStore
+from storage import AsyncStorage, open_storage
+from userstats import UserStatsCache
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
 
 cors_origins_env = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000,http://localhost:80,http://localhost")
 origins = [origin.strip() for origin in cors_origins_env.split(",")]
@@ -20,92 +42,70 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the timings include the other middleware
+app.add_middleware(InstrumentationMiddleware, profiler=RequestProfiler.from_env())
+
+
+storage = open_storage()
+# Awaitable storage calls for the endpoints, run on the I/O executor
+db = AsyncStorage(storage)
+supporter_leaderboard = SupporterLeaderboard(storage)
+badge_awarder = BadgeAwarder(storage)
+user_stats = UserStatsCache(storage, capacity=int(os.getenv("USER_STATS_CACHE_SIZE", "10000")))
+password_hasher = PasswordHasher(
+    workers=int(os.environ["PASSWORD_HASH_WORKERS"]) if os.getenv("PASSWORD_HASH_WORKERS") else None,
+    max_pending=int(os.getenv("PASSWORD_HASH_QUEUE", "0")) or None,
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+sessions = SessionStore(
+    ttl=SESSION_TTL,
+    path=os.getenv("SESSION_STORE_PATH", ".athena_sessions") or None,
+)
+# The moderation endpoints require a matching X-Moderation-Token header; they
+# are disabled while this is unset
+MODERATION_TOKEN = os.getenv("MODERATION_TOKEN", "")
+# Required in an X-Admin-Token header by /datastore/stats and /metrics,
+# which are disabled while this is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Most rows accepted by one POST /donations/batch
+DONATION_BATCH_MAX_ROWS = int(os.getenv("DONATION_BATCH_MAX_ROWS", "50000"))
 
 
-def load_users():
-    df = pd.read_csv("users.csv")
-    # Ensure team_id column exists and uses empty string instead of NaN/null
-    if "team_id" not in df.columns:
-        df["team_id"] = ""
-    else:
-        df["team_id"] = df["team_id"].fillna("")
-    return df
-
-
-def load_donations():
-    try:
-        df = pd.read_csv("donations.csv")
-    except FileNotFoundError:
-        df = pd.DataFrame(
-            columns=["uuid", "amount", "path", "impact_points", "hours", "created_at"]
-        )
+async def load_users():
+    return await db.load("users")
 
-    # Ensure newer columns exist even if older CSVs don't have them yet
-    for col in ["hours", "created_at"]:
-        if col not in df.columns:
-            df[col] = None
 
-    return df
+async def load_donations(columns=None):
+    return await db.load("donations", columns)
 
 
-def load_referrals():
-    """Load referrals from CSV.
+async def load_referrals():
+    """Load referrals from storage.
 
     Columns: referrer_id, referred_id, code, hasDonated
     """
-    try:
-        return pd.read_csv("referrals.csv")
-    except FileNotFoundError:
-        return pd.DataFrame(
-            columns=["referrer_id", "referred_id", "code", "hasDonated"]
-        )
+    return await db.load("referrals")
 
 
-def load_has_badges():
-    """Load user-badge assignments from CSV.
+async def load_has_badges():
+    """Load user-badge assignments from storage.
 
     Columns: uuid, badge_id
     """
-    try:
-        return pd.read_csv("hasBadges.csv")
-    except FileNotFoundError:
-        return pd.DataFrame(columns=["uuid", "badge_id"])
-
-
-MESSAGES_CSV = "hope_wall_messages.csv"
-MESSAGE_COLUMNS = [
-    "id",
-    "display_name",
-    "message",
-    "language",
-    "created_date",
-    "is_approved",
-]
-APPROVED_TRUE_VALUES = {"1", "true", "yes", "approved", "y"}
+    return await db.load("has_badges")
 
 
-def load_hope_wall_messages():
-    try:
-        df = pd.read_csv(MESSAGES_CSV)
-    except FileNotFoundError:
-        df = pd.DataFrame(columns=MESSAGE_COLUMNS)
-
-    for column in MESSAGE_COLUMNS:
-        if column not in df.columns:
-            df[column] = False if column == "is_approved" else ""
-
-    if df.empty:
-        return df
-
-    df["is_approved"] = (
-        df["is_approved"]
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .isin(APPROVED_TRUE_VALUES)
-    )
+async def load_teams():
+    """Load teams from storage.
+
+    Columns: team_id, name, leader_uuid
+    """
+    return await db.load("teams")
+
 
-    return df
+async def load_hope_wall_messages():
+    return await db.load("hope_wall_messages")
 
 
 DEFAULT_HOPE_WALL_MESSAGES = [
@@ -178,39 +178,45 @@ DEFAULT_HOPE_WALL_MESSAGES = [
 ]
 
 
-def combine_hope_wall_messages():
-    persisted = load_hope_wall_messages()
-    persisted_records = []
+hope_wall = HopeWall(storage, DEFAULT_HOPE_WALL_MESSAGES)
+referrals = ReferralService(storage)
+referral_graph = ReferralGraph(storage)
 
-    if not persisted.empty:
-        persisted = persisted.copy()
-        if "is_approved" not in persisted.columns:
-            persisted["is_approved"] = False
 
-        persisted["is_approved"] = (
-            persisted["is_approved"]
-            .astype(str)
-            .str.strip()
-            .str.lower()
-            .isin(APPROVED_TRUE_VALUES)
+def collect_metrics():
+    """Cache, executor, password hashing and session counters for /metrics."""
+    tables = storage.stats()["tables"]
+    for counter in ("hits", "misses", "reloads", "tail_reloads"):
+        yield (
+            f"datastore_cache_{counter}_total",
+            "counter",
+            f"Table cache {counter.replace('_', ' ')}.",
+            [({"table": name}, values[counter]) for name, values in tables.items()],
+        )
+    pools = executor_stats()
+    for field in ("queued", "running"):
+        yield (
+            f"executor_{field}",
+            "gauge",
+            f"Calls {field} on each executor.",
+            [({"pool": name}, values[field]) for name, values in pools.items()],
         )
+    hasher = password_hasher.stats()
+    yield ("password_hash_pending", "gauge", "Password checks in progress.", [({}, hasher["pending"])])
+    yield (
+        "password_hash_rejected_total",
+        "counter",
+        "Password checks refused because the queue was full.",
+        [({}, hasher["rejected"])],
+    )
+    yield ("sessions_active", "gauge", "Sessions held in memory.", [({}, sessions.stats()["active"])])
 
-        approved = persisted[persisted["is_approved"]]
-        if not approved.empty:
-            approved = approved.fillna("")
-            persisted_records = approved.to_dict(orient="records")
 
-    combined = DEFAULT_HOPE_WALL_MESSAGES + persisted_records
-    combined.sort(
-        key=lambda m: pd.to_datetime(m.get("created_date"), errors="coerce"),
-        reverse=True,
-    )
-    return combined
+metrics.register_collector(collect_metrics)
 
 
-def check_user_exists(email: str, password: str) -> str:
-    df = load_users()
-    user = df[(df["email"] == email) & (df["password"] == password)]
+async def check_user_exists(email: str, password: str) -> str:
+    user = await db.find("users", email=email, password=password)
     if not user.empty:
         return user.iloc[0].to_dict()
     return None
@@ -245,37 +251,92 @@ def gen_uuid(length: int = 8, salt: str = "yourSaltHere") -> str:
     return uid[:length]
 
 
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def parse_timestamp(value, name):
+    """Parse an ISO 8601 date/time (naive = UTC) or epoch seconds to a UTC Timestamp."""
+    try:
+        if isinstance(value, (int, float)) or re.fullmatch(r"-?\d+(\.\d+)?", str(value)):
+            timestamp = pd.Timestamp(float(value), unit="s", tz="UTC")
+        else:
+            timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError, OverflowError):
+        timestamp = pd.NaT
+    if pd.isna(timestamp):
+        raise HTTPException(
+            status_code=400, detail=f"{name} must be an ISO 8601 date/time or epoch seconds"
+        )
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def parse_amount(value, name):
+    """Parse a finite number >= 0 sent in a request body."""
+    try:
+        # JSON booleans would otherwise pass as 0/1
+        number = float(value) if not isinstance(value, bool) else math.nan
+    except (TypeError, ValueError):
+        number = math.nan
+    if not math.isfinite(number) or number < 0:
+        raise HTTPException(status_code=400, detail=f"{name} must be a number >= 0")
+    return number
+
+
+def leaderboard_window(window, since, until):
+    """Validate the window query param; returns None for all-time."""
+    if window is None or window == "all":
+        return None
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=400, detail=f"window must be one of: all, {', '.join(WINDOWS)}"
+        )
+    if since is not None or until is not None:
+        raise HTTPException(status_code=400, detail="window cannot be combined with since/until")
+    return window
+
+
+def time_range(since, until):
+    """Parse the since/until query params (either may be None)."""
+    return (
+        None if since is None else parse_timestamp(since, "since"),
+        None if until is None else parse_timestamp(until, "until"),
+    )
+
+
 # Routes:
 # Login route
 @app.post("/login")
-def login(data: dict, response: Response):
+async def login(data: dict, response: Response):
     email = data.get("email")
     password = data.get("password")
 
-    df = load_users()
-    user_df = df[(df["email"] == email)]
+    user_df = await db.find("users", email=email)
 
     stored_password = user_df["password"].iloc[0] if not user_df.empty else None
     if stored_password is not None:
         try:
-            if not bcrypt.checkpw(
-                password.encode("utf-8"), stored_password.encode("utf-8")
-            ):
+            if not await password_hasher.check(password, stored_password):
                 return {"status": "error", "message": "Invalid password"}
-        except Exception:
-            return {"status": "error", "message": "Invalid password"}
+        except HasherBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many login attempts in progress, please retry",
+                headers={"Retry-After": "1"},
+            )
 
     if user_df.empty:
         return {"status": "error", "message": "Invalid email or password"}
 
     user = user_df.iloc[0].to_dict()
 
-    # Set a simple session cookie
     response.set_cookie(
         key="session",
-        value=user["uuid"],
+        value=await run_io(sessions.create, user["uuid"]),
         httponly=True,
-        max_age=3600,
+        max_age=SESSION_TTL,
     )
 
     # Do not expose password hash to the client
@@ -286,7 +347,7 @@ def login(data: dict, response: Response):
 
 # Signup route
 @app.post("/signup")
-def signup(data: dict, response: Response):
+async def signup(data: dict, response: Response):
     email = data.get("email")
     password = data.get("password")
     confirmpass = data.get("confirmpass")
@@ -297,13 +358,18 @@ def signup(data: dict, response: Response):
         # raise HTTPException(status_code=400, detail="Passwords do not match")
         return {"status": "error", "message": "Passwords do not match"}
 
-    df = load_users()
-
-    if not df[df["email"] == email].empty:
+    if not (await db.find("users", email=email)).empty:
         # raise HTTPException(status_code=400, detail="Email already exists")
         return {"status": "error", "message": "Email already exists"}
 
-    encrypted_password = bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+    try:
+        encrypted_password = await password_hasher.hash(password)
+    except HasherBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many signups in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
 
     new_user = {
         "uuid": gen_uuid(),
@@ -314,17 +380,14 @@ def signup(data: dict, response: Response):
         "team_id": "",
     }
 
-    new_user_df = pd.DataFrame([new_user])
-
-    df = pd.concat([df, new_user_df], ignore_index=True)
-    df.to_csv("users.csv", index=False)
+    await db.append("users", [new_user])
 
     # Set session cookie so the user is logged in right after signup
     response.set_cookie(
         key="session",
-        value=new_user["uuid"],
+        value=await run_io(sessions.create, new_user["uuid"]),
         httponly=True,
-        max_age=3600,
+        max_age=SESSION_TTL,
     )
 
     user_sanitized = {k: v for k, v in new_user.items() if k != "password"}
@@ -337,13 +400,14 @@ def signup(data: dict, response: Response):
 
 
 @app.post("/logout")
-def logout(response: Response):
+async def logout(response: Response, session: Optional[str] = Cookie(default=None)):
+    await run_io(sessions.revoke, session)
     response.delete_cookie(key="session")
     return {"status": "ok", "message": "Logged out!"}
 
 
 @app.post("/volunteer")
-def volunteer(data: dict):
+async def volunteer(data: dict):
     """Record volunteer hours as zero-amount SERVICE entries in donations.csv."""
     uuid = data.get("uuid")
     hours = data.get("hours")
@@ -357,25 +421,28 @@ def volunteer(data: dict):
     except (TypeError, ValueError):
         raise HTTPException(status_code=400, detail="hours must be a number")
 
-    donations_df = load_donations()
+    # Stored in the same normalised UTC form as every other donation
+    if start_date:
+        created_at = parse_timestamp(start_date, "date").isoformat()
+    else:
+        created_at = utc_now()
+
     new_volunteer = {
         "uuid": uuid,
         "amount": 0,
         "path": "SERVICE",
         "impact_points": hours_val * 10,  # 10 impact points per hour
         "hours": hours_val,
-        "created_at": start_date,
+        "created_at": created_at,
     }
-    donations_df = pd.concat(
-        [donations_df, pd.DataFrame([new_volunteer])], ignore_index=True
-    )
-    donations_df.to_csv("donations.csv", index=False)
+    await db.append("donations", [new_volunteer])
+    await run_io(badge_awarder.award, uuid, DONATION_STATS)
 
     return {"status": "ok", "message": "Volunteer hours recorded"}
 
 
 @app.post("/donate")
-def donate(data: dict, response: Response):
+async def donate(data: dict, response: Response):
     amount = data.get("amount")
     path = data.get("path")
     uuid = data.get("uuid")
@@ -386,8 +453,10 @@ def donate(data: dict, response: Response):
         raise HTTPException(
             status_code=400, detail="amount, path and uuid are required"
         )
-
-    donations_df = load_donations()
+    # Checked before writing: a stored non-number breaks every aggregate over donations
+    amount = parse_amount(amount, "amount")
+    if impact is not None:
+        impact = parse_amount(impact, "impact")
 
     new_donation = {
         "uuid": uuid,
@@ -395,57 +464,25 @@ def donate(data: dict, response: Response):
         "path": path,
         "impact_points": impact,
         "hours": 0,
-        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "created_at": utc_now(),
     }
-    donations_df = pd.concat(
-        [donations_df, pd.DataFrame([new_donation])], ignore_index=True
-    )
-    donations_df.to_csv("donations.csv", index=False)
+    await db.append("donations", [new_donation])
+    await run_io(badge_awarder.award, uuid, DONATION_STATS)
 
     # Handle referral on first donation, if a referral code is provided
     if referral_code:
-        referrals_df = load_referrals()
-
         # Count donations for this user (after inserting the new donation)
-        user_donations = donations_df[donations_df["uuid"] == uuid]
-        is_first_donation = len(user_donations) == 1
+        is_first_donation = await run_io(referrals.donation_count, uuid) == 1
 
         # Try to resolve referrer_id from code like "REF-<UUID>"
-        referrer_uuid = None
-        if isinstance(referral_code, str) and referral_code.startswith("REF-"):
-            # Extract everything after the "REF-" prefix; do NOT use strip here
-            candidate_uuid = referral_code[len("REF-") :]
-            users_df = load_users()
-            if not users_df[users_df["uuid"] == candidate_uuid].empty:
-                referrer_uuid = candidate_uuid
-
-        print("Referrer UUID resolved to:", referrer_uuid)
-        if is_first_donation:
-            # See if a referral row already exists for this referred user + code
-            existing = referrals_df[
-                (referrals_df["referred_id"] == uuid)
-                & (referrals_df["code"] == referral_code)
-            ]
-
-            if not existing.empty:
-                # Mark as donated and fill referrer_id if we resolved it
-                referrals_df.loc[existing.index, "hasDonated"] = True
-                if referrer_uuid is not None:
-                    referrals_df.loc[existing.index, "referrer_id"] = referrer_uuid
-            else:
-                # Record new referral row
-                new_ref = {
-                    "referrer_id": referrer_uuid,
-                    "referred_id": uuid,
-                    "code": referral_code,
-                    "hasDonated": True,
-                }
-                referrals_df = pd.concat(
-                    [referrals_df, pd.DataFrame([new_ref])], ignore_index=True
-                )
-
-            referrals_df.to_csv("referrals.csv", index=False)
-
+        referrer_uuid = await run_io(referrals.resolve_code, referral_code)
+
+        logger.info("Referral code %r resolved to referrer %s", referral_code, referrer_uuid)
+        # Mark the referral (new or recorded earlier) as donated; only the
+        # request that does so rewards the referrer
+        if is_first_donation and await run_io(
+            referrals.record_donation, uuid, referral_code, referrer_uuid
+        ):
             # Award +10 points to referrer as a separate "bonus" donation entry
             # with amount 0 and path None, so all impact is derived from donations.csv
             if referrer_uuid is not None:
@@ -455,27 +492,97 @@ def donate(data: dict, response: Response):
                     "path": "Referral Bonus",
                     "impact_points": 10,
                     "hours": None,
-                    "created_at": datetime.utcnow().isoformat(),
+                    "created_at": utc_now(),
                 }
-                donations_df = pd.concat(
-                    [donations_df, pd.DataFrame([bonus])], ignore_index=True
-                )
-                donations_df.to_csv("donations.csv", index=False)
+                await db.append("donations", [bonus])
+                await run_io(badge_awarder.award, referrer_uuid, DONATION_STATS)
 
     return {"status": "ok", "message": "Donation recorded!"}
 
 
+@app.post("/donations/batch")
+async def donate_batch(request: Request, format: Optional[str] = None):
+    """Record many donations in one write.
+
+    The body is a JSON array of donations (``{"donations": [...]}`` works
+    too), CSV with a header row, or NDJSON, chosen by ``format`` or else the
+    Content-Type. A multipart upload is read from its ``file`` field, with the
+    format taken from the file name or its content type if not given.
+
+    Each row takes the fields of ``/donate`` (``uuid``, ``amount``, ``path``,
+    ``impact``/``impact_points``) plus optional ``hours`` and ``created_at``;
+    referral codes are not applied to batch rows. Invalid rows are reported
+    by position (from 0) and skipped; the valid ones are appended together,
+    and leaderboards, user stats and badges are updated once for the batch.
+    """
+    if format is not None and format not in donation_batch.FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of: {', '.join(donation_batch.FORMATS)}"
+        )
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="file is required")
+        body = await upload.read()
+        fmt = format or donation_batch.detect_format(upload.content_type, upload.filename)
+    else:
+        body = await request.body()
+        fmt = format or donation_batch.detect_format(content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=400, detail="Cannot tell the batch format; pass format=json|csv|ndjson"
+        )
+    return await record_batch(body, fmt)
+
+
+async def record_batch(body, fmt):
+    try:
+        frame, errors = await run_cpu(donation_batch.read_batch, body, fmt)
+    except donation_batch.BatchError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if len(frame) > DONATION_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"A batch holds at most {DONATION_BATCH_MAX_ROWS} rows"
+        )
+
+    rows, errors = await run_cpu(donation_batch.validate, frame, errors, utc_now())
+    if rows:
+        await db.append("donations", rows)
+        await run_io(badge_awarder.award_many, [row["uuid"] for row in rows], DONATION_STATS)
+    return {
+        "status": "ok",
+        "received": len(frame),
+        "recorded": len(rows),
+        "rejected": len(errors),
+        "errors": errors,
+    }
+
+
 @app.get("/hope_wall/messages")
-def get_hope_wall_messages(limit: Optional[int] = None):
-    """Return Hope Wall messages, combining defaults with persisted entries."""
-    messages = combine_hope_wall_messages()
-    if limit:
-        messages = messages[:limit]
-    return {"messages": messages}
+async def get_hope_wall_messages(
+    limit: Optional[int] = None, if_none_match: Optional[str] = Header(default=None)
+):
+    """Return Hope Wall messages, combining defaults with approved entries.
+
+    Responses carry an ETag; a request whose If-None-Match matches it gets an
+    empty 304 instead of the body.
+    """
+    if limit is not None and limit < 0:
+        raise HTTPException(status_code=400, detail="limit must be >= 0")
+
+    etag, body = await run_io(hope_wall.page, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/hope_wall/messages")
-def create_hope_wall_message(data: dict):
+async def create_hope_wall_message(data: dict):
     """Persist a new Hope Wall message to CSV storage."""
     display_name = (data.get("display_name") or "").strip() or "Anonymous"
     message_text = (data.get("message") or "").strip()
@@ -498,95 +605,222 @@ def create_hope_wall_message(data: dict):
         "is_approved": False,
     }
 
-    messages_df = load_hope_wall_messages()
-    messages_df = pd.concat([messages_df, pd.DataFrame([new_message])], ignore_index=True)
-    messages_df.to_csv(MESSAGES_CSV, index=False)
+    await db.append("hope_wall_messages", [new_message])
 
     return {"status": "ok", "message": new_message}
 
 
+def check_token(token, expected, name):
+    """403 unless ``token`` matches ``expected`` (always, if that is unset)."""
+    if not expected:
+        raise HTTPException(status_code=403, detail=f"{name} is disabled: no token is configured")
+    if not secrets.compare_digest(token or "", expected):
+        raise HTTPException(status_code=403, detail=f"Invalid {name.lower()} token")
+
+
+def check_moderation_token(token):
+    check_token(token, MODERATION_TOKEN, "Moderation")
+
+
+@app.get("/hope_wall/moderation/pending")
+async def get_pending_hope_wall_messages(
+    limit: int = 50,
+    after: Optional[int] = None,
+    x_moderation_token: Optional[str] = Header(default=None),
+):
+    """Return Hope Wall messages awaiting moderation, oldest first.
+
+    ``next_after`` is the cursor for the next page (null on the last one).
+    """
+    check_moderation_token(x_moderation_token)
+    if limit < 1 or (after is not None and after < 0):
+        raise HTTPException(status_code=400, detail="limit must be >= 1 and after >= 0")
+
+    total, messages, next_after = await run_io(hope_wall.pending, limit, after)
+    return {"messages": messages, "next_after": next_after, "total": total}
+
+
+@app.post("/hope_wall/moderation")
+async def moderate_hope_wall_messages(
+    data: dict, x_moderation_token: Optional[str] = Header(default=None)
+):
+    """Approve and/or reject Hope Wall messages by id, in one batch.
+
+    Body: {"approve": [ids], "reject": [ids]}. Ids that do not exist are
+    reported back in ``unknown`` and the rest are still applied.
+    """
+    check_moderation_token(x_moderation_token)
+    approve = data.get("approve") or []
+    reject = data.get("reject") or []
+    if not isinstance(approve, list) or not isinstance(reject, list):
+        raise HTTPException(status_code=400, detail="approve and reject must be lists of ids")
+    approve = [str(message_id) for message_id in approve]
+    reject = [str(message_id) for message_id in reject]
+    if set(approve) & set(reject):
+        raise HTTPException(status_code=400, detail="A message cannot be both approved and rejected")
+
+    unknown = await run_io(hope_wall.moderate, approve, reject)
+    return {
+        "status": "ok",
+        "approved": len([i for i in approve if i not in unknown]),
+        "rejected": len([i for i in reject if i not in unknown]),
+        "unknown": unknown,
+    }
+
+
 @app.get("/users/{uuid}/badges")
-def get_user_badges(uuid: str):
+async def get_user_badges(uuid: str):
     """Return all badges a user has earned, joined with badge metadata."""
-    has_df = load_has_badges()
+    user_badges = await db.find("has_badges", uuid=uuid)
+    return json_response({"badges": user_badges})
 
-    user_badges = has_df[has_df["uuid"] == uuid]
-    if user_badges.empty:
-        return {"badges": []}
 
-    return {"badges": user_badges.to_dict(orient="records")}
+@app.get("/users/{uuid}/donations")
+async def get_user_donations(
+    uuid: str, since: Optional[str] = None, until: Optional[str] = None
+):
+    """Return all donations for a user, optionally only those made in [since, until)."""
+    since, until = time_range(since, until)
+    user_df = await db.find("donations", uuid=uuid, since=since, until=until)
+    # Empty cells are replaced with a placeholder in the JSON output
+    return json_response({"donations": user_df}, placeholder=" ")
 
 
-@app.get("/users/{uuid}/donations")
-def get_user_donations(uuid: str):
-    """Return all donations for a user from donations.csv."""
-    df = load_donations()
-    user_df = df[df["uuid"] == uuid]
-    # Sanitize the json output by replacing empty cells with a placeholder
-    user_df = user_df.where(pd.notnull(user_df), " ")
-    return {"donations": user_df.to_dict(orient="records")}
+# Rows serialised at a time when streaming NDJSON
+DONATION_STREAM_CHUNK = 1000
+
+
+def ndjson_chunk(chunk):
+    # Empty cells become a placeholder string, as in the JSON body
+    with SERIALIZATION_SECONDS.time("ndjson"):
+        return "".join(row + "\n" for row in frame_rows(chunk, placeholder=" "))
+
+
+async def stream_ndjson(df):
+    """Yield ``df`` as NDJSON, a chunk of rows at a time."""
+    for start in range(0, len(df), DONATION_STREAM_CHUNK):
+        yield await run_cpu(ndjson_chunk, df.iloc[start : start + DONATION_STREAM_CHUNK])
 
 
 @app.get("/donations")
-def get_donations(path: Optional[str] = None):
+async def get_donations(
+    path: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+    format: str = "json",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+):
     """Return donations from donations.csv, optionally filtered by path.
 
     Query params:
     - path: if provided, only donations matching this path (e.g. WISDOM, COURAGE) are returned.
+    - limit / after: return at most ``limit`` donations following row id
+      ``after``; the response's ``next_after`` is the cursor for the next page
+      (None on the last one).
+    - format: ``ndjson`` streams one donation per line instead of one JSON body.
+    - since / until: only donations made in [since, until); ISO 8601 date/times
+      (naive ones are UTC) or epoch seconds.
     """
-    df = load_donations()
-    if path:
-        df = df[df["path"] == path]
+    if (limit is not None and limit < 1) or (after is not None and after < 0):
+        raise HTTPException(status_code=400, detail="limit must be >= 1 and after >= 0")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
 
-    # Replace NaN/None with a placeholder string so JSON serialization is consistent
-    df = df.where(pd.notnull(df), " ")
-    return {"donations": df.to_dict(orient="records")}
+    since, until = time_range(since, until)
+
+    # Row ids are positions in the append-only table, so the index is sorted
+    criteria = {"path": path} if path else {}
+    if criteria or since is not None or until is not None:
+        df = await db.find("donations", since=since, until=until, **criteria)
+    else:
+        df = await load_donations()
+    start = 0 if after is None else int(df.index.searchsorted(after, side="right"))
+    end = len(df) if limit is None else min(start + limit, len(df))
+    page = df.iloc[start:end]
+
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(page), media_type="application/x-ndjson")
+
+    result = {"donations": page}
+    if limit is not None:
+        result["next_after"] = int(page.index[-1]) if end < len(df) else None
+    return await run_cpu(json_response, result, placeholder=" ")
 
 
 @app.get("/users/{uuid}/referrals")
-def get_user_referrals(uuid: str):
+async def get_user_referrals(uuid: str):
     """Return all referrals where this user is the referrer."""
-    df = load_referrals()
-    user_df = df[df["referrer_id"] == uuid]
-    return {"referrals": user_df.to_dict(orient="records")}
+    return json_response({"referrals": await run_io(referrals.referred_by, uuid)})
+
+
+@app.get("/users/{uuid}/referrals/tree")
+async def get_user_referral_tree(uuid: str, depth: int = 2, limit: int = 50, offset: int = 0):
+    """Return a user's referral counts and the referral chain below them.
+
+    Query params:
+    - depth: levels of referrals to include (0-10, default 2).
+    - limit / offset: page through the user's direct referrals; deeper
+      levels list at most ``limit`` referrals each (``more`` when cut).
+    """
+    if not 0 <= depth <= 10:
+        raise HTTPException(status_code=400, detail="depth must be between 0 and 10")
+    if limit < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be >= 1 and offset >= 0")
+    tree = await run_cpu(referral_graph.tree, uuid, depth, limit, offset)
+    if tree is None:
+        raise HTTPException(status_code=404, detail="No referrals for this user")
+    return tree
+
+
+@app.get("/referrals/top")
+async def get_top_referrers(sort: str = "total", limit: int = 50, offset: int = 0):
+    """Return referrers ranked by the size of their referral chains.
+
+    Query params:
+    - sort: ``total`` (whole chain, the default), ``direct`` (users they
+      referred themselves) or ``converted`` (chain members who donated).
+    - limit / offset: the page of the ranking to return.
+    """
+    if sort not in RANKINGS:
+        raise HTTPException(
+            status_code=400, detail=f"sort must be one of: {', '.join(RANKINGS)}"
+        )
+    if limit < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be >= 1 and offset >= 0")
+    total, referrers = await run_cpu(referral_graph.top, sort, limit, offset)
+    return {"referrers": referrers, "total": total}
 
 
 @app.post("/users/{uuid}/badges")
-def assign_badge(uuid: str, data: dict):
+async def assign_badge(uuid: str, data: dict):
     """Assign a badge to a user if they don't already have it."""
     badge_id = data.get("badge_id")
     if not badge_id:
         raise HTTPException(status_code=400, detail="badge_id is required")
 
-    has_df = load_has_badges()
-    existing = has_df[(has_df["uuid"] == uuid) & (has_df["badge_id"] == badge_id)]
+    existing = await db.find("has_badges", uuid=uuid, badge_id=badge_id)
     if not existing.empty:
         return {"status": "ok", "message": "Badge already assigned"}
 
-    new_row = {"uuid": uuid, "badge_id": badge_id}
-    has_df = pd.concat([has_df, pd.DataFrame([new_row])], ignore_index=True)
-    has_df.to_csv("hasBadges.csv", index=False)
+    await db.append("has_badges", [{"uuid": uuid, "badge_id": badge_id}])
 
     return {"status": "ok", "message": "Badge assigned"}
 
 
 @app.get("/teams/{team_id}")
-def get_team(team_id: str):
+async def get_team(team_id: str):
     """Return basic information about a team, including leader name."""
-    try:
-        teams_df = pd.read_csv("teams.csv")
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Team not found")
-
-    team_df = teams_df[teams_df["team_id"] == team_id]
+    team_df = await db.find("teams", team_id=team_id)
     if team_df.empty:
         raise HTTPException(status_code=404, detail="Team not found")
 
     team = team_df.iloc[0].to_dict()
 
-    # Look up leader name from users.csv
-    users_df = load_users()
-    leader_df = users_df[users_df["uuid"] == team["leader_uuid"]]
+    # Look up leader name and members at once
+    leader_df, members_df = await asyncio.gather(
+        db.find("users", uuid=team["leader_uuid"]), db.find("users", team_id=team_id)
+    )
     leader_name = None
     if not leader_df.empty:
         leader_row = leader_df.iloc[0].to_dict()
@@ -595,8 +829,7 @@ def get_team(team_id: str):
             or leader_row.get("email")
         )
 
-    # Get member count
-    member_count = len(users_df[users_df["team_id"] == team_id])
+    member_count = len(members_df)
 
     team_payload = {
         "team_id": team["team_id"],
@@ -610,37 +843,29 @@ def get_team(team_id: str):
 
 
 @app.post("/create_team")
-def create_team(data: dict):
+async def create_team(data: dict):
     name = data.get("name")
     leader_uuid = data.get("leader_uuid")
 
     if not name or not leader_uuid:
         raise HTTPException(status_code=400, detail="name and leader_uuid are required")
 
-    # Load or initialize teams.csv
-    try:
-        teams_df = pd.read_csv("teams.csv")
-    except FileNotFoundError:
-        teams_df = pd.DataFrame(columns=["team_id", "name", "leader_uuid"])
-
     new_team = {
         "team_id": gen_uuid(),
         "name": name,
         "leader_uuid": leader_uuid,
     }
-    teams_df = pd.concat([teams_df, pd.DataFrame([new_team])], ignore_index=True)
-    teams_df.to_csv("teams.csv", index=False)
+    await db.append("teams", [new_team])
 
     # Ensure the leader is a member of their new team
-    users_df = load_users()
-    users_df.loc[users_df["uuid"] == leader_uuid, "team_id"] = new_team["team_id"]
-    users_df.to_csv("users.csv", index=False)
+    await db.update("users", {"uuid": leader_uuid}, {"team_id": new_team["team_id"]})
+    await run_io(badge_awarder.award, leader_uuid, TEAM_STATS)
 
     return {"status": "ok", "message": "Team created", "team": new_team}
 
 
 @app.post("/join_team")
-def join_team(data: dict):
+async def join_team(data: dict):
     team_id = data.get("team_id")
     member_uuid = data.get("member_uuid")
 
@@ -650,39 +875,34 @@ def join_team(data: dict):
         )
 
     # Verify team exists
-    try:
-        teams_df = pd.read_csv("teams.csv")
-    except FileNotFoundError:
+    team_df = await db.find("teams", team_id=team_id)
+    if team_df.empty:
         raise HTTPException(status_code=404, detail="Team not found")
 
-    if team_id not in teams_df["team_id"].values:
-        raise HTTPException(status_code=404, detail="Team not found")
+    # Update the member's team_id
+    await db.update("users", {"uuid": member_uuid}, {"team_id": team_id})
 
-    # Update the member's team_id in users.csv
-    users_df = load_users()
-    users_df.loc[users_df["uuid"] == member_uuid, "team_id"] = team_id
-    users_df.to_csv("users.csv", index=False)
+    # The member may now be a team player, and the leader's team has grown
+    await run_io(badge_awarder.award, member_uuid, TEAM_STATS)
+    await run_io(badge_awarder.award, team_df["leader_uuid"].iloc[0], {"team_member_count"})
 
     return {"status": "ok", "message": "Joined team"}
 
 
 @app.post("/leave_team")
-def leave_team(data: dict):
+async def leave_team(data: dict):
     member_uuid = data.get("member_uuid")
 
     if not member_uuid:
         raise HTTPException(status_code=400, detail="member_uuid is required")
 
-    users_df = load_users()
-
-    users_df.loc[users_df["uuid"] == member_uuid, "team_id"] = None
-    users_df.to_csv("users.csv", index=False)
+    await db.update("users", {"uuid": member_uuid}, {"team_id": None})
 
     return {"status": "ok", "message": "Left team"}
 
 
 @app.post("/transfer_team_leadership")
-def transfer_team_leadership(data: dict):
+async def transfer_team_leadership(data: dict):
     team_id = data.get("team_id")
     new_leader_uuid = data.get("new_leader_uuid")
 
@@ -691,164 +911,82 @@ def transfer_team_leadership(data: dict):
             status_code=400, detail="team_id and new_leader_uuid are required"
         )
 
-    try:
-        teams_df = pd.read_csv("teams.csv")
-    except FileNotFoundError:
+    if (await db.find("teams", team_id=team_id)).empty:
         raise HTTPException(status_code=404, detail="Team not found")
 
-    if team_id not in teams_df["team_id"].values:
-        raise HTTPException(status_code=404, detail="Team not found")
-
-    teams_df.loc[teams_df["team_id"] == team_id, "leader_uuid"] = new_leader_uuid
-    teams_df.to_csv("teams.csv", index=False)
+    await db.update("teams", {"team_id": team_id}, {"leader_uuid": new_leader_uuid})
+    await run_io(badge_awarder.award, new_leader_uuid, TEAM_STATS)
 
     return {"status": "ok", "message": "Team leadership transferred"}
 
 
 @app.get("/leaderboard/supporters")
-def get_top_supporters(path: Optional[str] = None):
+async def get_top_supporters(
+    path: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    window: Optional[str] = None,
+):
     """Return top supporters (users) ranked by impact points from donations.
 
-    Optional query param 'path' to filter by donation path (e.g., WISDOM, COURAGE, etc.).
+    Query params:
+    - path: only count donations to this path (e.g., WISDOM, COURAGE, etc.).
+    - limit / offset: return a page of the ranking instead of all of it.
+    - since / until: only count donations made in [since, until).
+    - window: ``week`` or ``month`` for the last 7 / 30 days (UTC), ``all``
+      (the default) for all-time totals.
     """
-    donations_df = load_donations()
-    users_df = load_users()
-
-    # Filter by path if specified
-    if path and path != "ALL":
-        donations_df = donations_df[donations_df["path"] == path]
-
-    # Group by user and sum impact_points
-    user_stats = (
-        donations_df.groupby("uuid")
-        .agg({"impact_points": "sum", "amount": "sum"})
-        .reset_index()
-    )
-
-    # Count donations per user
-    donation_counts = (
-        donations_df.groupby("uuid").size().reset_index(name="donation_count")
-    )
-    user_stats = user_stats.merge(donation_counts, on="uuid")
-
-    # Determine primary path for each user (most donations in that path)
-    path_counts = (
-        donations_df.groupby(["uuid", "path"]).size().reset_index(name="count")
-    )
-    primary_paths = path_counts.loc[path_counts.groupby("uuid")["count"].idxmax()][
-        ["uuid", "path"]
-    ]
-    primary_paths.rename(columns={"path": "primary_path"}, inplace=True)
-    user_stats = user_stats.merge(primary_paths, on="uuid", how="left")
-
-    # Join with user info
-    user_stats = user_stats.merge(
-        users_df[["uuid", "fname", "lname", "email"]], on="uuid", how="left"
-    )
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPException(status_code=400, detail="limit and offset must be >= 0")
+    window = leaderboard_window(window, since, until)
+    since, until = time_range(since, until)
 
-    # Build display name
-    user_stats["display_name"] = user_stats.apply(
-        lambda row: (
-            f"{row['fname']} {row['lname']}".strip()
-            if pd.notna(row["fname"]) and pd.notna(row["lname"])
-            else row["email"]
-        ),
-        axis=1,
+    total, leaderboard = await run_cpu(
+        supporter_leaderboard.top, path, limit, offset, since, until, window
     )
-
-    # Sort by impact_points descending
-    user_stats = user_stats.sort_values("impact_points", ascending=False)
-
-    # Build result
-    leaderboard = []
-    for _, row in user_stats.iterrows():
-        leaderboard.append(
-            {
-                "user_id": row["uuid"],
-                "display_name": row["display_name"],
-                "total_points": (
-                    int(row["impact_points"]) if pd.notna(row["impact_points"]) else 0
-                ),
-                "total_donations": int(row["donation_count"]),
-                "primary_path": (
-                    row["primary_path"] if pd.notna(row["primary_path"]) else None
-                ),
-            }
-        )
-
-    return {"supporters": leaderboard}
+    return {"supporters": leaderboard, "total": total}
 
 
 @app.get("/leaderboard/teams")
-def get_top_teams():
-    """Return top teams ranked by total impact points of all members."""
-    try:
-        teams_df = pd.read_csv("teams.csv")
-    except FileNotFoundError:
-        return {"teams": []}
-
-    users_df = load_users()
-    donations_df = load_donations()
-
-    # Calculate total points per user from donations
-    user_points = donations_df.groupby("uuid")["impact_points"].sum().reset_index()
-    user_points.rename(columns={"impact_points": "total_points"}, inplace=True)
-
-    # Build team leaderboard
-    team_leaderboard = []
-    for _, team in teams_df.iterrows():
-        team_id = team["team_id"]
-        team_name = team["name"]
-        leader_uuid = team["leader_uuid"]
-
-        # Get all members of this team
-        members = users_df[users_df["team_id"] == team_id]
-        member_count = len(members)
-
-        # Sum points from all members
-        member_uuids = members["uuid"].tolist()
-        team_points = user_points[user_points["uuid"].isin(member_uuids)][
-            "total_points"
-        ].sum()
-
-        # Get leader name
-        leader_row = users_df[users_df["uuid"] == leader_uuid]
-        leader_name = None
-        if not leader_row.empty:
-            leader = leader_row.iloc[0]
-            leader_name = (
-                f"{leader.get('fname', '')} {leader.get('lname', '')}".strip()
-                or leader.get("email")
-            )
-
-        team_leaderboard.append(
-            {
-                "team_id": team_id,
-                "name": team_name,
-                "leader_uuid": leader_uuid,
-                "leader_name": leader_name,
-                "member_count": member_count,
-                "total_points": int(team_points) if pd.notna(team_points) else 0,
-            }
-        )
-
-    # Sort by total_points descending
-    team_leaderboard.sort(key=lambda t: t["total_points"], reverse=True)
+async def get_top_teams(
+    since: Optional[str] = None, until: Optional[str] = None, window: Optional[str] = None
+):
+    """Return top teams ranked by total impact points of all members.
 
+    since / until only count donations made in [since, until); window
+    (``week``, ``month`` or ``all``) only those of the last 7 / 30 days.
+    """
+    window = leaderboard_window(window, since, until)
+    since, until = time_range(since, until)
+    columns = ["uuid", "impact_points"]
+    if window is not None:
+        # Per-user points from the leaderboard's daily buckets
+        donations = await run_cpu(supporter_leaderboard.window_points, window)
+    elif since is None and until is None:
+        donations = await load_donations(columns)
+    else:
+        donations = await db.find("donations", columns=columns, since=since, until=until)
+    teams, users = await asyncio.gather(load_teams(), load_users())
+    team_leaderboard = await run_cpu(rank_teams, teams, users, donations)
     return {"teams": team_leaderboard}
 
 
 @app.get("/me")
-def me(session: Optional[str] = Cookie(default=None)):
+async def me(session: Optional[str] = Cookie(default=None)):
     """Return the current logged in user based on the session cookie.
 
     If no valid session is found, returns logged_in: False.
     """
-    if not session:
+    uuid = await run_io(sessions.resolve, session)
+    if uuid is None:
         return {"logged_in": False}
 
-    df = load_users()
-    user_df = df[df["uuid"] == session]
+    # Aggregate stats come from the per-user cache, kept current on writes
+    user_df, totals = await asyncio.gather(
+        db.find("users", uuid=uuid), run_io(user_stats.get, uuid)
+    )
 
     if user_df.empty:
         return {"logged_in": False}
@@ -856,31 +994,10 @@ def me(session: Optional[str] = Cookie(default=None)):
     user = user_df.iloc[0].to_dict()
     user_sanitized = {k: v for k, v in user.items() if k != "password"}
 
-    # Derive aggregate stats from donations
-    donations_df = load_donations()
-    user_donations = donations_df[donations_df["uuid"] == session]
-
-    if not user_donations.empty:
-        total_points = user_donations["impact_points"].fillna(0).sum()
-        total_amount = (
-            user_donations["amount"].fillna(0).sum()
-            if "amount" in user_donations.columns
-            else 0
-        )
-        total_donations = len(user_donations)
-
-        volunteer_hours = 0
-        if "hours" in user_donations.columns:
-            volunteer_hours = (
-                user_donations[user_donations["path"] == "SERVICE"]["hours"]
-                .fillna(0)
-                .sum()
-            )
-    else:
-        total_points = 0
-        total_amount = 0
-        total_donations = 0
-        volunteer_hours = 0
+    total_points = totals["total_points"]
+    total_amount = totals["total_amount"]
+    total_donations = totals["total_donations"]
+    volunteer_hours = totals["volunteer_hours"]
 
     user_sanitized["total_points"] = int(total_points)
     user_sanitized["total_amount"] = float(total_amount)
@@ -888,3 +1005,33 @@ def me(session: Optional[str] = Cookie(default=None)):
     user_sanitized["volunteer_hours"] = float(volunteer_hours)
 
     return {"logged_in": True, "user": user_sanitized}
+
+
+@app.get("/metrics")
+async def get_metrics(
+    x_admin_token: Optional[str] = Header(default=None),
+    authorization: Optional[str] = Header(default=None),
+):
+    """Return this worker's request, storage and executor metrics in Prometheus text format.
+
+    Takes the admin token as ``X-Admin-Token`` or, as Prometheus sends it,
+    ``Authorization: Bearer <token>``.
+    """
+    bearer = authorization[7:] if authorization and authorization[:7].lower() == "bearer " else None
+    check_token(x_admin_token or bearer, ADMIN_TOKEN, "Admin")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/datastore/stats")
+async def datastore_stats(x_admin_token: Optional[str] = Header(default=None)):
+    """Return cache counters, password hashing, session and executor metrics."""
+    check_token(x_admin_token, ADMIN_TOKEN, "Admin")
+    return {
+        **storage.stats(),
+        "user_stats": user_stats.stats(),
+        "referrals": referrals.stats(),
+        "referral_graph": referral_graph.stats(),
+        "password_hasher": password_hasher.stats(),
+        "sessions": sessions.stats(),
+        "executors": executor_stats(),
+    }
@@ -0,0 +1,187 @@
+"""Request and hot-path metrics, exposed at ``/metrics`` in Prometheus text format.
+
+The instruments are small in-process histograms and counters (no client
+library needed); each process reports its own, which is what Prometheus
+expects when it scrapes workers separately. Recorded:
+
+- ``http_request_duration_seconds{method,route,status}``: whole requests,
+  by route template (``/users/{uuid}/donations``), until the last body byte
+- ``storage_operation_seconds{table,operation}``: endpoint storage calls
+  (``load``/``find``/``append``/``update``), including the I/O queue wait
+- ``storage_read_seconds{table,kind}``: reading and parsing a table from its
+  source, in full (``full``) or only the rows added since (``tail``)
+- ``view_update_seconds{table,view}``: derived views (leaderboards, badge
+  counters, ...) applying a table change
+- ``executor_task_seconds{pool,task}`` and ``executor_wait_seconds{pool}``:
+  work on the I/O and CPU pools (aggregations, serialisation) and how long it
+  queued first
+- ``serialization_seconds{format}``: encoding DataFrame responses
+
+``register_collector`` adds values read at scrape time, such as cache
+counters and executor queue depths.
+
+Values are per process. When the API runs several workers
+(``WEB_CONCURRENCY``), each scrape of the shared port reaches one of them,
+so every sample carries a ``worker`` label (the process id) that keeps the
+workers' series apart; aggregate across them in queries, e.g.
+``sum without (worker) (rate(http_request_duration_seconds_count[5m]))``.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, *extra):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, worker):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels, worker)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self, worker):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = _labels(self.labelnames, labels, worker, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            suffix = _labels(self.labelnames, labels, worker)
+            yield f"{self.name}_sum{suffix} {_number(values[-1])}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+def register_collector(collect):
+    """Add ``collect()``, called on every scrape.
+
+    It returns ``(name, type, help, samples)`` tuples, ``samples`` being
+    ``(labels dict, value)`` pairs; ``type`` is ``gauge`` or ``counter``.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    # Read at render time: workers may be forked after this module is imported
+    worker = f'worker="{os.getpid()}"'
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render(worker))
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels, labels.values(), worker)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, until the last byte of the body.",
+    ["method", "route", "status"],
+)
+STORAGE_SECONDS = Histogram(
+    "storage_operation_seconds",
+    "Storage calls made by the endpoints, including the wait for an I/O thread.",
+    ["table", "operation"],
+)
+STORAGE_READ_SECONDS = Histogram(
+    "storage_read_seconds",
+    "Reading and parsing a table from its source, in full or only its new rows.",
+    ["table", "kind"],
+)
+VIEW_UPDATE_SECONDS = Histogram(
+    "view_update_seconds",
+    "Derived views (leaderboards, counters, indexes) applying a table change.",
+    ["table", "view"],
+)
+EXECUTOR_TASK_SECONDS = Histogram(
+    "executor_task_seconds",
+    "Blocking work run on the I/O and CPU executors, by function.",
+    ["pool", "task"],
+)
+EXECUTOR_WAIT_SECONDS = Histogram(
+    "executor_wait_seconds",
+    "Time work waited for a free executor thread.",
+    ["pool"],
+)
+SERIALIZATION_SECONDS = Histogram(
+    "serialization_seconds",
+    "Encoding DataFrame responses to JSON or NDJSON.",
+    ["format"],
+)
@@ -0,0 +1,33 @@
+"""One-shot import of the CSV tables into the SQLite storage backend.
+
+Run from the backend directory:
+
+    python migrate_to_sqlite.py [path/to/athena.db]
+
+Existing rows in the target database are replaced. Afterwards start the API
+with STORAGE_BACKEND=sqlite (and SQLITE_PATH if not using athena.db).
+"""
+
+import os
+import sys
+
+from storage import TABLES, CsvStorage, SqliteStorage
+
+
+def migrate(db_path):
+    source = CsvStorage()
+    target = SqliteStorage(db_path)
+
+    for table in TABLES:
+        df = source.load(table)
+        target.import_frame(table, df)
+        print(f"  {table}: {len(df)} rows")
+
+    target.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("SQLITE_PATH", "athena.db")
+    print(f"Importing CSV tables into {db_path}")
+    migrate(db_path)
+    print("Done.")
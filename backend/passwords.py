@@ -0,0 +1,157 @@
+"""Password hashing off the request threads.
+
+bcrypt at cost 12 takes a few hundred milliseconds of CPU per call. Running
+it inline in the sync handlers let a burst of logins occupy every threadpool
+thread and slow down unrelated endpoints. ``PasswordHasher`` runs the work in
+a process pool sized to the cores and admits at most ``max_pending`` calls at
+once; beyond that it fails fast with ``HasherBusy`` instead of queueing
+requests that would time out anyway. ``hash`` and ``check`` are coroutines:
+the request awaits the pool's result without holding a thread.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from executors import run_cpu
+
+# Latencies kept for the percentile metrics
+_LATENCY_SAMPLES = 1024
+
+
+class HasherBusy(Exception):
+    """Raised when the admission queue is full."""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _checkpw(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except Exception:
+        # Missing password or a malformed stored hash
+        return False
+
+
+def _exit_with_parent(parent_pid):
+    # uvicorn re-raises SIGTERM after its shutdown, so the pool is never shut
+    # down cleanly; workers leave on their own once the server is gone.
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class PasswordHasher:
+    """Hash and check passwords in a bounded process pool.
+
+    ``workers=0`` runs bcrypt on the CPU executor instead of a process pool
+    (close to the old behaviour), which is what the benchmark compares
+    against.
+    """
+
+    def __init__(self, workers=None, max_pending=None, rounds=12):
+        if workers is None:
+            # Several uvicorn workers share the machine's cores
+            per_process = int(os.getenv("WEB_CONCURRENCY", "1"))
+            workers = max(1, (os.cpu_count() or 1) // max(1, per_process))
+        self.workers = workers
+        self.max_pending = max_pending or 4 * max(1, workers)
+        self.rounds = rounds
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self):
+        # Created on first use, with fresh interpreters: forking the threaded
+        # server process can leave children holding its locks.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_exit_with_parent,
+                    initargs=(os.getpid(),),
+                )
+            return self._executor
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Too many password checks in progress")
+
+        with self._lock:
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            if self.workers == 0:
+                return await run_cpu(fn, *args)
+            pool = self._pool()
+            try:
+                return await asyncio.wrap_future(pool.submit(fn, *args))
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next call
+                with self._executor_lock:
+                    if self._executor is pool:
+                        self._executor = None
+                raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._slots.release()
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self._latencies.append(elapsed)
+
+    async def hash(self, password):
+        """Return a bcrypt hash of ``password`` with a fresh salt."""
+        return await self._run(_hashpw, password, self.rounds)
+
+    async def check(self, password, hashed):
+        """Return whether ``password`` matches the stored ``hashed`` value."""
+        return await self._run(_checkpw, password, hashed)
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            counters = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        counters["latency_p50"] = _percentile(latencies, 0.50)
+        counters["latency_p99"] = _percentile(latencies, 0.99)
+        return counters
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
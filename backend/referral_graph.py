@@ -0,0 +1,220 @@
+"""Referral graph: who referred whom, with precomputed chain and conversion counts.
+
+Each referred user is attached to one referrer, the first one recorded for
+them, which makes the graph a forest (an edge that would close a cycle is left
+out). For every user the index keeps:
+
+- ``direct`` / ``direct_converted``: the users they referred, and how many of
+  those have donated (``hasDonated``)
+- ``total`` / ``total_converted``: the same over their whole referral chain
+  (referrals of referrals, at any depth)
+
+Each row only updates the referrer's chain of ancestors, so an appended
+referral keeps the counts current without revisiting the table; a reload
+replays the table the same way, so it ends in the same state as the appends
+did. Rankings of referrers are sorted on first use and kept until the graph
+changes.
+
+Rows follow the referrals table's append-only convention: the latest row for
+a ``(referred_id, code)`` pair is its current state.
+"""
+
+import threading
+
+import pandas as pd
+
+from storage import REFERRAL_COLUMNS
+
+# Orders accepted by ``top``: name -> sort key of a node
+RANKINGS = {
+    "direct": lambda node: (-node.direct, -node.total),
+    "total": lambda node: (-node.total, -node.direct),
+    "converted": lambda node: (-node.total_converted, -node.total),
+}
+
+
+def _value(value):
+    return None if pd.isna(value) else value
+
+
+class _Node:
+    __slots__ = (
+        "parent",
+        "children",
+        "converted",
+        "direct_converted",
+        "total",
+        "total_converted",
+        "keys",
+    )
+
+    def __init__(self):
+        self.parent = None
+        # Referred users, in the order they were attached
+        self.children = {}
+        # Whether this user has donated after being referred
+        self.converted = False
+        self.direct_converted = 0
+        self.total = 0
+        self.total_converted = 0
+        # code -> (referrer_id, hasDonated) of the rows naming this user
+        self.keys = {}
+
+    @property
+    def direct(self):
+        return len(self.children)
+
+    def counts(self):
+        total = self.total
+        return {
+            "direct": self.direct,
+            "direct_converted": self.direct_converted,
+            "total": total,
+            "total_converted": self.total_converted,
+            "conversion_rate": self.total_converted / total if total else 0.0,
+        }
+
+
+class ReferralGraph:
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._nodes = {}
+        # sort name -> referrer uuids in ranked order, until the next change
+        self._rankings = {}
+        storage.subscribe("referrals", self._on_referrals)
+
+    def _node(self, uuid):
+        node = self._nodes.get(uuid)
+        if node is None:
+            node = self._nodes[uuid] = _Node()
+        return node
+
+    @staticmethod
+    def _rows(frame):
+        for row in frame[REFERRAL_COLUMNS].itertuples(index=False):
+            referrer, referred, code, donated = (_value(v) for v in row)
+            if referred is not None:
+                yield referrer, referred, code, bool(donated)
+
+    def _on_referrals(self, event, frame):
+        with self._lock:
+            self._rankings = {}
+            if event == "reset":
+                self._nodes = {}
+            for referrer, referred, code, donated in self._rows(frame):
+                self._apply(referrer, referred, code, donated)
+
+    @staticmethod
+    def _state(node):
+        """Return ``(parent, converted)`` implied by a node's referral rows."""
+        referrers = [referrer for referrer, _ in node.keys.values() if referrer is not None]
+        return (referrers[0] if referrers else None), any(d for _, d in node.keys.values())
+
+    def _apply(self, referrer, referred, code, donated):
+        node = self._node(referred)
+        old_parent, old_converted = node.parent, node.converted
+        node.keys[code] = (referrer, donated)
+        parent, converted = self._state(node)
+        if parent == referred or (
+            parent is not None and any(a is node for a in self._ancestors_of(parent))
+        ):
+            # Would close a cycle
+            parent = None
+
+        if parent != old_parent:
+            self._detach(referred, node)
+            node.converted = converted
+            self._attach(referred, node, parent)
+        elif converted != old_converted:
+            node.converted = converted
+            if parent is not None:
+                delta = 1 if converted else -1
+                self._nodes[parent].direct_converted += delta
+                for ancestor in self._ancestors_of(parent):
+                    ancestor.total_converted += delta
+
+    def _ancestors_of(self, uuid):
+        """Yield the node for ``uuid`` and every node above it."""
+        while uuid is not None:
+            node = self._node(uuid)
+            yield node
+            uuid = node.parent
+
+    def _detach(self, uuid, node):
+        if node.parent is None:
+            return
+        parent = self._nodes[node.parent]
+        del parent.children[uuid]
+        parent.direct_converted -= node.converted
+        for ancestor in self._ancestors_of(node.parent):
+            ancestor.total -= node.total + 1
+            ancestor.total_converted -= node.total_converted + node.converted
+        node.parent = None
+
+    def _attach(self, uuid, node, parent_id):
+        if parent_id is None:
+            return
+        node.parent = parent_id
+        parent = self._node(parent_id)
+        parent.children[uuid] = None
+        parent.direct_converted += node.converted
+        for ancestor in self._ancestors_of(parent_id):
+            ancestor.total += node.total + 1
+            ancestor.total_converted += node.total_converted + node.converted
+
+    def top(self, by="total", limit=None, offset=0):
+        """Return ``(total, page)`` of referrers ranked by ``by`` (see ``RANKINGS``)."""
+        # Picks up changes made outside this process
+        self._storage.load("referrals")
+        with self._lock:
+            ranking = self._rankings.get(by)
+            if ranking is None:
+                referrers = [uuid for uuid, node in self._nodes.items() if node.children]
+                key = RANKINGS[by]
+                ranking = sorted(referrers, key=lambda uuid: (key(self._nodes[uuid]), uuid))
+                self._rankings[by] = ranking
+            end = None if limit is None else offset + limit
+            page = [
+                {"user_id": uuid, **self._nodes[uuid].counts()}
+                for uuid in ranking[offset:end]
+            ]
+            return len(ranking), page
+
+    def tree(self, uuid, depth=2, limit=None, offset=0):
+        """Return ``uuid``'s referral counts and chain down to ``depth`` levels.
+
+        ``limit``/``offset`` page through the direct referrals; deeper levels
+        list at most ``limit`` referrals each, with ``more`` set when cut.
+        """
+        self._storage.load("referrals")
+        with self._lock:
+            node = self._nodes.get(uuid)
+            if node is None:
+                return None
+            end = None if limit is None else offset + limit
+            children = list(node.children)[offset:end]
+            result = self._subtree(uuid, depth, limit, children)
+            result["referred_by"] = node.parent
+            result["next_offset"] = (
+                offset + len(children) if end is not None and end < node.direct else None
+            )
+            return result
+
+    def _subtree(self, uuid, depth, limit, children=None):
+        node = self._nodes[uuid]
+        result = {"user_id": uuid, "converted": node.converted, **node.counts()}
+        if depth <= 0:
+            return result
+        if children is None:
+            children = list(node.children)[:limit]
+            result["more"] = limit is not None and node.direct > limit
+        result["referrals"] = [self._subtree(child, depth - 1, limit) for child in children]
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._nodes),
+                "referrers": sum(1 for node in self._nodes.values() if node.children),
+            }
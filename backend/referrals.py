@@ -0,0 +1,142 @@
+"""Referral bookkeeping for ``/donate``, kept in memory.
+
+A donation with a ``REF-<uuid>`` code used to count the donor's rows in the
+whole donations table, look the referrer up in users, and rewrite
+``referrals.csv`` to mark the referral as donated. ``ReferralService`` keeps
+what those steps need up to date from the table events instead:
+
+- the number of donations per user (first-donation check)
+- the set of user uuids (referral code validation)
+- the current referral per ``(referred_id, code)``, and the referrals of each
+  referrer in the order they were first recorded
+
+Referrals are append-only: marking one as donated appends a new row for the
+same ``(referred_id, code)``, and the latest row for a key wins, wherever the
+table is read from.
+"""
+
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from storage import REFERRAL_COLUMNS
+
+REFERRAL_CODE_PREFIX = "REF-"
+
+
+def _value(value):
+    return None if pd.isna(value) else value
+
+
+class ReferralService:
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        # Serialises first-donation claims within the process; storage.claim()
+        # does so across workers, so a referral is rewarded once
+        self._claim_lock = threading.Lock()
+        self._donations = Counter()
+        self._users = set()
+        # (referred_id, code) -> current row, as a dict
+        self._referrals = {}
+        # referrer_id -> {(referred_id, code): None}, in first-seen order
+        self._by_referrer = {}
+        storage.subscribe("donations", self._on_donations)
+        storage.subscribe("users", self._on_users, updates=True)
+        storage.subscribe("referrals", self._on_referrals)
+
+    def _on_donations(self, event, frame):
+        counts = frame["uuid"].value_counts()
+        with self._lock:
+            if event == "reset":
+                self._donations = Counter(counts.to_dict())
+            else:
+                self._donations.update(counts.to_dict())
+
+    def _on_users(self, event, frame):
+        uuids = set(frame["uuid"].dropna())
+        with self._lock:
+            if event == "reset":
+                self._users = uuids
+            else:
+                self._users |= uuids
+
+    def _on_referrals(self, event, frame):
+        rows = frame[REFERRAL_COLUMNS].to_dict(orient="records")
+        with self._lock:
+            if event == "reset":
+                self._referrals = {}
+                self._by_referrer = {}
+            for row in rows:
+                self._apply({column: _value(value) for column, value in row.items()})
+
+    def _apply(self, row):
+        """Make ``row`` the current state of its referral (lock held)."""
+        key = (row["referred_id"], row["code"])
+        previous = self._referrals.get(key)
+        if previous is not None and previous["referrer_id"] != row["referrer_id"]:
+            self._by_referrer.get(previous["referrer_id"], {}).pop(key, None)
+        self._referrals[key] = row
+        self._by_referrer.setdefault(row["referrer_id"], {})[key] = None
+
+    def _sync(self, *tables):
+        # Picks up changes made outside this process
+        for table in tables:
+            self._storage.load(table)
+
+    def donation_count(self, uuid):
+        self._sync("donations")
+        with self._lock:
+            return self._donations[uuid]
+
+    def resolve_code(self, code):
+        """Return the referrer uuid of a ``REF-<uuid>`` code, or None."""
+        if not isinstance(code, str) or not code.startswith(REFERRAL_CODE_PREFIX):
+            return None
+        # Everything after the prefix; do NOT use strip here
+        candidate = code[len(REFERRAL_CODE_PREFIX) :]
+        self._sync("users")
+        with self._lock:
+            return candidate if candidate in self._users else None
+
+    def record_donation(self, referred_id, code, referrer_id):
+        """Mark the referral of ``referred_id`` by ``code`` as donated.
+
+        Returns False if it already was, so the referrer is only rewarded once.
+        """
+        with self._claim_lock, self._storage.claim("referrals"):
+            # Another worker may have claimed it just now
+            self._sync("referrals")
+            with self._lock:
+                current = self._referrals.get((referred_id, code))
+            if current is not None and current["hasDonated"]:
+                return False
+
+            row = {
+                "referrer_id": referrer_id,
+                "referred_id": referred_id,
+                "code": code,
+                "hasDonated": True,
+            }
+            if referrer_id is None and current is not None:
+                # Keep the referrer recorded earlier
+                row["referrer_id"] = current["referrer_id"]
+            self._storage.append("referrals", [row])
+            return True
+
+    def referred_by(self, referrer_id):
+        """Return the current referrals made by ``referrer_id`` as a DataFrame."""
+        self._sync("referrals")
+        with self._lock:
+            keys = list(self._by_referrer.get(referrer_id, {}))
+            rows = [self._referrals[key] for key in keys]
+        return pd.DataFrame(rows, columns=REFERRAL_COLUMNS)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "referrals": len(self._referrals),
+                "referrers": len(self._by_referrer),
+                "donors": len(self._donations),
+            }
@@ -0,0 +1,175 @@
+"""Server-side login sessions.
+
+The ``session`` cookie holds a random opaque token instead of the user's uuid.
+Tokens map to ``(uuid, expires_at)`` in an in-memory table, so resolving a
+session is a dict lookup and never reads the users table. Expired sessions
+are dropped on access and swept every ``sweep_interval`` seconds.
+
+With a backing ``path`` every create/revoke is also appended to a small
+tab-separated log (``digest, uuid, expires_at``; an empty uuid is a revoke),
+so sessions survive restarts and are shared by several uvicorn workers: each
+worker reads the lines other workers appended since it last looked. The log
+is compacted down to the live sessions during a sweep once it is mostly
+dead lines. Only a SHA-256 digest of each token is stored.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+
+from locks import FileLock
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionStore:
+    def __init__(self, ttl=3600, path=None, sweep_interval=60.0):
+        self.ttl = ttl
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(path) if path else None
+        # token digest -> (uuid, expires_at)
+        self._sessions = {}
+        # Position in the backing log up to which _sessions is current
+        self._ino = None
+        self._offset = 0
+        self._log_lines = 0
+        self._next_sweep = time.time() + sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.swept = 0
+
+        if path:
+            with self._lock:
+                self._catch_up()
+
+    def _apply(self, line, now):
+        digest, uuid, expires_at = line.split("\t")
+        if uuid and float(expires_at) > now:
+            self._sessions[digest] = (uuid, float(expires_at))
+        else:
+            self._sessions.pop(digest, None)
+
+    def _catch_up(self):
+        """Apply lines appended to the log by other processes (lock held)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino == self._ino and st.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._ino or st.st_size < self._offset:
+                # Compacted (or replaced) by another process: start over
+                self._sessions = {}
+                self._ino, self._offset, self._log_lines = st.st_ino, 0, 0
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+
+        # A line still being written is picked up next time
+        complete = data[: data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        now = time.time()
+        for line in complete.decode("utf-8").splitlines():
+            if line:
+                self._apply(line, now)
+                self._log_lines += 1
+
+    def _write(self, digest, uuid, expires_at):
+        """Record a create (or, with an empty uuid, a revoke) (lock held)."""
+        if not self.path:
+            return
+        line = f"{digest}\t{uuid}\t{expires_at}\n".encode("utf-8")
+        with self._file_lock.hold():
+            self._catch_up()
+            with open(self.path, "ab") as f:
+                f.write(line)
+                self._ino = os.fstat(f.fileno()).st_ino
+            self._offset += len(line)
+            self._log_lines += 1
+
+    def _compact(self):
+        """Rewrite the log with only the live sessions (lock held)."""
+        with self._file_lock.hold():
+            self._catch_up()
+            tmp_path = f"{self.path}.tmp.{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                for digest, (uuid, expires_at) in self._sessions.items():
+                    f.write(f"{digest}\t{uuid}\t{expires_at}\n".encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._ino, self._offset = st.st_ino, st.st_size
+            self._log_lines = len(self._sessions)
+
+    def _maybe_sweep(self, now):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        if self.path:
+            self._catch_up()
+        expired = [d for d, (_, expires_at) in self._sessions.items() if expires_at <= now]
+        for digest in expired:
+            del self._sessions[digest]
+        self.swept += len(expired)
+        if self.path and self._log_lines > 2 * len(self._sessions) + 1000:
+            self._compact()
+
+    def create(self, uuid):
+        """Start a session for ``uuid`` and return its token."""
+        token = secrets.token_urlsafe(32)
+        digest = _digest(token)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._maybe_sweep(now)
+            self._write(digest, uuid, expires_at)
+            self._sessions[digest] = (uuid, expires_at)
+        return token
+
+    def resolve(self, token):
+        """Return the uuid of a live session, or None."""
+        if not token:
+            return None
+        digest = _digest(token)
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+            if self.path:
+                self._catch_up()
+            entry = self._sessions.get(digest)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._sessions[digest]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def revoke(self, token):
+        """End the session for ``token`` (no-op if it does not exist)."""
+        if not token:
+            return
+        digest = _digest(token)
+        with self._lock:
+            if self.path:
+                self._catch_up()
+            if self._sessions.pop(digest, None) is not None:
+                self._write(digest, "", 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "swept": self.swept,
+            }
@@ -0,0 +1,83 @@
+"""Version counters shared by every worker process.
+
+When the API runs with several uvicorn workers, each keeps its own in-memory
+tables and derived views. Writers bump a named counter in a small memory-mapped
+file after every committed change; readers compare the counter with the value
+their cached state was built from. A mismatch means another worker (or this
+one) changed the data and the cached view must catch up.
+
+The file holds a fixed number of ``(name, counter)`` slots. Slots are allocated
+on first use and bumps happen under an ``flock``, so any number of processes
+can share it.
+"""
+
+import mmap
+import os
+import struct
+import threading
+
+from locks import FileLock
+
+_SLOT = struct.Struct("<24sQ")
+_SLOT_COUNT = 128
+_SIZE = _SLOT.size * _SLOT_COUNT
+
+
+class SharedVersions:
+    def __init__(self, path):
+        self.path = path
+        self._lock = FileLock(path)
+        self._thread_lock = threading.Lock()
+        self._offsets = {}
+
+        with self._lock.hold():
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < _SIZE:
+                    os.ftruncate(fd, _SIZE)
+                self._mm = mmap.mmap(fd, _SIZE)
+            finally:
+                os.close(fd)
+
+    def _find(self, key):
+        for i in range(_SLOT_COUNT):
+            offset = i * _SLOT.size
+            name, _ = _SLOT.unpack_from(self._mm, offset)
+            if name == key:
+                return offset
+            if not name.strip(b"\0"):
+                return None
+        raise RuntimeError(f"No free slot left in {self.path}")
+
+    def _offset(self, name):
+        offset = self._offsets.get(name)
+        if offset is not None:
+            return offset
+
+        key = name.encode("utf-8")[: _SLOT.size - 8].ljust(24, b"\0")
+        offset = self._find(key)
+        if offset is None:
+            with self._lock.hold():
+                # Re-scan under the lock: another process may have claimed it
+                offset = self._find(key)
+                if offset is None:
+                    offset = next(
+                        i * _SLOT.size
+                        for i in range(_SLOT_COUNT)
+                        if not _SLOT.unpack_from(self._mm, i * _SLOT.size)[0].strip(b"\0")
+                    )
+                    _SLOT.pack_into(self._mm, offset, key, 0)
+        self._offsets[name] = offset
+        return offset
+
+    def get(self, name):
+        return _SLOT.unpack_from(self._mm, self._offset(name))[1]
+
+    def bump(self, name):
+        """Increment ``name``'s counter and return the new value."""
+        offset = self._offset(name)
+        with self._thread_lock, self._lock.hold():
+            key, value = _SLOT.unpack_from(self._mm, offset)
+            _SLOT.pack_into(self._mm, offset, key, value + 1)
+            return value + 1
+
@@ -0,0 +1,569 @@
+"""Pluggable storage layer for the Athena Paths tables.
+
+Two interchangeable backends implement the same small interface:
+
+- ``load(table, columns=None)``: the whole table as a (shared, read-only)
+  DataFrame, optionally only some of its columns (selected from the cached
+  frame; every source still reads all of them)
+- ``find(table, columns=None, since=None, until=None, **criteria)``: rows
+  whose columns equal the given values and, for tables with a time index,
+  whose timestamp falls in ``[since, until)``
+- ``append(table, rows)``: insert new rows
+- ``update(table, criteria, values)``: set ``values`` on matching rows
+- ``subscribe(table, listener)``: keep a derived view in sync (see ``datastore``)
+- ``claim(table)``: a cross-process lock for check-then-append sequences,
+  e.g. "award this badge unless the user already holds it"
+
+``AsyncStorage`` wraps either backend with awaitable ``load``/``find``/
+``append``/``update`` that run on the I/O executor (see ``executors``), for
+the async endpoints.
+
+``CsvStorage`` keeps the original CSV files as the source of truth. With
+``DONATIONS_FORMAT=arrow`` (needs pyarrow) donations are mostly read from a
+typed columnar snapshot of ``donations.csv`` instead (see ``columnar``).
+``SqliteStorage`` keeps the same tables in a SQLite database (WAL mode) with
+indexes on the columns the API filters by, so per-user lookups are indexed
+point queries instead of scans. Select one with ``STORAGE_BACKEND`` (``csv``
+or ``sqlite``); ``migrate_to_sqlite.py`` imports the CSV files once.
+
+Both are safe to share between several worker processes: CSV writers bump a
+per-table counter in ``SHARED_STATE_PATH`` after each write, SQLite keeps the
+equivalent counters in its ``table_versions`` table.
+"""
+
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from appendlog import AppendWriter
+from columnar import ArrowSnapshotSource
+from datastore import CsvSource, DataStore
+from locks import FileLock
+from executors import run_io
+from indexes import HashIndex, TimeIndex
+from metrics import STORAGE_SECONDS
+from shared_state import SharedVersions
+
+USER_COLUMNS = ["uuid", "email", "password", "fname", "lname", "team_id"]
+DONATION_COLUMNS = ["uuid", "path", "amount", "impact_points", "hours", "created_at"]
+REFERRAL_COLUMNS = ["referrer_id", "referred_id", "code", "hasDonated"]
+HAS_BADGE_COLUMNS = ["uuid", "badge_id"]
+TEAM_COLUMNS = ["team_id", "name", "leader_uuid"]
+MESSAGE_COLUMNS = [
+    "id",
+    "display_name",
+    "message",
+    "language",
+    "created_date",
+    "is_approved",
+]
+APPROVED_TRUE_VALUES = {"1", "true", "yes", "approved", "y"}
+# Append-only log of moderation decisions ("approve" / "reject") on messages
+MODERATION_COLUMNS = ["id", "decision", "decided_at"]
+
+# Columns with an in-memory hash index in the CSV backend (SQLite has its own)
+CSV_INDEXES = {"users": ["email", "uuid", "team_id"], "donations": ["uuid"]}
+# Timestamp column of each table that supports since/until filters
+TIME_INDEXES = {"donations": "created_at"}
+
+
+def _normalize_users(df):
+    # Ensure team_id column exists and uses empty string instead of NaN/null
+    if "team_id" not in df.columns:
+        df["team_id"] = ""
+    else:
+        df["team_id"] = df["team_id"].fillna("")
+    return df
+
+
+def _normalize_donations(df):
+    # Ensure newer columns exist even if older CSVs don't have them yet
+    for col in ["hours", "created_at"]:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+def _normalize_hope_wall_messages(df):
+    for column in MESSAGE_COLUMNS:
+        if column not in df.columns:
+            df[column] = False if column == "is_approved" else ""
+
+    if df.empty:
+        return df
+
+    df["is_approved"] = (
+        df["is_approved"]
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .isin(APPROVED_TRUE_VALUES)
+    )
+    return df
+
+
+def _identity(df):
+    return df
+
+
+# name -> (csv file, columns, normalizer)
+TABLES = {
+    "users": ("users.csv", USER_COLUMNS, _normalize_users),
+    "donations": ("donations.csv", DONATION_COLUMNS, _normalize_donations),
+    "referrals": ("referrals.csv", REFERRAL_COLUMNS, _identity),
+    "has_badges": ("hasBadges.csv", HAS_BADGE_COLUMNS, _identity),
+    "teams": ("teams.csv", TEAM_COLUMNS, _identity),
+    "hope_wall_messages": (
+        "hope_wall_messages.csv",
+        MESSAGE_COLUMNS,
+        _normalize_hope_wall_messages,
+    ),
+    "hope_wall_moderation": (
+        "hope_wall_moderation.csv",
+        MODERATION_COLUMNS,
+        _identity,
+    ),
+}
+
+
+def _time_indexes(store):
+    indexes = {}
+    for name, column in TIME_INDEXES.items():
+        indexes[name] = TimeIndex(column)
+        store.subscribe(name, indexes[name].on_event)
+    return indexes
+
+
+def _time_positions(indexes, table, since, until):
+    """Row positions of ``table`` in ``[since, until)``, or None if unbounded."""
+    if since is None and until is None:
+        return None
+    if table not in indexes:
+        raise ValueError(f"{table} has no time index")
+    return indexes[table].between(since, until)
+
+
+def _csv_parser(columns, normalize, required=False):
+    def parse(source):
+        try:
+            df = pd.read_csv(source)
+        except FileNotFoundError:
+            if required:
+                raise
+            df = pd.DataFrame(columns=columns)
+        return normalize(df)
+
+    return parse
+
+
+class CsvStorage:
+    """Storage backed by the CSV files in the working directory."""
+
+    def __init__(self, writer=None, versions=None, donations_format=None):
+        self.writer = writer or AppendWriter(
+            fsync_every=int(os.getenv("APPEND_FSYNC_EVERY", "32")),
+            fsync_interval=float(os.getenv("APPEND_FSYNC_INTERVAL", "1.0")),
+        )
+        self.versions = versions or SharedVersions(
+            os.getenv("SHARED_STATE_PATH", ".athena_state")
+        )
+        donations_format = (
+            donations_format or os.getenv("DONATIONS_FORMAT", "csv")
+        ).lower()
+        if donations_format not in ("csv", "arrow"):
+            raise ValueError(f"Unknown DONATIONS_FORMAT: {donations_format}")
+
+        self.store = DataStore()
+        for name, (path, columns, normalize) in TABLES.items():
+            # users.csv has always been required to exist
+            parser = _csv_parser(columns, normalize, required=name == "users")
+            if name == "donations" and donations_format == "arrow":
+                source = ArrowSnapshotSource(
+                    name,
+                    path,
+                    parser,
+                    columns,
+                    self.writer,
+                    self.versions,
+                    snapshot_path=os.getenv("DONATIONS_SNAPSHOT_PATH", "donations.arrow"),
+                    compact_bytes=int(os.getenv("DONATIONS_SNAPSHOT_EVERY", str(8 << 20))),
+                )
+            else:
+                source = CsvSource(name, path, parser, columns, self.writer, self.versions)
+            self.store.register(name, source)
+        # Separate from the sources' write locks, which appends take themselves
+        self._claims = {name: FileLock(f"{path}.claim") for name, (path, _, _) in TABLES.items()}
+
+        self.indexes = {}
+        for name, columns in CSV_INDEXES.items():
+            self.indexes[name] = HashIndex(columns)
+            self.store.subscribe(name, self.indexes[name].on_event, updates=True)
+        self.time_indexes = _time_indexes(self.store)
+
+    def load(self, table, columns=None):
+        df = self.store.get(table)
+        return df if columns is None else df[columns]
+
+    def find(self, table, columns=None, since=None, until=None, **criteria):
+        df = self.store.get(table)
+        positions = _time_positions(self.time_indexes, table, since, until)
+        index = self.indexes.get(table)
+        indexed = [c for c in criteria if index is not None and c in index.columns]
+        if indexed:
+            # Narrow to the indexed rows; the filter below re-checks them all,
+            # so a concurrent write between get() and lookup() is harmless.
+            matches = index.lookup(indexed[0], criteria[indexed[0]])
+            positions = matches if positions is None else np.intersect1d(positions, matches)
+        if positions is not None:
+            # Indexes may already cover rows appended after get()
+            positions = np.asarray(positions, dtype=np.int64)
+            df = df.iloc[positions[positions < len(df)]]
+        if columns is not None:
+            # Only the wanted columns (plus the filtered ones) of the narrowed
+            # rows are copied
+            df = df[list(dict.fromkeys([*columns, *criteria]))]
+        mask = pd.Series(True, index=df.index)
+        for column, value in criteria.items():
+            mask &= df[column] == value
+        df = df[mask]
+        return df if columns is None else df[columns]
+
+    def append(self, table, rows):
+        self.store.append(table, rows)
+
+    def update(self, table, criteria, values):
+        normalize = TABLES[table][2]
+
+        def modify(df):
+            mask = pd.Series(True, index=df.index)
+            for column, value in criteria.items():
+                mask &= df[column] == value
+            for column, value in values.items():
+                df.loc[mask, column] = value
+            return normalize(df)
+
+        self.store.update(table, modify)
+
+    def claim(self, table):
+        """Hold ``table``'s claim lock, shared by every worker process.
+
+        Callers re-read the table, check that a row is not there yet and only
+        then append it, all while holding the lock. Plain writes do not take it.
+        """
+        return self._claims[table].hold()
+
+    def subscribe(self, table, listener, updates=False):
+        self.store.subscribe(table, listener, updates)
+
+    def stats(self):
+        stats = self.store.stats()
+        stats["indexes"] = {name: index.stats() for name, index in self.indexes.items()}
+        stats["time_indexes"] = {n: index.stats() for n, index in self.time_indexes.items()}
+        return stats
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uuid TEXT PRIMARY KEY,
+    email TEXT,
+    password TEXT,
+    fname TEXT,
+    lname TEXT,
+    team_id TEXT
+);
+CREATE TABLE IF NOT EXISTS donations (
+    uuid TEXT,
+    path TEXT,
+    amount REAL,
+    impact_points REAL,
+    hours REAL,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS referrals (
+    referrer_id TEXT,
+    referred_id TEXT,
+    code TEXT,
+    hasDonated INTEGER
+);
+CREATE TABLE IF NOT EXISTS has_badges (
+    uuid TEXT,
+    badge_id TEXT
+);
+CREATE TABLE IF NOT EXISTS teams (
+    team_id TEXT PRIMARY KEY,
+    name TEXT,
+    leader_uuid TEXT
+);
+CREATE TABLE IF NOT EXISTS hope_wall_messages (
+    id TEXT PRIMARY KEY,
+    display_name TEXT,
+    message TEXT,
+    language TEXT,
+    created_date TEXT,
+    is_approved INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS hope_wall_moderation (
+    id TEXT,
+    decision TEXT,
+    decided_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_donations_uuid ON donations (uuid);
+CREATE INDEX IF NOT EXISTS idx_donations_path ON donations (path);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+CREATE INDEX IF NOT EXISTS idx_users_team_id ON users (team_id);
+CREATE INDEX IF NOT EXISTS idx_has_badges_uuid_badge ON has_badges (uuid, badge_id);
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals (referrer_id);
+CREATE INDEX IF NOT EXISTS idx_referrals_referred_code ON referrals (referred_id, code);
+CREATE INDEX IF NOT EXISTS idx_hope_wall_moderation_id ON hope_wall_moderation (id);
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns stored as 0/1 that the API exposes as booleans
+SQLITE_BOOL_COLUMNS = {"referrals": ["hasDonated"]}
+SQLITE_REAL_COLUMNS = {"donations": ["amount", "impact_points", "hours"]}
+
+
+def _version_triggers(table):
+    # Every write bumps the table's version so cached frames in any process
+    # (or connection) can tell that they are stale.
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}';"
+    return "".join(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version "
+        f"AFTER {event} ON {table} BEGIN {bump} END;\n"
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ) + f"INSERT OR IGNORE INTO table_versions (name) VALUES ('{table}');\n"
+
+
+class SqliteSource:
+    """DataStore source reading one table of a SQLite database."""
+
+    def __init__(self, storage, table):
+        self.storage = storage
+        self.table = table
+
+    def fingerprint(self):
+        return self.storage.version(self.storage.connection(), self.table)
+
+    def load(self):
+        conn = self.storage.connection()
+        columns = TABLES[self.table][1]
+        with conn:
+            # One read transaction, so the version matches the rows returned
+            conn.execute("BEGIN")
+            version = self.storage.version(conn, self.table)
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM {self.table} ORDER BY rowid", conn
+            )
+        return self.storage.frame(self.table, df), version
+
+    def append(self, rows):
+        conn = self.storage.connection()
+        columns = TABLES[self.table][1]
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock first, so the version read
+            # here cannot interleave with a writer in another process.
+            conn.execute("BEGIN IMMEDIATE")
+            before = self.storage.version(conn, self.table)
+            self.storage.insert(conn, self.table, rows)
+            after = self.storage.version(conn, self.table)
+        df = pd.DataFrame([[row.get(c) for c in columns] for row in rows], columns=columns)
+        return before, after, self.storage.frame(self.table, df)
+
+
+class SqliteStorage:
+    """Storage backed by a SQLite database in WAL mode."""
+
+    def __init__(self, path="athena.db"):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self.connection()
+        conn.executescript(
+            SQLITE_SCHEMA + "".join(_version_triggers(table) for table in TABLES)
+        )
+
+        self.store = DataStore()
+        for name in TABLES:
+            self.store.register(name, SqliteSource(self, name))
+        self._claims = {name: FileLock(f"{path}.{name}.claim") for name in TABLES}
+        # Time filters run on the cached frames; created_at holds mixed formats
+        # that SQL cannot compare as text
+        self.time_indexes = _time_indexes(self.store)
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def version(conn, table):
+        row = conn.execute(
+            "SELECT version FROM table_versions WHERE name = ?", (table,)
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _columns(table, names):
+        columns = TABLES[table][1]
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise ValueError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+        return list(names)
+
+    def frame(self, table, df, columns=None):
+        """Coerce raw SQLite values to the dtypes the CSV loaders produce."""
+        for column in SQLITE_REAL_COLUMNS.get(table, []):
+            if column in df:
+                df[column] = pd.to_numeric(df[column], errors="coerce")
+        for column in SQLITE_BOOL_COLUMNS.get(table, []):
+            if column in df:
+                df[column] = df[column].fillna(0).astype(bool)
+        df = TABLES[table][2](df)
+        return df if columns is None else df[columns]
+
+    def insert(self, conn, table, rows):
+        columns = TABLES[table][1]
+        self._columns(table, {key for row in rows for key in row})
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            [[_sql_value(row.get(c)) for c in columns] for row in rows],
+        )
+
+    def load(self, table, columns=None):
+        df = self.store.get(table)
+        return df if columns is None else df[columns]
+
+    def find(self, table, columns=None, since=None, until=None, **criteria):
+        if since is not None or until is not None:
+            df = self.store.get(table)
+            positions = _time_positions(self.time_indexes, table, since, until)
+            df = df.iloc[positions[positions < len(df)]]
+            mask = pd.Series(True, index=df.index)
+            for column in self._columns(table, criteria):
+                mask &= df[column] == criteria[column]
+            df = df[mask]
+            return df if columns is None else df[self._columns(table, columns)]
+
+        selected = TABLES[table][1] if columns is None else self._columns(table, columns)
+        where = " AND ".join(f"{c} = ?" for c in self._columns(table, criteria))
+        # Rows keep their id as the index, as with CsvStorage: rowids count
+        # from 1 in these append-only tables, positions from 0
+        df = pd.read_sql_query(
+            f"SELECT rowid - 1 AS row_id, {', '.join(selected)} FROM {table}"
+            f"{f' WHERE {where}' if where else ''} ORDER BY rowid",
+            self.connection(),
+            params=[_sql_value(v) for v in criteria.values()],
+            index_col="row_id",
+        )
+        df.index.name = None
+        return self.frame(table, df, columns)
+
+    def append(self, table, rows):
+        self.store.append(table, rows)
+
+    def update(self, table, criteria, values):
+        assignments = ", ".join(f"{c} = ?" for c in self._columns(table, values))
+        where = " AND ".join(f"{c} = ?" for c in self._columns(table, criteria))
+        params = [_sql_value(v) for v in values.values()]
+        params += [_sql_value(v) for v in criteria.values()]
+        columns = TABLES[table][1]
+        conn = self.connection()
+        with conn:
+            # Holds the write lock, so the versions bracket exactly this update
+            conn.execute("BEGIN IMMEDIATE")
+            before = self.version(conn, table)
+            rows = conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE {where} "
+                f"RETURNING rowid - 1, {', '.join(columns)}",
+                params,
+            ).fetchall()
+            after = self.version(conn, table)
+        # Cached frames are patched rather than reloaded, as with CsvStorage
+        changed = pd.DataFrame(
+            [row[1:] for row in rows], columns=columns, index=[row[0] for row in rows]
+        )
+        self.store.patch(table, self.frame(table, changed), before, after)
+
+    def import_frame(self, table, df):
+        """Replace the contents of ``table`` with ``df`` in one transaction."""
+        columns = TABLES[table][1]
+        df = df.reindex(columns=columns).astype(object)
+        rows = df.where(pd.notnull(df), None).to_dict(orient="records")
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DELETE FROM {table}")
+            self.insert(conn, table, rows)
+
+    def claim(self, table):
+        """Hold ``table``'s claim lock (see ``CsvStorage.claim``)."""
+        return self._claims[table].hold()
+
+    def subscribe(self, table, listener, updates=False):
+        self.store.subscribe(table, listener, updates)
+
+    def stats(self):
+        stats = self.store.stats()
+        stats["time_indexes"] = {n: index.stats() for n, index in self.time_indexes.items()}
+        return stats
+
+
+def _sql_value(value):
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, "item"):
+        # numpy scalars -> plain Python values
+        return value.item()
+    return value
+
+
+def open_storage():
+    """Return the storage backend selected by ``STORAGE_BACKEND``."""
+    backend = os.getenv("STORAGE_BACKEND", "csv").lower()
+    if backend == "csv":
+        return CsvStorage()
+    if backend == "sqlite":
+        return SqliteStorage(os.getenv("SQLITE_PATH", "athena.db"))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+class AsyncStorage:
+    """Awaitable interface to a storage backend; every call runs on the I/O executor.
+
+    Calls are timed per table and operation in ``storage_operation_seconds``.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def load(self, table, columns=None):
+        with STORAGE_SECONDS.time(table, "load"):
+            return await run_io(self.storage.load, table, columns)
+
+    async def find(self, table, columns=None, since=None, until=None, **criteria):
+        with STORAGE_SECONDS.time(table, "find"):
+            return await run_io(self.storage.find, table, columns, since, until, **criteria)
+
+    async def append(self, table, rows):
+        with STORAGE_SECONDS.time(table, "append"):
+            await run_io(self.storage.append, table, rows)
+
+    async def update(self, table, criteria, values):
+        with STORAGE_SECONDS.time(table, "update"):
+            await run_io(self.storage.update, table, criteria, values)
@@ -0,0 +1,35 @@
+"""Shared fixtures: a scratch data directory and an app instance serving it."""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import USER_COLUMNS  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An empty set of tables in the current directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SHARED_STATE_PATH", str(tmp_path / ".state"))
+    monkeypatch.setenv("SESSION_STORE_PATH", "")
+    monkeypatch.setenv("PASSWORD_HASH_WORKERS", "0")
+    monkeypatch.setenv("BCRYPT_ROUNDS", "4")
+    (tmp_path / "users.csv").write_text(",".join(USER_COLUMNS) + "\n")
+    return tmp_path
+
+
+@pytest.fixture
+def client(workdir):
+    """A TestClient for a ``main`` freshly imported over ``workdir``."""
+    from fastapi.testclient import TestClient
+
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    with TestClient(main.app) as c:
+        c.main = main
+        yield c
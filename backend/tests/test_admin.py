@@ -0,0 +1,14 @@
+"""Endpoints exposing internals need the admin token."""
+
+
+def test_datastore_stats_disabled_without_token(client):
+    assert client.get("/datastore/stats").status_code == 403
+
+
+def test_datastore_stats_requires_matching_token(client, monkeypatch):
+    monkeypatch.setattr(client.main, "ADMIN_TOKEN", "secret")
+    assert client.get("/datastore/stats").status_code == 403
+    assert client.get("/datastore/stats", headers={"X-Admin-Token": "nope"}).status_code == 403
+    response = client.get("/datastore/stats", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "tables" in response.json()
@@ -0,0 +1,94 @@
+"""AppendWriter and rewriting CSV files that may be bind-mounted on their own."""
+
+import errno
+import os
+
+import pandas as pd
+import pytest
+
+import appendlog
+from appendlog import AppendWriter, rewrite_file
+
+
+def _busy(src, dst):
+    raise OSError(errno.EBUSY, "Device or resource busy", dst)
+
+
+def test_rewrite_falls_back_to_in_place_write(tmp_path, monkeypatch):
+    path = tmp_path / "users.csv"
+    path.write_text("a,b\n1,2\n")
+    inode = path.stat().st_ino
+    monkeypatch.setattr(appendlog.os, "replace", _busy)
+
+    rewrite_file(str(path), lambda f: f.write("a,b,c\n1,2,\n"))
+
+    assert path.read_text() == "a,b,c\n1,2,\n"
+    assert path.stat().st_ino == inode
+    assert os.listdir(tmp_path) == ["users.csv"]
+
+
+def test_rewrite_removes_temp_file_when_write_fails(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("a,b\n1,2\n")
+
+    def fail(f):
+        f.write("a,b")
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        rewrite_file(str(path), fail)
+
+    assert path.read_text() == "a,b\n1,2\n"
+    assert os.listdir(tmp_path) == ["users.csv"]
+
+
+def test_append_creates_the_file_with_a_header(tmp_path):
+    path = str(tmp_path / "donations.csv")
+    writer = AppendWriter(fsync_every=1)
+    writer.append(path, [{"uuid": "U1", "amount": 5}], ["uuid", "amount", "hours"])
+    writer.append(path, [{"amount": 1.5, "uuid": "U2", "hours": None}], ["uuid", "amount", "hours"])
+
+    with open(path) as f:
+        assert f.read() == "uuid,amount,hours\nU1,5,\nU2,1.5,\n"
+
+
+def test_append_only_adds_to_the_end(tmp_path):
+    path = tmp_path / "donations.csv"
+    path.write_text("uuid,amount\nU1,5")  # no trailing newline
+    inode = path.stat().st_ino
+    header, chunk, rewritten = AppendWriter().append(
+        str(path), [{"uuid": "U2", "amount": 7}], ["uuid", "amount"]
+    )
+
+    assert (header, chunk, rewritten) == (["uuid", "amount"], "U2,7\n", False)
+    assert path.read_text() == "uuid,amount\nU1,5\nU2,7\n"
+    assert path.stat().st_ino == inode
+
+
+def test_rows_with_new_columns_widen_the_header_once(tmp_path):
+    path = tmp_path / "donations.csv"
+    path.write_text("uuid,amount\nU1,5\n")
+    writer = AppendWriter()
+    _, _, rewritten = writer.append(str(path), [{"uuid": "U2", "amount": 7, "hours": 2}], [])
+    assert rewritten
+    _, _, rewritten = writer.append(str(path), [{"uuid": "U3", "amount": 1, "hours": 1}], [])
+    assert not rewritten
+
+    df = pd.read_csv(path)
+    assert df.columns.tolist() == ["uuid", "amount", "hours"]
+    assert df["hours"].tolist()[1:] == [2, 1] and pd.isna(df["hours"][0])
+
+
+def test_flush_syncs_pending_appends(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(appendlog.os, "fsync", lambda fd: synced.append(fd))
+    path = str(tmp_path / "t.csv")
+    writer = AppendWriter(fsync_every=3, fsync_interval=60)
+    writer.append(path, [{"a": 1}], ["a"])
+    writer.append(path, [{"a": 2}], ["a"])
+    assert synced == []
+    writer.append(path, [{"a": 3}], ["a"])
+    assert len(synced) == 1
+    writer.append(path, [{"a": 4}], ["a"])
+    writer.flush()
+    assert len(synced) == 2
@@ -0,0 +1,126 @@
+"""Badge evaluation: batch vs per user, and awarding as writes happen."""
+
+import sys
+
+import pandas as pd
+
+import check_badges
+from badges import (
+    DONATION_STATS,
+    SUPPORTER_PATHS,
+    TEAM_STATS,
+    BadgeAwarder,
+    compute_stats,
+    earned_badges,
+    evaluate,
+)
+from storage import CsvStorage
+
+
+def _user(uuid, team_id=None):
+    return {"uuid": uuid, "email": f"{uuid.lower()}@example.org", "password": "x",
+            "fname": None, "lname": None, "team_id": team_id}
+
+
+def _donation(uuid, path, points, hours=0.0):
+    return {"uuid": uuid, "path": path, "amount": 1.0, "impact_points": points,
+            "hours": hours, "created_at": "2025-01-01T00:00:00+00:00"}
+
+
+def _per_user_badges(users, donations, teams):
+    """The badges of every user, from one user's rows at a time."""
+    pairs = set()
+    for uuid, team_id in zip(users["uuid"], users["team_id"]):
+        rows = donations[donations["uuid"] == uuid]
+        stats = {
+            "donation_count": len(rows),
+            "total_points": rows["impact_points"].sum(),
+            "volunteer_hours": rows["hours"].sum(),
+            "has_team": pd.notna(team_id),
+            "team_member_count": 0,
+        }
+        for path in SUPPORTER_PATHS:
+            stats[f"{path.lower()}_count"] = int((rows["path"] == path).sum())
+        if pd.notna(team_id) and uuid in set(teams["leader_uuid"]):
+            stats["team_member_count"] = int((users["team_id"] == team_id).sum())
+        pairs |= {(uuid, badge_id) for badge_id in evaluate(stats)}
+    return pairs
+
+
+def _tables():
+    users = pd.DataFrame([
+        _user("U1", "T1"), _user("U2", "T1"), _user("U3"), _user("U4", "T2"),
+        *[_user(f"M{i}", "T2") for i in range(4)],
+    ])
+    donations = pd.DataFrame(
+        [_donation("U1", path, 30) for path in ("WISDOM", "COURAGE", "PROTECTION")]
+        + [_donation("U2", "WISDOM", 1) for _ in range(5)]
+        + [_donation("U3", "SERVICE", 200, 6.0), _donation("U3", "SERVICE", 400, 5.0)]
+    )
+    teams = pd.DataFrame({"team_id": ["T1", "T2"], "name": ["One", "Two"],
+                          "leader_uuid": ["U2", "U4"]})
+    return users, donations, teams
+
+
+def test_batch_evaluation_matches_per_user_evaluation():
+    users, donations, teams = _tables()
+
+    earned = earned_badges(compute_stats(users, donations, teams))
+
+    pairs = set(zip(earned["uuid"], earned["badge_id"]))
+    assert pairs == _per_user_badges(users, donations, teams)
+    assert ("U1", "all_paths") in pairs
+    assert ("U2", "wisdom_supporter") in pairs
+    assert ("U3", "five_hundred_club") in pairs
+    assert ("U3", "service_volunteer") in pairs
+    assert ("U4", "team_leader") in pairs
+    assert ("U2", "team_leader") not in pairs
+
+
+def test_check_badges_only_appends_missing_badges(workdir, monkeypatch):
+    users, donations, teams = _tables()
+    storage = CsvStorage()
+    storage.append("users", users.to_dict(orient="records"))
+    storage.append("donations", donations.to_dict(orient="records"))
+    storage.append("teams", teams.to_dict(orient="records"))
+    storage.append("has_badges", [{"uuid": "U1", "badge_id": "first_donation"}])
+
+    monkeypatch.setattr(sys, "argv", ["check_badges.py", "--dry-run"])
+    check_badges.main()
+    assert len(CsvStorage().load("has_badges")) == 1
+
+    monkeypatch.setattr(sys, "argv", ["check_badges.py"])
+    check_badges.main()
+    held = CsvStorage().load("has_badges")
+    assert set(zip(held["uuid"], held["badge_id"])) == _per_user_badges(users, donations, teams)
+    assert len(held) == len(set(zip(held["uuid"], held["badge_id"])))
+
+    check_badges.main()
+    assert len(CsvStorage().load("has_badges")) == len(held)
+
+
+def test_awarder_grants_badges_as_writes_happen(workdir):
+    storage = CsvStorage()
+    storage.append("users", [_user("U1", "T1")] + [_user(f"M{i}") for i in range(4)])
+    storage.append("teams", [{"team_id": "T1", "name": "One", "leader_uuid": "U1"}])
+    awarder = BadgeAwarder(storage)
+
+    assert awarder.award("U1", DONATION_STATS) == []
+    storage.append("donations", [_donation("U1", "WISDOM", 60)])
+    assert awarder.award("U1", DONATION_STATS) == ["first_donation"]
+    # Written by another worker
+    CsvStorage().append("donations", [_donation("U1", "COURAGE", 60)])
+    assert awarder.award("U1", DONATION_STATS) == ["hundred_club"]
+    assert awarder.award("U1", DONATION_STATS) == []
+
+    assert awarder.award("U1", TEAM_STATS) == ["team_player"]
+    for i in range(4):
+        storage.update("users", {"uuid": f"M{i}"}, {"team_id": "T1"})
+    assert awarder.award("U1", {"team_member_count"}) == ["team_leader"]
+
+    held = CsvStorage().load("has_badges")
+    assert sorted(held["badge_id"]) == sorted(
+        ["first_donation", "hundred_club", "team_player", "team_leader"]
+    )
+    # Nothing is awarded twice, not even by a fresh awarder
+    assert BadgeAwarder(CsvStorage()).award_many(["U1"], DONATION_STATS | TEAM_STATS) == {}
@@ -0,0 +1,53 @@
+"""Badges and referral rewards claimed concurrently by several workers."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from badges import BadgeAwarder
+from referrals import ReferralService
+from storage import CsvStorage
+
+WORKERS = 4
+
+
+@pytest.fixture
+def storages(workdir):
+    with open(workdir / "users.csv", "a") as f:
+        f.write("U1,u1@example.com,x,F,L,\n")
+    # One storage per simulated uvicorn worker, sharing the files
+    return [CsvStorage() for _ in range(WORKERS)]
+
+
+def _race(fns):
+    barrier = threading.Barrier(len(fns))
+
+    def run(fn):
+        barrier.wait()
+        return fn()
+
+    with ThreadPoolExecutor(len(fns)) as pool:
+        return list(pool.map(run, fns))
+
+
+def test_badge_awarded_once_across_workers(storages):
+    awarders = [BadgeAwarder(storage) for storage in storages]
+    storages[0].append(
+        "donations",
+        [{"uuid": "U1", "path": "WISDOM", "amount": 5, "impact_points": 1, "hours": 0}],
+    )
+
+    results = _race([lambda a=a: a.award("U1", ["donation_count"]) for a in awarders])
+
+    assert sum(len(earned) for earned in results) == 1
+    assert len(storages[0].find("has_badges", uuid="U1")) == 1
+
+
+def test_referral_rewarded_once_across_workers(storages):
+    services = [ReferralService(storage) for storage in storages]
+
+    results = _race([lambda s=s: s.record_donation("U2", "REF-U1", "U1") for s in services])
+
+    assert results.count(True) == 1
+    assert len(storages[0].load("referrals")) == 1
@@ -0,0 +1,85 @@
+"""The Arrow donations snapshot must answer exactly like the CSV it mirrors."""
+
+import pandas as pd
+import pytest
+
+from framejson import frame_json
+from storage import CsvStorage
+
+pa = pytest.importorskip("pyarrow")
+
+DONATIONS = """uuid,path,amount,impact_points,hours,created_at
+U1,WISDOM,10.5,1.1,0.3,2025-01-01T00:00:00+00:00
+U1,COURAGE,3,2.7,0.1,2025-01-02T00:00:00+00:00
+U2,WISDOM,1,33.33,,
+"""
+
+
+@pytest.fixture
+def workdir(workdir, monkeypatch):
+    monkeypatch.setenv("DONATIONS_SNAPSHOT_PATH", str(workdir / "donations.arrow"))
+    (workdir / "donations.csv").write_text(DONATIONS)
+    return workdir
+
+
+def test_snapshot_numbers_match_csv(workdir):
+    arrow = CsvStorage(donations_format="arrow")
+    assert arrow.store.source("donations").rebuild_snapshot() == 3
+    csv = CsvStorage(donations_format="csv")
+
+    columns = ["uuid", "amount", "impact_points", "hours"]
+    from_csv = csv.load("donations", columns)
+    from_arrow = CsvStorage(donations_format="arrow").load("donations", columns)
+    assert frame_json(from_arrow) == frame_json(from_csv)
+    assert '"impact_points":1.1,"hours":0.3' in frame_json(from_arrow)
+    assert from_arrow["hours"].sum() == from_csv["hours"].sum()
+
+
+def test_missing_timestamp_encodes_as_null(workdir):
+    arrow = CsvStorage(donations_format="arrow")
+    arrow.store.source("donations").rebuild_snapshot()
+
+    body = frame_json(CsvStorage(donations_format="arrow").load("donations", ["created_at"]))
+    assert body.endswith('{"created_at":null}]')
+
+
+def _snapshot_offset(workdir):
+    with pa.memory_map(str(workdir / "donations.arrow")) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return int(table.schema.metadata[b"csv_offset"]), table.num_rows
+
+
+ROW = {"uuid": "U3", "path": "SERVICE", "amount": 0.0, "impact_points": 5.0, "hours": 2.5,
+       "created_at": "2025-01-04T00:00:00+00:00"}
+
+
+def test_rows_after_the_snapshot_come_from_the_csv(workdir, monkeypatch):
+    CsvStorage(donations_format="arrow").store.source("donations").rebuild_snapshot()
+    arrow = CsvStorage(donations_format="arrow")
+    arrow.load("donations")
+    arrow.append("donations", [ROW, dict(ROW, uuid="U4")])
+
+    expected = CsvStorage(donations_format="csv").load("donations")
+    for storage in (arrow, CsvStorage(donations_format="arrow")):
+        loaded = storage.load("donations")
+        assert frame_json(loaded.drop(columns="created_at")) == frame_json(
+            expected.drop(columns="created_at")
+        )
+        assert list(storage.find("donations", uuid="U4").index) == [4]
+        since = pd.Timestamp("2025-01-02", tz="UTC")
+        assert list(storage.find("donations", since=since).index) == [1, 3, 4]
+    assert _snapshot_offset(workdir)[1] == 3
+
+    # Once enough bytes pile up after it, the snapshot is refreshed on load
+    monkeypatch.setenv("DONATIONS_SNAPSHOT_EVERY", "1")
+    assert len(CsvStorage(donations_format="arrow").load("donations")) == 5
+    assert _snapshot_offset(workdir) == ((workdir / "donations.csv").stat().st_size, 5)
+
+
+def test_snapshot_of_an_edited_csv_is_ignored(workdir):
+    CsvStorage(donations_format="arrow").store.source("donations").rebuild_snapshot()
+    (workdir / "donations.csv").write_text(DONATIONS.replace("U1,COURAGE,3", "U9,COURAGE,4"))
+
+    loaded = CsvStorage(donations_format="arrow").load("donations")
+    assert list(loaded["uuid"]) == ["U1", "U9", "U2"]
+    assert list(loaded["amount"]) == [10.5, 4.0, 1.0]
@@ -0,0 +1,63 @@
+"""Concurrent writes to the CSV tables from several threads and workers."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from storage import CsvStorage
+
+WRITERS = 8
+ROWS = 25
+
+
+def _run(fns):
+    barrier = threading.Barrier(len(fns))
+
+    def run(fn):
+        barrier.wait()
+        fn()
+
+    with ThreadPoolExecutor(len(fns)) as pool:
+        list(pool.map(run, fns))
+
+
+def test_concurrent_appends_keep_every_row(workdir):
+    # Half the writers share a storage (threads), the others have their own (workers)
+    shared = CsvStorage()
+    storages = [shared if i % 2 else CsvStorage() for i in range(WRITERS)]
+
+    def writer(storage, n):
+        def write():
+            for i in range(ROWS):
+                storage.append("donations", [{
+                    "uuid": f"W{n}", "path": "WISDOM", "amount": float(i),
+                    "impact_points": 1.0, "hours": 0.0,
+                    "created_at": "2025-01-01T00:00:00+00:00",
+                }])
+        return write
+
+    _run([writer(storage, n) for n, storage in enumerate(storages)])
+
+    on_disk = pd.read_csv(workdir / "donations.csv")
+    assert len(on_disk) == WRITERS * ROWS
+    assert on_disk.groupby("uuid")["amount"].sum().tolist() == [sum(range(ROWS))] * WRITERS
+    assert len(shared.load("donations")) == WRITERS * ROWS
+
+
+def test_concurrent_updates_are_not_lost(workdir):
+    CsvStorage().append("users", [
+        {"uuid": f"U{i}", "email": f"u{i}@example.com", "password": "x", "fname": "F",
+         "lname": "L", "team_id": ""}
+        for i in range(WRITERS)
+    ])
+    storages = [CsvStorage() for _ in range(WRITERS)]
+
+    def updater(storage, n):
+        return lambda: storage.update("users", {"uuid": f"U{n}"}, {"team_id": f"T{n}"})
+
+    _run([updater(storage, n) for n, storage in enumerate(storages)])
+
+    on_disk = pd.read_csv(workdir / "users.csv")
+    assert list(on_disk["team_id"]) == [f"T{i}" for i in range(WRITERS)]
+    assert not list(workdir.glob("*.tmp.*"))
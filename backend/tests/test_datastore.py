@@ -0,0 +1,103 @@
+"""DataStore caching, change detection and listener events."""
+
+import os
+
+import pandas as pd
+
+from datastore import CsvSource, DataStore
+from storage import CsvStorage
+
+
+def _user(i, team="T1"):
+    return {
+        "uuid": f"U{i}",
+        "email": f"user{i}@example.com",
+        "password": "x",
+        "fname": "First",
+        "lname": f"Last{i}",
+        "team_id": team,
+    }
+
+
+def test_update_after_append_from_other_worker(workdir):
+    # Two storages stand in for two uvicorn workers sharing the CSV files
+    first, second = CsvStorage(), CsvStorage()
+    first.append("users", [_user(1)])
+    assert len(first.find("users", email="user1@example.com")) == 1
+
+    second.append("users", [_user(2)])
+    # first's cache is stale: the update must also feed U2 to its indexes
+    first.update("users", {"uuid": "U2"}, {"team_id": "T2"})
+
+    found = first.find("users", email="user2@example.com")
+    assert list(found["team_id"]) == ["T2"]
+    assert list(first.find("users", team_id="T2")["uuid"]) == ["U2"]
+    assert len(first.find("users", team_id="T1")) == 1
+
+    second.update("users", {"uuid": "U1"}, {"team_id": "T3"})
+    assert list(first.find("users", team_id="T3")["uuid"]) == ["U1"]
+
+
+def test_failing_listener_does_not_starve_the_others(workdir):
+    storage = CsvStorage()
+    seen = []
+
+    def broken(event, frame):
+        raise ValueError("bad row")
+
+    storage.subscribe("users", broken)
+    storage.subscribe("users", lambda event, frame: seen.append((event, len(frame))))
+    storage.load("users")
+    storage.append("users", [_user(1)])
+
+    assert seen == [("reset", 0), ("append", 1)]
+    assert len(storage.find("users", email="user1@example.com")) == 1
+
+
+class _Versions:
+    """Stands in for SharedVersions: no other process bumps anything."""
+
+    def get(self, name):
+        return 0
+
+    def bump(self, name):
+        pass
+
+
+def _store(path):
+    store = DataStore()
+    store.register("t", CsvSource("t", str(path), pd.read_csv, ["a", "b"], None, _Versions()))
+    return store
+
+
+def test_repeated_gets_are_served_from_the_cache(workdir):
+    path = workdir / "t.csv"
+    path.write_text("a,b\n1,2\n")
+    store = _store(path)
+
+    first = store.get("t")
+    assert store.get("t") is first
+    assert store.stats()["tables"]["t"] == {"hits": 1, "misses": 1, "reloads": 0, "tail_reloads": 0}
+
+
+def test_file_edited_by_hand_is_reloaded(workdir):
+    path = workdir / "t.csv"
+    path.write_text("a,b\n1,2\n3,4\n")
+    store = _store(path)
+    events = []
+    store.subscribe("t", lambda event, frame: events.append((event, frame["a"].tolist())))
+    store.get("t")
+
+    # Same size, new contents and mtime: not an append, so a full reload
+    path.write_text("a,b\n5,6\n7,8\n")
+    os.utime(path, ns=(1, 1))
+    assert store.get("t")["a"].tolist() == [5, 7]
+    assert events == [("reset", [1, 3]), ("reset", [5, 7])]
+    assert store.stats()["tables"]["t"]["reloads"] == 1
+
+
+def test_missing_file_loads_after_it_appears(workdir):
+    storage = CsvStorage()
+    assert storage.load("teams").empty
+    (workdir / "teams.csv").write_text("team_id,name,leader_uuid\nT1,Team,U1\n")
+    assert storage.load("teams")["team_id"].tolist() == ["T1"]
@@ -0,0 +1,28 @@
+"""/donate input checks."""
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"amount": "lots"},
+        {"amount": -5},
+        {"amount": True},
+        {"impact": "lots"},
+        {"impact": -1},
+        {"impact": "nan"},
+    ],
+)
+def test_donate_rejects_bad_numbers(client, body):
+    donation = {"uuid": "U1", "path": "WISDOM", "amount": 10, "impact": 5, **body}
+    assert client.post("/donate", json=donation).status_code == 400
+    assert client.main.storage.load("donations").empty
+
+
+def test_donate_stores_numbers(client):
+    donation = {"uuid": "U1", "path": "WISDOM", "amount": "10.5", "impact": 5}
+    assert client.post("/donate", json=donation).status_code == 200
+    row = client.main.storage.load("donations").iloc[0]
+    assert (row["amount"], row["impact_points"]) == (10.5, 5)
+    assert client.get("/leaderboard/supporters").status_code == 200
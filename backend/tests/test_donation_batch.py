@@ -0,0 +1,85 @@
+"""Batch donation parsing, validation and ingest."""
+
+import json
+
+import pytest
+
+from donation_batch import BatchError, read_batch, validate
+from storage import CsvStorage
+
+NOW = "2025-03-01T00:00:00+00:00"
+
+
+def _validate(rows):
+    frame, errors = read_batch(json.dumps(rows).encode(), "json")
+    return validate(frame, errors, NOW)
+
+
+def test_invalid_rows_are_reported_by_position():
+    rows, errors = _validate([
+        {"uuid": "U1", "amount": 5, "path": "WISDOM", "impact": 2},
+        {"amount": 5, "path": "WISDOM"},
+        {"uuid": "U2", "amount": -1, "path": " "},
+        {"uuid": "U3", "amount": True, "path": "WISDOM"},
+        {"uuid": "U4", "amount": "NaN", "path": "WISDOM", "impact_points": "lots"},
+        {"uuid": "U5", "amount": "3.5", "path": "COURAGE", "hours": -2},
+        {"uuid": "U6", "amount": 1, "path": "SERVICE", "created_at": "last tuesday"},
+        "not an object",
+        {"uuid": " U7 ", "amount": 0, "path": "SERVICE", "hours": 1.5,
+         "created_at": "2025-01-01T10:00:00"},
+    ])
+
+    assert errors == [
+        {"row": 1, "errors": ["uuid is required"]},
+        {"row": 2, "errors": ["path is required", "amount must be a number >= 0"]},
+        {"row": 3, "errors": ["amount must be a number >= 0"]},
+        {"row": 4, "errors": ["amount must be a number >= 0", "impact_points must be a number"]},
+        {"row": 5, "errors": ["hours must be a number >= 0"]},
+        {"row": 6, "errors": ["created_at must be an ISO 8601 date/time"]},
+        {"row": 7, "errors": ["row must be an object"]},
+    ]
+    assert rows == [
+        {"uuid": "U1", "amount": 5.0, "path": "WISDOM", "impact_points": 2.0, "hours": 0.0,
+         "created_at": NOW},
+        {"uuid": "U7", "amount": 0.0, "path": "SERVICE", "impact_points": None, "hours": 1.5,
+         "created_at": "2025-01-01T10:00:00+00:00"},
+    ]
+
+
+def test_formats_read_the_same_rows():
+    csv = b"uuid,amount,path,impact\nU1,5,WISDOM,2\nU2,,COURAGE,\n"
+    ndjson = (
+        b'{"uuid": "U1", "amount": 5, "path": "WISDOM", "impact": 2}\n\n'
+        b'{"uuid": "U2", "path": "COURAGE"}\n{broken\n'
+    )
+    from_csv = validate(*read_batch(csv, "csv"), NOW)
+    from_ndjson = validate(*read_batch(ndjson, "ndjson"), NOW)
+
+    assert from_csv[0] == from_ndjson[0]
+    assert from_csv[1] == [{"row": 1, "errors": ["amount is required"]}]
+    assert from_ndjson[1] == from_csv[1] + [{"row": 2, "errors": ["invalid JSON"]}]
+    with pytest.raises(BatchError):
+        read_batch(b'{"uuid": "U1"}', "json")
+
+
+def test_batch_endpoint_appends_valid_rows_once(client, monkeypatch):
+    body = {"donations": [
+        {"uuid": "U1", "amount": 5, "path": "WISDOM", "impact": 2},
+        {"uuid": "U1", "amount": "x", "path": "WISDOM"},
+        {"uuid": "U2", "amount": 1, "path": "COURAGE"},
+    ]}
+    result = client.post("/donations/batch", json=body).json()
+    assert (result["received"], result["recorded"], result["rejected"]) == (3, 2, 1)
+    assert list(CsvStorage().load("donations")["uuid"]) == ["U1", "U2"]
+    held = CsvStorage().load("has_badges")
+    assert sorted(held["uuid"]) == ["U1", "U2"]
+
+    upload = client.post("/donations/batch",
+                         files={"file": ("batch.csv", b"uuid,amount,path\nU3,2,WISDOM\n")})
+    assert upload.json()["recorded"] == 1
+
+    monkeypatch.setattr(client.main, "DONATION_BATCH_MAX_ROWS", 2)
+    assert client.post("/donations/batch", json=body).status_code == 413
+    unknown = client.post("/donations/batch", content=b"x", headers={"Content-Type": "text/plain"})
+    assert unknown.status_code == 400
+    assert len(CsvStorage().load("donations")) == 3
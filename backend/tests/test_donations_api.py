@@ -0,0 +1,52 @@
+"""Paging through and streaming GET /donations."""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def donations(client):
+    client.main.storage.append("donations", [
+        {"uuid": f"U{i % 4}", "path": "WISDOM" if i % 3 else "COURAGE", "amount": float(i),
+         "impact_points": None if i == 5 else float(i), "hours": 0.0,
+         "created_at": f"2025-01-{i + 1:02d}T00:00:00+00:00"}
+        for i in range(11)
+    ])
+    return client
+
+
+def _pages(client, **params):
+    rows, after = [], None
+    while True:
+        query = dict(params, limit=3) if after is None else dict(params, limit=3, after=after)
+        body = client.get("/donations", params=query).json()
+        rows += body["donations"]
+        after = body["next_after"]
+        if after is None:
+            return rows
+
+
+@pytest.mark.parametrize("params", [{}, {"path": "WISDOM"}, {"since": "2025-01-04"}])
+def test_pages_add_up_to_the_full_list(donations, params):
+    full = donations.get("/donations", params=params).json()["donations"]
+    assert full
+    assert _pages(donations, **params) == full
+
+
+def test_ndjson_streams_the_same_rows(donations, monkeypatch):
+    monkeypatch.setattr(donations.main, "DONATION_STREAM_CHUNK", 2)
+    full = donations.get("/donations").json()["donations"]
+
+    response = donations.get("/donations", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == full
+    assert full[5]["impact_points"] == " "
+
+    page = donations.get("/donations", params={"format": "ndjson", "after": 8, "limit": 5})
+    assert [json.loads(line) for line in page.text.splitlines()] == full[9:]
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"after": -1}, {"format": "xml"}])
+def test_bad_paging_parameters_are_rejected(donations, params):
+    assert donations.get("/donations", params=params).status_code == 400
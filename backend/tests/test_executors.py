@@ -0,0 +1,63 @@
+"""The I/O and CPU executors behind the async endpoints."""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from executors import Executor
+from storage import AsyncStorage, CsvStorage
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_calls_run_on_the_pool_with_the_callers_context():
+    pool = Executor("test", 2)
+
+    def work(x, y=0):
+        return threading.current_thread().name, request_id.get(), x + y
+
+    def fail():
+        raise KeyError("boom")
+
+    async def run():
+        request_id.set("r1")
+        result = await pool.run(work, 1, y=2)
+        with pytest.raises(KeyError):
+            await pool.run(fail)
+        return result
+
+    thread, context, value = asyncio.run(run())
+    assert thread.startswith("test-pool")
+    assert (context, value) == ("r1", 3)
+    assert pool.stats() == {"threads": 2, "queued": 0, "running": 0, "completed": 2}
+
+
+def test_busy_cpu_pool_does_not_hold_up_io():
+    cpu, io = Executor("cpu-test", 1), Executor("io-test", 1)
+    release = threading.Event()
+
+    async def run():
+        slow = [asyncio.create_task(cpu.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert cpu.stats()["running"] == 1
+        assert cpu.stats()["queued"] == 2
+        # Answered while every CPU thread is busy
+        assert await asyncio.wait_for(io.run(lambda: "fast"), 1) == "fast"
+        release.set()
+        return await asyncio.gather(*slow)
+
+    assert asyncio.run(run()) == [True, True, True]
+
+
+def test_async_storage_round_trip(workdir):
+    storage = AsyncStorage(CsvStorage())
+    row = {"uuid": "U1", "path": "WISDOM", "amount": 1.0, "impact_points": 1.0, "hours": 0.0,
+           "created_at": "2025-01-01T00:00:00+00:00"}
+
+    async def run():
+        await asyncio.gather(*(storage.append("donations", [row]) for _ in range(5)))
+        return await storage.find("donations", columns=["amount"], uuid="U1")
+
+    assert list(asyncio.run(run())["amount"]) == [1.0] * 5
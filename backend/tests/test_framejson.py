@@ -0,0 +1,49 @@
+"""Pre-encoded DataFrame JSON against the records FastAPI used to encode."""
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from framejson import frame_json, json_response
+
+
+def _expected(df, placeholder):
+    def value(v):
+        if v is None or v is pd.NaT or v is pd.NA:
+            return placeholder
+        if isinstance(v, float) and not math.isfinite(v):
+            return placeholder
+        if isinstance(v, pd.Timestamp):
+            return v.isoformat()
+        return v.item() if isinstance(v, np.generic) else v
+
+    return [{str(k): value(v) for k, v in row.items()} for row in df.to_dict(orient="records")]
+
+
+FRAME = pd.DataFrame({
+    "uuid": ["U1", None, 'q"u\\oé\n'],
+    "amount": [1.5, np.nan, np.inf],
+    "count": [1, 2, 3],
+    "nullable": pd.array([1, None, 3], dtype="Int64"),
+    "flag": [True, False, True],
+    "path": pd.Categorical(["WISDOM", None, "COURAGE"]),
+    "created_at": pd.to_datetime(["2025-01-01T10:00:00Z", None, "2025-02-01T00:00:00Z"]),
+    "100% %s": ["a", "b", "c"],
+})
+
+
+@pytest.mark.parametrize("placeholder", [None, " "])
+def test_matches_the_records_encoding(placeholder):
+    assert json.loads(frame_json(FRAME, placeholder)) == _expected(FRAME, placeholder)
+
+
+def test_empty_frames_and_plain_values():
+    assert frame_json(FRAME.iloc[:0]) == "[]"
+    response = json_response({"rows": FRAME.iloc[:1], "total": np.int64(3), "next": None})
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {
+        "rows": _expected(FRAME.iloc[:1], None), "total": 3, "next": None,
+    }
@@ -0,0 +1,106 @@
+"""The Hope Wall feed, its ETags and the moderation queue."""
+
+import json
+
+from hopewall import HopeWall
+from storage import CsvStorage
+
+DEFAULTS = [
+    {"id": "default-1", "display_name": "Anonymous", "message": "Default",
+     "language": "en", "created_date": "2025-01-05T00:00:00+00:00", "is_approved": True},
+]
+
+
+def _message(message_id, day, approved):
+    return {"id": message_id, "display_name": "A", "message": f"Message {message_id}",
+            "language": "en", "created_date": f"2025-01-{day:02d}T00:00:00+00:00",
+            "is_approved": approved}
+
+
+def _ids(body):
+    return [message["id"] for message in json.loads(body)["messages"]]
+
+
+def test_feed_lists_approved_messages_newest_first(workdir):
+    storage = CsvStorage()
+    storage.append("hope_wall_messages", [
+        _message("m1", 2, True), _message("m2", 9, False), _message("m3", 7, True),
+    ])
+    wall = HopeWall(storage, DEFAULTS)
+
+    etag, body = wall.page()
+    assert _ids(body) == ["m3", "default-1", "m1"]
+    assert wall.page() == (etag, body)
+    assert _ids(wall.page(limit=2)[1]) == ["m3", "default-1"]
+
+    # Written by another worker, and listed in date order
+    CsvStorage().append("hope_wall_messages", [_message("m4", 6, True), _message("m5", 1, False)])
+    new_etag, body = wall.page()
+    assert _ids(body) == ["m3", "m4", "default-1", "m1"]
+    assert new_etag != etag
+
+    # Matches a wall built from scratch
+    assert HopeWall(CsvStorage(), DEFAULTS).page() == (new_etag, body)
+
+
+def test_unchanged_feed_answers_304(client):
+    first = client.get("/hope_wall/messages")
+    etag = first.headers["etag"]
+    cached = client.get("/hope_wall/messages", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    client.main.storage.append("hope_wall_messages", [_message("m1", 1, True)])
+    changed = client.get("/hope_wall/messages", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert "m1" in _ids(changed.content)
+
+
+def test_moderation_queue_and_decisions(workdir):
+    storage = CsvStorage()
+    storage.append("hope_wall_messages", [_message(f"p{i}", i + 1, False) for i in range(5)])
+    wall = HopeWall(storage, DEFAULTS)
+
+    total, messages, after = wall.pending(limit=2)
+    assert (total, [m["id"] for m in messages]) == (5, ["p0", "p1"])
+    _, messages, after = wall.pending(limit=2, after=after)
+    assert [m["id"] for m in messages] == ["p2", "p3"]
+    _, messages, after = wall.pending(limit=2, after=after)
+    assert ([m["id"] for m in messages], after) == (["p4"], None)
+
+    assert wall.moderate(approve=["p1", "p3"], reject=["p0", "nope"]) == ["nope"]
+    assert [m["id"] for m in wall.pending(limit=10)[1]] == ["p2", "p4"]
+    assert _ids(wall.page()[1]) == ["default-1", "p3", "p1"]
+
+    # A later decision overrides an earlier one, in every worker
+    CsvStorage().append("hope_wall_moderation", [
+        {"id": "p3", "decision": "reject", "decided_at": "2025-02-01T00:00:00+00:00"},
+    ])
+    assert _ids(wall.page()[1]) == ["default-1", "p1"]
+    fresh = HopeWall(CsvStorage(), DEFAULTS)
+    assert fresh.page() == wall.page()
+    assert fresh.pending(limit=10)[1] == wall.pending(limit=10)[1]
+    # Decisions are logged; the messages file is left as it was
+    assert list(storage.load("hope_wall_messages")["is_approved"]) == [False] * 5
+
+
+def test_moderation_endpoints_need_the_token(client, monkeypatch):
+    assert client.get("/hope_wall/moderation/pending").status_code == 403
+    monkeypatch.setattr(client.main, "MODERATION_TOKEN", "secret")
+    headers = {"X-Moderation-Token": "secret"}
+    assert client.get("/hope_wall/moderation/pending",
+                      headers={"X-Moderation-Token": "wrong"}).status_code == 403
+
+    posted = client.post("/hope_wall/messages", json={"message": "Hello"})
+    message_id = posted.json()["message"]["id"]
+    pending = client.get("/hope_wall/moderation/pending", headers=headers).json()
+    assert [m["id"] for m in pending["messages"]] == [message_id]
+
+    both = client.post("/hope_wall/moderation", headers=headers,
+                       json={"approve": [message_id], "reject": [message_id]})
+    assert both.status_code == 400
+    decided = client.post("/hope_wall/moderation", headers=headers,
+                          json={"approve": [message_id]}).json()
+    assert (decided["approved"], decided["unknown"]) == (1, [])
+    assert message_id in _ids(client.get("/hope_wall/messages").content)
@@ -0,0 +1,109 @@
+"""Index lookups against scans of the same rows."""
+
+import random
+
+import pandas as pd
+
+from indexes import HashIndex, TimeIndex
+from storage import CsvStorage
+
+
+def _scan(values, value):
+    return [i for i, v in enumerate(values) if v == value]
+
+
+def _check(index, columns):
+    for column, values in columns.items():
+        for value in set(values) | {"missing"}:
+            if value is not None:
+                assert index.lookup(column, value) == _scan(values, value), (column, value)
+        assert index.lookup(column, None) == []
+
+
+def test_lookups_match_a_scan_after_appends_and_updates():
+    rng = random.Random(7)
+    teams = ["T1", "T2", "T3", None]
+    columns = {
+        "uuid": [f"U{i}" for i in range(50)],
+        "team_id": [rng.choice(teams) for _ in range(50)],
+    }
+    index = HashIndex(columns)
+    index.on_event("reset", pd.DataFrame(columns))
+    _check(index, columns)
+
+    for step in range(20):
+        if step % 2:
+            rows = {"uuid": [f"N{step}"], "team_id": [rng.choice(teams)]}
+            index.on_event("append", pd.DataFrame(rows))
+            for column, values in rows.items():
+                columns[column].extend(values)
+        else:
+            # Users joining, switching or leaving teams
+            positions = rng.sample(range(len(columns["uuid"])), 5)
+            changed = {"uuid": [columns["uuid"][p] for p in positions],
+                       "team_id": [rng.choice(teams) for _ in positions]}
+            index.on_event("update", pd.DataFrame(changed, index=positions))
+            for position, team_id in zip(positions, changed["team_id"]):
+                columns["team_id"][position] = team_id
+        _check(index, columns)
+
+    index.on_event("reset", pd.DataFrame(columns))
+    _check(index, columns)
+
+
+def test_storage_finds_users_by_email_after_writes(workdir):
+    storage = CsvStorage()
+    storage.append("users", [
+        {"uuid": f"U{i}", "email": f"u{i}@example.org", "password": "x", "fname": "F",
+         "lname": "L", "team_id": "T1" if i < 2 else ""}
+        for i in range(3)
+    ])
+    assert list(storage.find("users", email="u1@example.org")["uuid"]) == ["U1"]
+
+    storage.append("users", [{"uuid": "U3", "email": "u3@example.org", "password": "x",
+                              "fname": "F", "lname": "L", "team_id": "T1"}])
+    storage.update("users", {"uuid": "U0"}, {"team_id": "T2"})
+    assert list(storage.find("users", email="u3@example.org")["uuid"]) == ["U3"]
+    assert list(storage.find("users", team_id="T1")["uuid"]) == ["U1", "U3"]
+    assert list(storage.find("users", team_id="T2")["uuid"]) == ["U0"]
+    assert storage.find("users", email="nobody@example.org").empty
+
+
+def _between(stamps, since, until):
+    times = pd.to_datetime(pd.Series(stamps), errors="coerce", utc=True, format="ISO8601")
+    return [i for i, t in enumerate(times)
+            if pd.notna(t) and (since is None or t >= since) and (until is None or t < until)]
+
+
+def test_time_ranges_match_a_scan():
+    stamps = [
+        "2025-01-03T00:00:00+00:00",
+        "2025-01-01T23:30:00-02:00",  # 2025-01-02 01:30 UTC
+        "2025-01-02T00:00:00",  # naive: UTC
+        None,
+        "not a date",
+        "2025-01-05T12:00:00+00:00",
+    ]
+    index = TimeIndex("created_at")
+    index.on_event("reset", pd.DataFrame({"created_at": stamps}))
+    # Appended rows arrive mostly, but not always, in time order
+    for appended in (["2025-01-06T00:00:00+00:00"], ["2025-01-02T12:00:00+00:00", None]):
+        index.on_event("append", pd.DataFrame({"created_at": appended}))
+        stamps += appended
+
+    bounds = [None] + [pd.Timestamp(f"2025-01-0{d}", tz="UTC") for d in range(1, 8)]
+    for since in bounds:
+        for until in bounds:
+            assert index.between(since, until).tolist() == _between(stamps, since, until)
+
+
+def test_donations_filter_by_epoch_seconds(client):
+    client.main.storage.append("donations", [
+        {"uuid": "U1", "path": "WISDOM", "amount": 1.0, "impact_points": 1.0, "hours": 0.0,
+         "created_at": f"2025-01-0{d}T00:00:00+00:00"}
+        for d in range(1, 5)
+    ])
+    since = int(pd.Timestamp("2025-01-02", tz="UTC").timestamp())
+    body = client.get("/donations", params={"since": since, "until": "2025-01-04"}).json()
+    assert [row["created_at"][:10] for row in body["donations"]] == ["2025-01-02", "2025-01-03"]
+    assert client.get("/donations", params={"since": "yesterday"}).status_code == 400
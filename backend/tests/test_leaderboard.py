@@ -0,0 +1,142 @@
+"""Incrementally maintained leaderboards against ones built from scratch."""
+
+import pandas as pd
+
+import leaderboard as leaderboard_module
+from leaderboard import WINDOWS, SupporterLeaderboard, rank_teams
+from storage import CsvStorage
+
+PATHS = [None, "WISDOM", "COURAGE", "SERVICE"]
+
+
+def _user(uuid, fname=None, lname=None, team_id=None):
+    return {"uuid": uuid, "email": f"{uuid.lower()}@example.org", "password": "x",
+            "fname": fname, "lname": lname, "team_id": team_id}
+
+
+def _donation(uuid, path, points, created_at="2025-01-01T00:00:00+00:00"):
+    return {"uuid": uuid, "path": path, "amount": 1.0, "impact_points": points,
+            "hours": 0.0, "created_at": created_at}
+
+
+def _pages(leaderboard, **kwargs):
+    return {path: leaderboard.top(path, **kwargs) for path in PATHS}
+
+
+def test_appended_donations_match_a_full_rebuild(workdir):
+    storage = CsvStorage()
+    storage.append("users", [_user("U1", "Ada", "L"), _user("U2"), _user("U3", "Grace", "H")])
+    storage.append("donations", [_donation("U1", "WISDOM", 10), _donation("U2", "COURAGE", 4)])
+    leaderboard = SupporterLeaderboard(storage)
+    leaderboard.top()
+
+    # Ties, new users, missing points and a user overtaking another
+    storage.append("donations", [
+        _donation("U3", "SERVICE", 10),
+        _donation("U2", "WISDOM", None),
+        _donation("U2", "COURAGE", 7),
+    ])
+    storage.append("donations", [_donation("U4", "WISDOM", 3), _donation("U1", "COURAGE", 1)])
+    # Written by another worker
+    CsvStorage().append("donations", [_donation("U3", "WISDOM", 2)])
+
+    expected = _pages(SupporterLeaderboard(CsvStorage()))
+    assert _pages(leaderboard) == expected
+    assert _pages(leaderboard, limit=2, offset=1) == _pages(
+        SupporterLeaderboard(CsvStorage()), limit=2, offset=1
+    )
+
+    total, page = expected[None]
+    assert total == 4
+    assert [row["user_id"] for row in page] == ["U3", "U1", "U2", "U4"]
+    assert page[0]["display_name"] == "Grace H"
+    assert page[2]["display_name"] == "u2@example.org"
+    assert page[2]["primary_path"] == "COURAGE"
+
+
+def _naive_team_points(teams, users, donations):
+    points = {}
+    for team_id in teams["team_id"]:
+        members = set(users.loc[users["team_id"] == team_id, "uuid"])
+        rows = donations[donations["uuid"].isin(members)]
+        points[team_id] = int(rows["impact_points"].astype(float).sum())
+    return points
+
+
+def test_team_ranking_matches_a_per_team_computation():
+    teams = pd.DataFrame({
+        "team_id": ["T1", "T2", "T3"],
+        "name": ["One", "Two", "Empty"],
+        "leader_uuid": ["U1", "U3", "U9"],
+    })
+    users = pd.DataFrame({
+        "uuid": ["U1", "U2", "U3", "U4", "U2"],
+        "email": ["a@x", "b@x", "c@x", "d@x", "b@x"],
+        "fname": ["Ada", None, None, "Dan", None],
+        "lname": ["L", None, None, "D", None],
+        "team_id": ["T1", "T1", "T2", None, "T1"],
+    })
+    donations = pd.DataFrame({
+        "uuid": ["U1", "U2", "U3", "U3", "U4", "U2"],
+        "impact_points": [5, 7, 3, 20, 100, 1],
+    })
+
+    ranked = rank_teams(teams, users, donations)
+    expected = _naive_team_points(teams, users.drop_duplicates(), donations)
+    assert {row["team_id"]: row["total_points"] for row in ranked} == expected
+    assert [row["team_id"] for row in ranked] == ["T2", "T1", "T3"]
+    assert [row["leader_name"] for row in ranked] == ["c@x", "Ada L", None]
+    assert [row["member_count"] for row in ranked] == [1, 3, 0]
+
+
+def _days_ago(days, hour=12):
+    now = pd.Timestamp.now(tz="UTC").normalize()
+    return (now - pd.Timedelta(days=days) + pd.Timedelta(hours=hour)).isoformat()
+
+
+def _window_ranking(donations, today, days, path=None):
+    """Ranking over the last ``days`` UTC days, from a scan of the rows."""
+    points, counts = {}, {}
+    for row in donations:
+        day = pd.Timestamp(row["created_at"]).tz_convert("UTC").normalize()
+        age = (today - day).days
+        if not 0 <= age < days or (path and row["path"] != path):
+            continue
+        points[row["uuid"]] = points.get(row["uuid"], 0) + (row["impact_points"] or 0)
+        counts[row["uuid"]] = counts.get(row["uuid"], 0) + 1
+    return sorted((-p, uuid, counts[uuid]) for uuid, p in points.items())
+
+
+def _as_ranking(page):
+    return sorted((-row["total_points"], row["user_id"], row["total_donations"]) for row in page)
+
+
+def test_windows_match_a_recomputation(workdir, monkeypatch):
+    storage = CsvStorage()
+    donations = [
+        _donation(f"U{i % 5}", ["WISDOM", "COURAGE"][i % 2], i + 1, _days_ago(i * 3 % 40))
+        for i in range(40)
+    ]
+    storage.append("donations", donations[:30])
+    leaderboard = SupporterLeaderboard(storage)
+    leaderboard.top(window="week")
+    storage.append("donations", donations[30:] + [_donation("U9", "WISDOM", 7, _days_ago(0))])
+    donations.append(_donation("U9", "WISDOM", 7, _days_ago(0)))
+
+    today = pd.Timestamp.now(tz="UTC").normalize()
+    for window, days in WINDOWS.items():
+        for path in ("WISDOM", None):
+            total, page = leaderboard.top(path, window=window)
+            assert _as_ranking(page) == _window_ranking(donations, today, days, path)
+            assert total == len(page)
+
+    # A day later the oldest day drops out of each window
+    tomorrow = leaderboard_module._today() + 1
+    monkeypatch.setattr(leaderboard_module, "_today", lambda: tomorrow)
+    for window, days in WINDOWS.items():
+        _, page = leaderboard.top(window=window)
+        expected = _window_ranking(donations, today + pd.Timedelta(days=1), days)
+        assert _as_ranking(page) == expected
+        assert leaderboard.top(window=window) == SupporterLeaderboard(CsvStorage()).top(
+            window=window
+        )
@@ -0,0 +1,67 @@
+"""Prometheus exposition of the in-process metrics."""
+
+import asyncio
+import os
+import pstats
+
+from executors import Executor
+from instrumentation import RequestProfiler
+from metrics import Counter, Histogram, render
+
+
+def test_samples_carry_the_worker_label():
+    counter = Counter("test_events_total", "Events.", ["kind"])
+    histogram = Histogram("test_latency_seconds", "Latency.", ["kind"], buckets=(0.1, 1.0))
+    counter.inc("a", amount=2)
+    histogram.observe(0.5, "a")
+
+    text = render()
+    worker = f'worker="{os.getpid()}"'
+    assert f'test_events_total{{kind="a",{worker}}} 2' in text
+    assert f'test_latency_seconds_bucket{{kind="a",{worker},le="0.1"}} 0' in text
+    assert f'test_latency_seconds_bucket{{kind="a",{worker},le="+Inf"}} 1' in text
+    assert f'test_latency_seconds_sum{{kind="a",{worker}}} 0.5' in text
+
+
+def test_metrics_endpoint_requires_admin_token(client, monkeypatch):
+    assert client.get("/metrics").status_code == 403
+    monkeypatch.setattr(client.main, "ADMIN_TOKEN", "secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_count" in response.text
+    assert client.get("/metrics", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_requests_are_labelled_by_route_template(client, monkeypatch):
+    monkeypatch.setattr(client.main, "ADMIN_TOKEN", "secret")
+    client.get("/users/U1/donations")
+    client.get("/users/U2/donations")
+    client.get("/no/such/page")
+
+    text = client.get("/metrics", headers={"X-Admin-Token": "secret"}).text
+    worker = f'worker="{os.getpid()}"'
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/users/{uuid}/donations",'
+        f'status="200",{worker}}} 2'
+    ) in text
+    assert 'route="unmatched",status="404"' in text
+    assert "U1" not in text
+
+
+def test_slow_sampled_requests_are_profiled(tmp_path):
+    profiler = RequestProfiler(sample_rate=1.0, slow_ms=0, directory=str(tmp_path))
+    pool = Executor("profiled", 1)
+
+    token = profiler.start()
+    asyncio.run(pool.run(sum, range(1000)))
+    profiler.finish(token, "GET", "/leaderboard/supporters", 0.25)
+    # Fast or unsampled requests leave nothing behind
+    RequestProfiler(sample_rate=1.0, slow_ms=500, directory=str(tmp_path)).finish(
+        profiler.start(), "GET", "/me", 0.25
+    )
+    profiler.finish(None, "GET", "/me", 1.0)
+
+    (path,) = tmp_path.glob("*.prof")
+    assert path.name.endswith("-GET_leaderboard_supporters-250ms.prof")
+    assert pstats.Stats(str(path)).total_calls > 0
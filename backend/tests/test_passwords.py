@@ -0,0 +1,82 @@
+"""The bounded password hashing pool."""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import passwords
+from passwords import HasherBusy, PasswordHasher
+
+
+def test_hash_and_check_round_trip():
+    hasher = PasswordHasher(workers=0, rounds=4)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.check("secret", hashed), await hasher.check("wrong", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+    assert asyncio.run(hasher.check("secret", "not a bcrypt hash")) is False
+    assert hasher.stats()["completed"] == 4
+
+
+def test_full_queue_fails_fast(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(passwords, "_checkpw", lambda password, hashed: release.wait(5))
+    hasher = PasswordHasher(workers=0, max_pending=2)
+
+    async def run():
+        held = [asyncio.create_task(hasher.check("x", "y")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HasherBusy):
+            await hasher.check("x", "y")
+        release.set()
+        return await asyncio.gather(*held)
+
+    assert asyncio.run(run()) == [True, True]
+    stats = hasher.stats()
+    assert (stats["pending"], stats["completed"], stats["rejected"]) == (0, 2, 1)
+    # Slots are given back once the calls finish
+    assert asyncio.run(hasher.check("x", "y")) is True
+
+
+def test_broken_pool_is_replaced(monkeypatch):
+    pools = []
+
+    class Pool:
+        def __init__(self, **kwargs):
+            self.broken = not pools
+            pools.append(self)
+
+        def submit(self, fn, *args):
+            future = Future()
+            if self.broken:
+                future.set_exception(BrokenProcessPool("worker died"))
+            else:
+                future.set_result(fn(*args))
+            return future
+
+    monkeypatch.setattr(passwords, "ProcessPoolExecutor", Pool)
+    hasher = PasswordHasher(workers=1, rounds=4)
+
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(hasher.hash("secret"))
+    hashed = asyncio.run(hasher.hash("secret"))
+    assert asyncio.run(hasher.check("secret", hashed)) is True
+    assert len(pools) == 2
+
+
+def test_login_answers_503_when_busy(client, monkeypatch):
+    client.post("/signup", json={"email": "a@example.org", "password": "pw", "confirmpass": "pw",
+                                 "fname": "A", "lname": "B"})
+
+    async def busy(password, hashed):
+        raise HasherBusy("Too many password checks in progress")
+
+    monkeypatch.setattr(client.main.password_hasher, "check", busy)
+    response = client.post("/login", json={"email": "a@example.org", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
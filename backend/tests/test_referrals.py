@@ -0,0 +1,138 @@
+"""Referral rewards on a referred user's first donation, and referral analytics."""
+
+import random
+
+import pytest
+
+from referral_graph import RANKINGS, ReferralGraph
+from referrals import ReferralService
+from storage import CsvStorage
+
+
+def _user(uuid):
+    return {"uuid": uuid, "email": f"{uuid.lower()}@example.org", "password": "x",
+            "fname": "F", "lname": "L", "team_id": ""}
+
+
+@pytest.fixture
+def referral_client(client):
+    client.main.storage.append("users", [_user(f"U{i}") for i in range(1, 5)])
+    return client
+
+
+def _donate(client, uuid, code):
+    body = {"uuid": uuid, "amount": 5, "path": "WISDOM", "impact": 1, "referral_code": code}
+    assert client.post("/donate", json=body).status_code == 200
+
+
+def _bonuses(uuid):
+    donations = CsvStorage().load("donations")
+    return len(donations[(donations["uuid"] == uuid) & (donations["path"] == "Referral Bonus")])
+
+
+def test_only_the_first_donation_rewards_the_referrer(referral_client):
+    _donate(referral_client, "U2", "REF-U1")
+    _donate(referral_client, "U2", "REF-U1")
+    assert _bonuses("U1") == 1
+
+    # Donated before using a code: not a first donation
+    _donate(referral_client, "U3", None)
+    _donate(referral_client, "U3", "REF-U1")
+    assert _bonuses("U1") == 1
+
+    # Codes of unknown users are recorded without a reward
+    _donate(referral_client, "U4", "REF-nobody")
+    assert _bonuses("nobody") == 0
+
+    referred = referral_client.get("/users/U1/referrals").json()["referrals"]
+    assert [(r["referred_id"], r["hasDonated"]) for r in referred] == [("U2", True)]
+
+
+def test_recorded_referral_keeps_its_referrer(workdir):
+    storage = CsvStorage()
+    storage.append("users", [_user("U1"), _user("U2")])
+    storage.append("referrals", [
+        {"referrer_id": "U1", "referred_id": "U2", "code": "SPRING", "hasDonated": False},
+    ])
+    service = ReferralService(storage)
+    storage.append("donations", [{"uuid": "U2", "path": "WISDOM", "amount": 1.0,
+                                  "impact_points": 1.0, "hours": 0.0,
+                                  "created_at": "2025-01-01T00:00:00+00:00"}])
+
+    assert service.donation_count("U2") == 1
+    assert service.resolve_code("SPRING") is None
+    assert service.record_donation("U2", "SPRING", None) is True
+    assert service.record_donation("U2", "SPRING", None) is False
+
+    referred = ReferralService(CsvStorage()).referred_by("U1")
+    assert referred.to_dict(orient="records") == [
+        {"referrer_id": "U1", "referred_id": "U2", "code": "SPRING", "hasDonated": True},
+    ]
+    assert len(storage.load("referrals")) == 2
+
+
+def _referral(referrer, referred, code="C", donated=False):
+    return {"referrer_id": referrer, "referred_id": referred, "code": code,
+            "hasDonated": donated}
+
+
+def _graph(graph):
+    return {by: graph.top(by) for by in RANKINGS}
+
+
+def _check_counts(tree):
+    """Chain counts of every node in ``tree`` agree with the nodes below it."""
+    children = tree["referrals"]
+    assert tree["direct"] == len(children)
+    assert tree["direct_converted"] == sum(child["converted"] for child in children)
+    assert tree["total"] == sum(1 + child["total"] for child in children)
+    assert tree["total_converted"] == sum(
+        child["converted"] + child["total_converted"] for child in children
+    )
+    for child in children:
+        _check_counts(child)
+
+
+def test_live_graph_matches_a_rebuild(workdir):
+    rng = random.Random(3)
+    storage = CsvStorage()
+    storage.append("referrals", [_referral("U0", "U1"), _referral("U1", "U2", donated=True)])
+    graph = ReferralGraph(storage)
+    graph.top()
+
+    users = [f"U{i}" for i in range(10)]
+    for _ in range(15):
+        # New referrals, donations marked later, second codes and would-be cycles
+        rows = [
+            _referral(rng.choice(users + [None]), rng.choice(users), rng.choice("CD"),
+                      rng.random() < 0.5)
+            for _ in range(rng.randint(1, 3))
+        ]
+        CsvStorage().append("referrals", rows)
+        assert _graph(graph) == _graph(ReferralGraph(CsvStorage()))
+
+    for row in graph.top()[1]:
+        _check_counts(graph.tree(row["user_id"], depth=len(users)))
+
+
+def test_chain_counts_and_tree(workdir):
+    storage = CsvStorage()
+    storage.append("referrals", [
+        _referral("A", "B", "REF-A", donated=True),
+        _referral("A", "C", "REF-A"),
+        _referral("B", "D", "REF-B", donated=True),
+        _referral("X", "B", "REF-X"),  # B already has a referrer
+        _referral("D", "A", "REF-D"),  # would close a cycle
+    ])
+    graph = ReferralGraph(storage)
+
+    total, page = graph.top("converted")
+    assert total == 2
+    assert [(r["user_id"], r["direct"], r["total"], r["total_converted"]) for r in page] == [
+        ("A", 2, 3, 2), ("B", 1, 1, 1),
+    ]
+    tree = graph.tree("A", depth=1, limit=1)
+    assert [child["user_id"] for child in tree["referrals"]] == ["B"]
+    assert tree["next_offset"] == 1
+    assert graph.tree("D")["referred_by"] == "B"
+    assert graph.tree("nobody") is None
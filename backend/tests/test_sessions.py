@@ -0,0 +1,66 @@
+"""Session tokens: expiry, logout and sharing through the log."""
+
+import sessions
+from sessions import SessionStore
+
+
+class _Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_expire_after_the_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(sessions.time, "time", clock)
+    store = SessionStore(ttl=60, sweep_interval=30)
+
+    token = store.create("U1")
+    assert token != "U1"
+    assert store.resolve(token) == "U1"
+    clock.now += 59
+    assert store.resolve(token) == "U1"
+    clock.now += 1
+    assert store.resolve(token) is None
+    assert store.resolve(None) is None
+
+    # Expired sessions nobody asks for are swept
+    store.create("U2")
+    clock.now += 61
+    store.create("U3")
+    assert store.stats() == {"active": 1, "hits": 2, "misses": 1, "swept": 1}
+
+
+def test_revoked_sessions_are_gone_in_every_worker(tmp_path):
+    path = str(tmp_path / "sessions")
+    first = SessionStore(path=path)
+    second = SessionStore(path=path)
+
+    token = first.create("U1")
+    assert second.resolve(token) == "U1"
+    second.revoke(token)
+    assert first.resolve(token) is None
+    # Restarted workers see the same state
+    assert SessionStore(path=path).resolve(token) is None
+    other = first.create("U2")
+    assert SessionStore(path=path).resolve(other) == "U2"
+    # Tokens themselves are never written
+    assert other not in (tmp_path / "sessions").read_text()
+
+
+def test_logout_ends_the_session(client):
+    signup = client.post("/signup", json={"email": "a@example.org", "password": "pw",
+                                          "confirmpass": "pw", "fname": "A", "lname": "B"})
+    token = signup.cookies["session"]
+    assert client.get("/me").json()["logged_in"] is True
+
+    client.post("/logout")
+    # A copy of the old cookie no longer works either
+    client.cookies.set("session", token)
+    assert client.get("/me").json() == {"logged_in": False}
+
+    client.cookies.clear()
+    client.post("/login", json={"email": "a@example.org", "password": "pw"})
+    assert client.get("/me").json()["logged_in"] is True
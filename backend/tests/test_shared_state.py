@@ -0,0 +1,34 @@
+"""Workers sharing version counters and catching up on each other's writes."""
+
+from shared_state import SharedVersions
+from storage import CsvStorage
+
+
+def test_counters_are_shared_through_the_file(tmp_path):
+    first = SharedVersions(str(tmp_path / "state"))
+    second = SharedVersions(str(tmp_path / "state"))
+
+    assert first.get("donations") == 0
+    assert first.bump("donations") == 1
+    assert second.bump("donations") == 2
+    assert second.bump("users") == 1
+    assert first.get("donations") == 2
+    assert first.get("users") == 1
+    assert SharedVersions(str(tmp_path / "state")).get("donations") == 2
+
+
+def test_other_workers_append_only_the_new_rows(workdir):
+    writer, reader = CsvStorage(), CsvStorage()
+    events = []
+    reader.subscribe("donations", lambda event, frame: events.append((event, list(frame["uuid"]))))
+    row = {"path": "WISDOM", "amount": 1.0, "impact_points": 1.0, "hours": 0.0,
+           "created_at": "2025-01-01T00:00:00+00:00"}
+
+    writer.append("donations", [dict(row, uuid="U1")])
+    assert list(reader.load("donations")["uuid"]) == ["U1"]
+    writer.append("donations", [dict(row, uuid="U2"), dict(row, uuid="U3")])
+    assert list(reader.load("donations")["uuid"]) == ["U1", "U2", "U3"]
+    # Nothing changed since: served from the cache
+    reader.load("donations")
+
+    assert events == [("reset", ["U1"]), ("append", ["U2", "U3"])]
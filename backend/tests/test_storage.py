@@ -0,0 +1,93 @@
+"""The CSV and SQLite backends answer the same queries the same way."""
+
+import pandas as pd
+import pytest
+
+from storage import CsvStorage, SqliteStorage
+
+DONATIONS = [
+    {"uuid": "U1", "path": "WISDOM", "amount": 5.0, "impact_points": 1.0, "hours": 0.0,
+     "created_at": "2025-01-01T00:00:00+00:00"},
+    {"uuid": "U2", "path": "COURAGE", "amount": 2.0, "impact_points": 3.0, "hours": 0.0,
+     "created_at": "2025-01-02T00:00:00+00:00"},
+    {"uuid": "U1", "path": "WISDOM", "amount": 1.0, "impact_points": 2.5, "hours": 0.0,
+     "created_at": "2025-01-03T00:00:00+00:00"},
+]
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, workdir):
+    storage = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "t.db"))
+    storage.append("donations", DONATIONS)
+    return storage
+
+
+def test_find_without_criteria_returns_every_row(storage):
+    found = storage.find("donations", columns=["uuid", "amount"])
+    assert list(found.index) == [0, 1, 2]
+    assert list(found["amount"]) == [5.0, 2.0, 1.0]
+
+
+def test_find_keeps_row_ids(storage):
+    found = storage.find("donations", path="WISDOM")
+    assert list(found.index) == [0, 2]
+    assert list(found["impact_points"]) == [1.0, 2.5]
+
+    since = pd.Timestamp("2025-01-02", tz="UTC")
+    assert list(storage.find("donations", since=since, uuid="U1").index) == [2]
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def users(request, workdir):
+    storage = CsvStorage() if request.param == "csv" else SqliteStorage(str(workdir / "t.db"))
+    storage.append("users", [
+        {"uuid": f"U{i}", "email": f"u{i}@example.com", "password": "x", "fname": "F",
+         "lname": "L", "team_id": "T1" if i % 2 else ""}
+        for i in range(4)
+    ])
+    return storage
+
+
+def test_update_notifies_listeners_with_changed_rows(users):
+    events = []
+    users.subscribe("users", lambda event, frame: events.append((event, list(frame["uuid"]))),
+                    updates=True)
+    users.load("users")
+    users.update("users", {"team_id": "T1"}, {"team_id": "T2"})
+
+    assert events == [("reset", ["U0", "U1", "U2", "U3"]), ("update", ["U1", "U3"])]
+    cached = users.load("users")
+    assert list(cached["team_id"]) == ["", "T2", "", "T2"]
+    assert list(users.find("users", team_id="T2").index) == [1, 3]
+    # Nothing left to reload: the patched frame is current
+    assert users.stats()["tables"]["users"]["reloads"] == 0
+
+
+def test_migration_copies_every_table(workdir, capsys):
+    from migrate_to_sqlite import migrate
+
+    csv = CsvStorage()
+    csv.append("donations", DONATIONS)
+    csv.append("referrals", [{"referrer_id": "U1", "referred_id": "U2", "code": "REF-U1",
+                              "hasDonated": True}])
+    migrate(str(workdir / "t.db"))
+
+    sqlite = SqliteStorage(str(workdir / "t.db"))
+    for table in ("donations", "referrals", "users"):
+        pd.testing.assert_frame_equal(
+            sqlite.load(table).reset_index(drop=True),
+            csv.load(table).reset_index(drop=True),
+            check_dtype=False,
+        )
+    assert sqlite.load("referrals")["hasDonated"].tolist() == [True]
+
+
+def test_sqlite_write_from_another_connection_is_seen(workdir):
+    first = SqliteStorage(str(workdir / "t.db"))
+    second = SqliteStorage(str(workdir / "t.db"))
+    first.append("donations", DONATIONS[:1])
+    assert len(second.load("donations")) == 1
+
+    second.append("donations", DONATIONS[1:])
+    assert first.load("donations")["uuid"].tolist() == ["U1", "U2", "U1"]
+    assert list(first.find("donations", uuid="U2").index) == [1]
@@ -0,0 +1,75 @@
+"""Cached /me totals against totals computed from scratch."""
+
+from storage import CsvStorage
+from userstats import UserStatsCache
+
+
+def _donation(uuid, path, amount, points, hours=0.0):
+    return {"uuid": uuid, "path": path, "amount": amount, "impact_points": points,
+            "hours": hours, "created_at": "2025-01-01T00:00:00+00:00"}
+
+
+def _expected(frame, uuid):
+    rows = frame[frame["uuid"] == uuid]
+    service = rows[rows["path"] == "SERVICE"]
+    return {
+        "total_points": float(rows["impact_points"].fillna(0).sum()),
+        "total_amount": float(rows["amount"].fillna(0).sum()),
+        "total_donations": len(rows),
+        "volunteer_hours": float(service["hours"].fillna(0).sum()),
+    }
+
+
+def test_cached_totals_match_a_fresh_computation(workdir):
+    storage = CsvStorage()
+    storage.append("donations", [
+        _donation("U1", "WISDOM", 10.0, 5.0),
+        _donation("U2", "COURAGE", 3.0, 1.5),
+        _donation("U1", "SERVICE", 0.0, 20.0, 2.0),
+    ])
+    cache = UserStatsCache(storage, capacity=2)
+    assert cache.get("U1") == _expected(storage.load("donations"), "U1")
+    assert cache.get("U3") == _expected(storage.load("donations"), "U3")
+
+    # Appends (from this or another storage) update the cached users in place
+    CsvStorage().append("donations", [_donation("U1", "WISDOM", 2.5, None)])
+    storage.append("donations", [_donation("U3", "SERVICE", 0.0, 10.0, 1.0)])
+    frame = storage.load("donations")
+    for uuid in ("U1", "U2", "U3"):
+        assert cache.get(uuid) == _expected(frame, uuid)
+    assert cache.stats()["size"] <= 2
+
+
+def test_donations_are_indexed_by_uuid(workdir):
+    storage = CsvStorage()
+    storage.append("donations", [_donation(f"U{i % 3}", "WISDOM", 1.0, i) for i in range(9)])
+    storage.load("donations")
+    assert storage.indexes["donations"].lookup("uuid", "U1") == [1, 4, 7]
+    assert UserStatsCache(storage).get("U1")["total_points"] == 1 + 4 + 7
+
+
+def test_least_recently_used_users_are_evicted(workdir):
+    storage = CsvStorage()
+    storage.append("donations", [_donation(f"U{i}", "WISDOM", 1.0, i) for i in range(3)])
+    cache = UserStatsCache(storage, capacity=2)
+    cache.get("U0")
+    cache.get("U1")
+    cache.get("U0")
+    cache.get("U2")  # evicts U1
+
+    cache.get("U0")
+    cache.get("U1")
+    assert cache.stats() == {"size": 2, "capacity": 2, "hits": 2, "misses": 4}
+
+
+def test_edited_donations_file_clears_the_cache(workdir):
+    storage = CsvStorage()
+    storage.append("donations", [_donation("U1", "WISDOM", 10.0, 5.0)] * 2)
+    cache = UserStatsCache(storage)
+    assert cache.get("U1")["total_donations"] == 2
+
+    # Removing a row by hand is not an append, so cached totals are dropped
+    lines = (workdir / "donations.csv").read_text().splitlines(keepends=True)
+    (workdir / "donations.csv").write_text("".join(lines[:-1]))
+    assert cache.get("U1") == _expected(storage.load("donations"), "U1")
+    assert cache.get("U1")["total_donations"] == 1
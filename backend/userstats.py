@@ -0,0 +1,95 @@
+"""Per-user donation aggregates for the /me endpoint.
+
+Totals are computed once per user from that user's donation rows and kept in
+a bounded LRU. Appended donation rows update cached users in place; a full
+reload of the donations table (an outside change) clears the cache. Users that
+have not been looked up recently are evicted once ``capacity`` is reached.
+"""
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def _empty_totals():
+    return {
+        "total_points": 0.0,
+        "total_amount": 0.0,
+        "total_donations": 0,
+        "volunteer_hours": 0.0,
+    }
+
+
+def _add_row(totals, path, amount, points, hours):
+    totals["total_points"] += 0.0 if pd.isna(points) else float(points)
+    totals["total_amount"] += 0.0 if pd.isna(amount) else float(amount)
+    totals["total_donations"] += 1
+    if path == "SERVICE" and pd.notna(hours):
+        totals["volunteer_hours"] += float(hours)
+
+
+class UserStatsCache:
+    def __init__(self, storage, capacity=10000):
+        self._storage = storage
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Bumped on every donations event; guards against caching totals that
+        # were computed while a concurrent write was being applied.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        storage.subscribe("donations", self._on_donations)
+
+    def _on_donations(self, event, frame):
+        with self._lock:
+            self._generation += 1
+            if event == "reset":
+                self._entries.clear()
+                return
+
+            for uuid, path, amount, points, hours in frame[
+                ["uuid", "path", "amount", "impact_points", "hours"]
+            ].itertuples(index=False):
+                totals = self._entries.get(uuid)
+                if totals is not None:
+                    _add_row(totals, path, amount, points, hours)
+
+    def get(self, uuid):
+        """Return a copy of ``uuid``'s totals (zeros if they never donated)."""
+        # Picks up outside changes to the donations table (clears the cache)
+        self._storage.load("donations")
+
+        with self._lock:
+            totals = self._entries.get(uuid)
+            if totals is not None:
+                self._entries.move_to_end(uuid)
+                self.hits += 1
+                return dict(totals)
+            self.misses += 1
+            generation = self._generation
+
+        totals = _empty_totals()
+        rows = self._storage.find(
+            "donations", columns=["path", "amount", "impact_points", "hours"], uuid=uuid
+        )
+        for path, amount, points, hours in rows.itertuples(index=False):
+            _add_row(totals, path, amount, points, hours)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[uuid] = totals
+                self._entries.move_to_end(uuid)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return dict(totals)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+            }